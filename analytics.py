@@ -0,0 +1,444 @@
+"""
+Score Analytics
+Vectorized trend statistics over the score archive, for one user or the whole cohort.
+
+All statistics are computed in batched NumPy passes keyed by a user index
+column, so the single-user view and the cohort view share the same code:
+a user is just a cohort of one.
+
+- Moving averages (5 and 10 scores)
+- Rolling weekly averages and week-over-week deltas (same windows as the web app:
+  last 7 days vs the 7 days before)
+- Per-exam percentiles
+- Goal projection: least-squares trend extrapolated to the onboarding exam_date
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("⚠️  NumPy not installed. Analytics disabled. Run: pip install numpy")
+
+DAY = 86400.0
+WEEK = 7 * DAY
+WEEKS = 12
+FIT_WINDOW_DAYS = 90
+MIN_FIT_SPREAD_DAYS = 1
+PERCENTILES = (25, 50, 75, 90)
+# Above this many scores, percentiles come from a 0.1-point histogram instead of a sort
+EXACT_PERCENTILE_LIMIT = 100_000
+HISTOGRAM_BINS = 1001
+MOVING_AVERAGE_POINTS = 30
+
+if NUMPY_AVAILABLE:
+    # Mirrors score_archive.RECORD ("<ddddI"), so archive files parse without copying
+    RECORD_DTYPE = np.dtype([
+        ("ts", "<f8"), ("percentage", "<f8"), ("score", "<f8"), ("total", "<f8"), ("exam", "<u4"),
+    ])
+
+
+def _require_numpy():
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("Analytics requires NumPy (pip install numpy)")
+
+
+def goal_profile(user: dict):
+    """
+    (target percentage, exam date as epoch seconds) from onboarding data.
+    Either may be NaN when the user hasn't set it.
+    """
+    target = float("nan")
+    goal, total = user.get("goal"), user.get("total_marks") or 800
+    if isinstance(goal, (int, float)) and goal > 0 and total:
+        target = goal / total * 100
+    exam_ts = float("nan")
+    try:
+        exam_ts = datetime.strptime(user.get("exam_date") or "", "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        pass
+    return target, exam_ts
+
+
+# --- Vectorized building blocks ---
+
+def moving_average(values, window: int):
+    """Trailing mean over `window` points; NaN until enough points exist."""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        cumsum = np.cumsum(np.insert(values, 0, 0.0))
+        out[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return out
+
+
+def weekly_means(user, ts, pct, n_users: int, now: float, weeks: int = WEEKS):
+    """
+    Average and count per (user, rolling week), where week 0 is the last 7 days.
+
+    Returns:
+        (means, counts), both shaped (n_users, weeks); means are NaN for empty weeks
+    """
+    # Truncation counts slightly-future timestamps as this week, like the web app does
+    weeks_ago = ((now - ts) / WEEK).astype(np.int64)
+    mask = (weeks_ago >= 0) & (weeks_ago < weeks)
+    key = user[mask] * weeks + weeks_ago[mask]
+    size = n_users * weeks
+    counts = np.bincount(key, minlength=size).reshape(n_users, weeks)
+    sums = np.bincount(key, weights=pct[mask], minlength=size).reshape(n_users, weeks)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    return means, counts
+
+
+def trend_fit(user, ts, pct, n_users: int, now: float, window_days: int = FIT_WINDOW_DAYS):
+    """
+    Per-user least-squares line through the last `window_days` of scores.
+    `ts` must be sorted ascending, so the window is a slice.
+
+    Returns:
+        (slope in percentage points per day, fitted value now), NaN where undefined
+    """
+    lo = int(np.searchsorted(ts, now - window_days * DAY))
+    u, p = user[lo:], pct[lo:]
+    t = (ts[lo:] - now) / DAY
+    n = np.bincount(u, minlength=n_users).astype(float)
+    st = np.bincount(u, weights=t, minlength=n_users)
+    sp = np.bincount(u, weights=p, minlength=n_users)
+    stp = np.bincount(u, weights=t * p, minlength=n_users)
+    stt = np.bincount(u, weights=t * t, minlength=n_users)
+    denom = n * stt - st * st
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # denom / n² is the variance of the timestamps; scores bunched into a few
+        # hours give a meaningless slope, so require about a day of spread
+        slope = np.where(denom > n * n * MIN_FIT_SPREAD_DAYS ** 2, (n * stp - st * sp) / denom, np.nan)
+        intercept = (sp - slope * st) / n
+    return slope, intercept
+
+
+def project_goal(slope, intercept, target, exam_ts, now: float):
+    """Projected percentage on exam day and whether it reaches the target."""
+    days_left = (exam_ts - now) / DAY
+    projected = np.clip(intercept + slope * np.maximum(days_left, 0), 0, 100)
+    with np.errstate(invalid="ignore"):
+        on_track = projected >= target
+    return projected, on_track, days_left
+
+
+def exam_percentiles(exam, pct, exam_names: list) -> dict:
+    """
+    Percentiles of all scores per exam.
+    Exact for small inputs; large inputs use one bincount over (exam, 0.1-point bin)
+    so the cost stays linear with no sort.
+    """
+    if len(exam) == 0:
+        return {}
+    exam = exam.astype(np.intp, copy=False)
+    n_exams = int(exam.max()) + 1
+    counts = np.bincount(exam, minlength=n_exams)
+
+    if len(exam) <= EXACT_PERCENTILE_LIMIT:
+        order = np.argsort(exam, kind="stable")
+        pct_sorted = pct[order]
+        ends = np.cumsum(counts)
+        values = {
+            e: np.percentile(pct_sorted[ends[e] - counts[e]:ends[e]], PERCENTILES)
+            for e in np.nonzero(counts)[0]
+        }
+    else:
+        bins = np.clip(np.rint(pct * 10), 0, HISTOGRAM_BINS - 1).astype(np.int64)
+        hist = np.bincount(exam * HISTOGRAM_BINS + bins, minlength=n_exams * HISTOGRAM_BINS)
+        cumulative = np.cumsum(hist.reshape(n_exams, HISTOGRAM_BINS), axis=1)
+        ranks = np.array(PERCENTILES) / 100
+        values = {
+            e: np.searchsorted(cumulative[e], ranks * counts[e]) / 10
+            for e in np.nonzero(counts)[0]
+        }
+
+    result = {}
+    for exam_id, quantiles in values.items():
+        name = exam_names[exam_id] if exam_id < len(exam_names) else ""
+        entry = {"count": int(counts[exam_id])}
+        entry.update({f"p{q}": round(float(v), 2) for q, v in zip(PERCENTILES, quantiles)})
+        result[name or "unknown"] = entry
+    return result
+
+
+def _num(value, digits: int = 2):
+    """NumPy scalar -> rounded float, or None for NaN."""
+    value = float(value)
+    return None if value != value else round(value, digits)
+
+
+# --- Single user ---
+
+def user_analytics(archive, username: str, user: dict, now: float = None) -> dict:
+    """All analytics for one user, from their archived scores and onboarding data."""
+    _require_numpy()
+    now = time.time() if now is None else now
+    cols = archive.columns(username)
+    ts = np.frombuffer(cols["timestamps"], dtype=np.float64)
+    order = np.argsort(ts, kind="stable")
+    ts = ts[order]
+    pct = np.frombuffer(cols["percentages"], dtype=np.float64)[order]
+    exam = np.frombuffer(cols["exams"], dtype=np.uint32)[order]
+    user_idx = np.zeros(len(ts), dtype=np.int64)
+
+    ma5, ma10 = moving_average(pct, 5), moving_average(pct, 10)
+    tail = slice(max(0, len(ts) - MOVING_AVERAGE_POINTS), len(ts))
+    moving = [
+        {
+            "timestamp": datetime.fromtimestamp(t, timezone.utc).isoformat(),
+            "percentage": _num(p),
+            "ma_5": _num(a5),
+            "ma_10": _num(a10),
+        }
+        for t, p, a5, a10 in zip(ts[tail], pct[tail], ma5[tail], ma10[tail])
+    ]
+
+    means, counts = weekly_means(user_idx, ts, pct, 1, now)
+    means, counts = means[0], counts[0]
+    weekly = [
+        {
+            "weeks_ago": i,
+            "avg": _num(means[i]),
+            "count": int(counts[i]),
+            "delta": _num(means[i] - means[i + 1]) if i + 1 < WEEKS else None,
+        }
+        for i in range(WEEKS)
+    ]
+
+    target, exam_ts = goal_profile(user)
+    slope, intercept = trend_fit(user_idx, ts, pct, 1, now)
+    goal = None
+    if target == target:
+        projected, on_track, days_left = project_goal(slope, intercept, np.array([target]), np.array([exam_ts]), now)
+        goal = {
+            "target_percentage": _num(target),
+            "exam_date": user.get("exam_date") or None,
+            "days_left": None if exam_ts != exam_ts else max(0, int(days_left[0])),
+            "trend_per_week": _num(slope[0] * 7),
+            "projected_percentage": _num(projected[0]),
+            "on_track": None if projected[0] != projected[0] else bool(on_track[0]),
+        }
+
+    return {
+        "total_scores": int(len(ts)),
+        "moving_average": moving,
+        "weekly": weekly,
+        "week_over_week": {
+            "this_week": _num(means[0]),
+            "last_week": _num(means[1]),
+            "delta": _num(means[0] - means[1]),
+        },
+        "exams": exam_percentiles(exam, pct, archive.exam_names),
+        "goal": goal,
+    }
+
+
+# --- Cohort ---
+
+class CohortIndex:
+    """
+    Every archived score in growable columnar NumPy arrays, keyed by user index.
+    Built from the archive files on first use, then kept current by subscribing
+    to archive appends.
+
+    Columns are kept sorted by timestamp (new scores almost always arrive in
+    order; anything else triggers one re-sort before the next pass), so the
+    recent window and each week are contiguous slices rather than masks.
+    """
+
+    def __init__(self, archive, window_days: int = FIT_WINDOW_DAYS, cache_seconds: float = 30.0):
+        _require_numpy()
+        self.archive = archive
+        self.window_days = window_days
+        self.cache_seconds = cache_seconds
+        self._lock = threading.Lock()
+        self._built = False
+        self._n = 0
+        self._user = np.empty(0, dtype=np.int64)
+        self._ts = np.empty(0, dtype=np.float64)
+        self._pct = np.empty(0, dtype=np.float64)
+        self._exam = np.empty(0, dtype=np.int32)
+        self._sorted = True
+        self._user_ids = {}
+        self._target = np.full(0, np.nan)
+        self._exam_ts = np.full(0, np.nan)
+        self._cached = None
+        self._cached_at = 0.0
+        self._refreshing = False
+        archive.subscribe(self._on_append)
+
+    def __len__(self):
+        return self._n
+
+    # --- Maintenance ---
+
+    def _user_id(self, username: str) -> int:
+        """Caller holds the lock."""
+        uid = self._user_ids.get(username)
+        if uid is None:
+            uid = self._user_ids[username] = len(self._user_ids)
+            if uid >= len(self._target):
+                grow = max(1024, len(self._target))
+                self._target = np.append(self._target, np.full(grow, np.nan))
+                self._exam_ts = np.append(self._exam_ts, np.full(grow, np.nan))
+        return uid
+
+    def _reserve(self, extra: int):
+        """Grow the columns geometrically. Caller holds the lock."""
+        needed = self._n + extra
+        if needed <= len(self._ts):
+            return
+        capacity = max(needed, 2 * len(self._ts), 4096)
+        for name in ("_user", "_ts", "_pct", "_exam"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def _extend(self, uid: int, records):
+        """Append structured records (RECORD_DTYPE) for one user. Caller holds the lock."""
+        k = len(records)
+        if k == 0:
+            return
+        if self._n and (records["ts"].min() < self._ts[self._n - 1] or not self._sorted):
+            self._sorted = False
+        elif k > 1 and np.any(np.diff(records["ts"]) < 0):
+            self._sorted = False
+        self._reserve(k)
+        end = self._n + k
+        self._user[self._n:end] = uid
+        self._ts[self._n:end] = records["ts"]
+        self._pct[self._n:end] = records["percentage"]
+        self._exam[self._n:end] = records["exam"]
+        self._n = end
+
+    def _on_append(self, username: str, records: list):
+        with self._lock:
+            if not self._built:
+                return  # the initial scan will read these from disk
+            self._extend(self._user_id(username), np.array(records, dtype=RECORD_DTYPE))
+
+    def build(self, users=None):
+        """
+        Load every archived score (once) and optionally goal profiles from
+        (username, record) pairs.
+        """
+        # Lock order is archive -> cohort everywhere (appends notify us under the archive lock)
+        if not self._built:
+            def load(username, raw):
+                with self._lock:
+                    self._extend(self._user_id(username), np.frombuffer(raw, dtype=RECORD_DTYPE))
+
+            def finished():
+                self._built = True
+
+            self.archive.scan(load, finished)
+        if users is not None:
+            with self._lock:
+                for username, user in users:
+                    self._set_profile_locked(username, user)
+
+    def _set_profile_locked(self, username: str, user: dict):
+        uid = self._user_id(username)
+        self._target[uid], self._exam_ts[uid] = goal_profile(user)
+
+    def set_profile(self, username: str, user: dict):
+        """Refresh a user's goal after onboarding changes."""
+        with self._lock:
+            self._set_profile_locked(username, user)
+
+    # --- Query ---
+
+    def _sort_locked(self):
+        """Re-sort the columns by timestamp into fresh arrays. Caller holds the lock."""
+        n = self._n
+        order = np.argsort(self._ts[:n], kind="stable")
+        for name in ("_user", "_ts", "_pct", "_exam"):
+            column = getattr(self, name)
+            sorted_column = np.empty(len(column), dtype=column.dtype)
+            sorted_column[:n] = column[:n][order]
+            # Replace rather than sort in place: a concurrent pass may still hold views
+            setattr(self, name, sorted_column)
+        self._sorted = True
+
+    def compute(self, now: float = None) -> dict:
+        """Cohort-wide statistics in one vectorized pass over the recent window (uncached)."""
+        now = time.time() if now is None else now
+
+        with self._lock:
+            if not self._sorted:
+                self._sort_locked()
+            n, n_users = self._n, len(self._user_ids)
+            window_start = now - max(self.window_days * DAY, WEEKS * WEEK)
+            lo = int(np.searchsorted(self._ts[:n], window_start))
+            # Views: later appends write past n, and growth/sorting allocate new arrays
+            user, ts = self._user[lo:n], self._ts[lo:n]
+            pct, exam = self._pct[lo:n], self._exam[lo:n]
+            target, exam_ts = self._target[:n_users].copy(), self._exam_ts[:n_users].copy()
+
+        # Week k covers (now - (k+1) weeks, now - k weeks]; week 0 also takes future timestamps
+        edges = np.searchsorted(ts, now - WEEK * np.arange(WEEKS, 0, -1))
+        bounds = np.append(edges, len(ts))
+        cumulative = np.concatenate(([0.0], np.cumsum(pct)))
+        total_counts = np.diff(bounds)[::-1]
+        weekly_sums = (cumulative[bounds[1:]] - cumulative[bounds[:-1]])[::-1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weekly_avg = weekly_sums / total_counts
+
+        # Week-over-week deltas are per user, over the last two weeks only
+        last_two = slice(bounds[-3], len(ts))
+        means, _ = weekly_means(user[last_two], ts[last_two], pct[last_two], n_users, now, weeks=2)
+        deltas = means[:, 0] - means[:, 1]
+        compared = deltas[~np.isnan(deltas)]
+
+        slope, intercept = trend_fit(user, ts, pct, n_users, now, self.window_days)
+        projected, on_track, _ = project_goal(slope, intercept, target, exam_ts, now)
+        has_goal = ~np.isnan(target) & ~np.isnan(projected)
+
+        return {
+            "users": int(np.count_nonzero(np.bincount(user, minlength=n_users))),
+            "scores": int(len(ts)),
+            "window_days": self.window_days,
+            "weekly": [
+                {"weeks_ago": i, "avg": _num(weekly_avg[i]), "count": int(total_counts[i])}
+                for i in range(WEEKS)
+            ],
+            "week_over_week": {
+                "users_compared": int(len(compared)),
+                "mean_delta": _num(compared.mean()) if len(compared) else None,
+                "median_delta": _num(np.median(compared)) if len(compared) else None,
+                "improving_share": _num(np.mean(compared > 0), 3) if len(compared) else None,
+            },
+            "exams": exam_percentiles(exam, pct, self.archive.exam_names),
+            "goal": {
+                "users_with_goal": int(has_goal.sum()),
+                "on_track_share": _num(on_track[has_goal].mean(), 3) if has_goal.any() else None,
+                "median_gap": _num(np.median(projected[has_goal] - target[has_goal])) if has_goal.any() else None,
+            },
+        }
+
+    def _refresh(self):
+        try:
+            result = self.compute()
+            self._cached, self._cached_at = result, time.time()
+        finally:
+            self._refreshing = False
+
+    def snapshot(self) -> dict:
+        """
+        The latest cohort statistics.
+        Computed synchronously the first time; afterwards a stale result is served
+        immediately while a background thread recomputes it.
+        """
+        if self._cached is None:
+            self._refresh()
+        elif time.time() - self._cached_at >= self.cache_seconds and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh, name="cohort-refresh", daemon=True).start()
+        return self._cached
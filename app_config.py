@@ -0,0 +1,130 @@
+"""
+Shared Configuration
+One process-wide view of config.json, reloaded when the file changes.
+
+Callers used to re-open and parse config.json on every lookup. Now the file
+is parsed once, re-checked at most once per second by mtime (or immediately
+on SIGHUP), and derived data such as the sorted streak color tiers is
+computed at load time, so a lookup is a dict access.
+"""
+
+import bisect
+import json
+import signal
+import threading
+import time
+from pathlib import Path
+
+CONFIG_PATH = Path(__file__).parent / "config.json"
+CHECK_INTERVAL_SECONDS = 1.0
+DEFAULT_STREAK_COLOR = {"r": 255, "g": 0, "b": 0}
+
+
+class Config:
+    """Parsed config.json plus derived lookups."""
+
+    def __init__(self, path=CONFIG_PATH, check_interval: float = CHECK_INTERVAL_SECONDS):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+        self._data = {}
+        self._tiers = ([], [])
+        self.reload()
+
+    def reload(self) -> bool:
+        """
+        Re-read the file now. A missing file gives an empty config; a file that
+        fails to parse (e.g. caught mid-save) keeps the previous values.
+
+        Returns:
+            True if the values changed
+        """
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                self._mtime = self.path.stat().st_mtime_ns
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                self._mtime, data = None, {}
+            except (OSError, ValueError) as e:
+                # Not retried until the file changes again
+                print(f"⚠️ Keeping previous config, could not read {self.path.name}: {e}")
+                return False
+
+            if data == self._data:
+                return False
+            colors = data.get("streak_colors", {})
+            tiers = sorted((int(k), v) for k, v in colors.items())
+            # Swap whole objects so readers never see a half-updated config
+            self._tiers = ([start for start, _ in tiers], [color for _, color in tiers])
+            self._data = data
+            return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            self.reload()
+
+    @property
+    def data(self) -> dict:
+        """The current parsed config. Treat as read-only."""
+        self._maybe_reload()
+        return self._data
+
+    def get(self, key: str, default=None):
+        self._maybe_reload()
+        return self._data.get(key, default)
+
+    def __getitem__(self, key: str):
+        self._maybe_reload()
+        return self._data[key]
+
+    def __contains__(self, key: str) -> bool:
+        self._maybe_reload()
+        return key in self._data
+
+    @property
+    def streak_tiers(self) -> tuple:
+        """(sorted tier start days, matching colors) from streak_colors."""
+        self._maybe_reload()
+        return self._tiers
+
+    def streak_color(self, streak: int) -> dict:
+        """RGB for the highest streak_colors tier at or below `streak` (red if none)."""
+        self._maybe_reload()
+        starts, colors = self._tiers
+        i = bisect.bisect_right(starts, streak)
+        return colors[i - 1] if i else DEFAULT_STREAK_COLOR
+
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def get_config() -> Config:
+    """The process-wide Config, loaded on first use."""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = Config()
+    return _config
+
+
+def reload_on_sighup():
+    """
+    Reload the shared config on SIGHUP. Only call from the main thread of a
+    process that doesn't already own SIGHUP (gunicorn's master does).
+    """
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: get_config().reload())
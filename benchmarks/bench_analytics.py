@@ -0,0 +1,71 @@
+"""
+Cohort Analytics Benchmark
+Times an uncached CohortIndex.compute() pass over synthetic users, and the
+cost of serving the cached snapshot that /api/analytics returns.
+
+Usage:
+    python benchmarks/bench_analytics.py --users 100000 --scores 50
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from analytics import RECORD_DTYPE, CohortIndex
+from score_archive import ScoreArchive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--scores", type=int, default=50, help="Scores per user")
+    parser.add_argument("--days", type=int, default=90, help="Timestamp spread")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = ScoreArchive(Path(tmp) / "archive")
+        cohort = CohortIndex(archive, cache_seconds=0)
+        cohort.build()
+
+        start = time.perf_counter()
+        for i in range(args.users):
+            records = np.zeros(args.scores, dtype=RECORD_DTYPE)
+            records["ts"] = now - rng.uniform(0, args.days * 86400, args.scores)
+            records["percentage"] = rng.uniform(20, 100, args.scores)
+            records["exam"] = i % 3
+            cohort._on_append(f"user{i}", records)
+            if i % 4 == 0:
+                cohort.set_profile(f"user{i}", {"goal": 600, "total_marks": 800, "exam_date": "2027-03-01"})
+        load_s = time.perf_counter() - start
+
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            cohort.compute(now)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        # What /api/analytics pays per request: the background-refreshed snapshot
+        cohort.snapshot()
+        served = []
+        for _ in range(1000):
+            start = time.perf_counter()
+            cohort.snapshot()
+            served.append((time.perf_counter() - start) * 1000)
+
+    print(f"{args.users} users x {args.scores} scores ({len(cohort)} rows), loaded in {load_s:.1f}s")
+    print(f"cohort compute pass: median {statistics.median(timings):.1f} ms, min {min(timings):.1f} ms")
+    print(f"served snapshot:     median {statistics.median(served) * 1000:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
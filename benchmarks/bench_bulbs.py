@@ -0,0 +1,58 @@
+"""
+Bulb Fan-out Benchmark
+Measures commands/sec when BulbController sends group colors to many fake bulbs.
+
+Usage:
+    python benchmarks/bench_bulbs.py --bulbs 50 --rounds 20 --latency-ms 20
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bulb_controller import BulbController
+from fake_tuya import FakeBulbServer, fake_device, fake_device_reconnecting
+
+
+def run(server: FakeBulbServer, factory, rounds: int) -> float:
+    config = {
+        "bulbs": [
+            {"device_id": device_id, "ip": address, "local_key": "", "group": "room"}
+            for device_id, address in server.addresses
+        ],
+        "bulb_health_check_seconds": 0,
+    }
+    controller = BulbController(config, device_factory=factory)
+    start = time.perf_counter()
+    for i in range(rounds):
+        controller.set_group_color("room", i % 256, 0, 255 - i % 256)
+    elapsed = time.perf_counter() - start
+    controller.close()
+    return rounds * len(server.addresses) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bulbs", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    server = FakeBulbServer(args.bulbs, args.latency_ms).start()
+    try:
+        pooled = run(server, fake_device, args.rounds)
+        reconnecting = run(server, fake_device_reconnecting, args.rounds)
+    finally:
+        server.stop()
+
+    print(f"{args.bulbs} fake bulbs, {args.latency_ms:.0f} ms device latency, {args.rounds} group colors")
+    print(f"  persistent pool:        {pooled:8.0f} commands/sec")
+    print(f"  reconnect per command:  {reconnecting:8.0f} commands/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Concurrent Write Stress Test
+64 writers append scores to a handful of shared users at the same time, then
+every user's score count is checked against what was written. Any lost
+update fails the run.
+
+Modes:
+    cache     threads -> CachedUserStore (striped per-user locks) -> SQLite
+    sqlite    threads -> SQLiteUserStore (optimistic version checks)
+    processes separate processes -> one SQLite file (optimistic version checks)
+
+The same load is also run with a plain get()/put() read-modify-write, which
+is what the endpoints used to do, to show how many scores that loses.
+
+Usage:
+    python benchmarks/bench_concurrency.py --writers 64 --users 16 --scores 200
+"""
+
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import SQLiteUserStore
+from user_cache import CachedUserStore
+
+
+def add_score(score):
+    def mutate(user):
+        user["scores"].append(score)
+        return user
+    return mutate
+
+
+def write_scores(store, writer: int, users: int, scores: int, atomic: bool):
+    for i in range(scores):
+        username = f"user{(writer + i) % users}"
+        score = {"writer": writer, "n": i, "percentage": 50.0}
+        if atomic:
+            store.update(username, add_score(score))
+        else:
+            user = store.get(username)
+            user["scores"].append(score)
+            store.put(username, user)
+
+
+def process_writer(db_path, writer: int, users: int, scores: int, atomic: bool, start_event):
+    store = SQLiteUserStore(db_path)
+    start_event.wait()
+    write_scores(store, writer, users, scores, atomic)
+    store.close()
+
+
+def run(mode: str, atomic: bool, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "users.db"
+        backend = SQLiteUserStore(db_path)
+        backend.put_many({f"user{u}": {"scores": []} for u in range(args.users)})
+        if mode == "cache":
+            store = CachedUserStore(backend, journal_path=Path(tmp) / "users.journal")
+        else:
+            store = backend
+
+        start = time.perf_counter()
+        if mode == "processes":
+            ctx = multiprocessing.get_context("spawn")
+            go = ctx.Event()
+            workers = [ctx.Process(target=process_writer, args=(db_path, w, args.users, args.scores, atomic, go))
+                       for w in range(args.writers)]
+            for p in workers:
+                p.start()
+            # Don't count process startup
+            time.sleep(2)
+            start = time.perf_counter()
+            go.set()
+        else:
+            workers = [threading.Thread(target=write_scores, args=(store, w, args.users, args.scores, atomic))
+                       for w in range(args.writers)]
+            for t in workers:
+                t.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+
+        stored = sum(len(user["scores"]) for _, user in store.items())
+        if mode == "cache":
+            store.close()
+        backend.close()
+
+    written = args.writers * args.scores
+    return {"written": written, "lost": written - stored, "writes_per_s": written / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=64)
+    parser.add_argument("--users", type=int, default=16, help="Shared users (fewer = more contention)")
+    parser.add_argument("--scores", type=int, default=200, help="Scores per writer")
+    parser.add_argument("--modes", nargs="+", default=["cache", "sqlite", "processes"])
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.scores} scores over {args.users} users")
+    print(f"{'mode':10} {'update':>8} {'writes/s':>10} {'lost':>7}")
+    failed = False
+    for mode in args.modes:
+        for atomic in (False, True):
+            r = run(mode, atomic, args)
+            print(f"{mode:10} {'atomic' if atomic else 'get/put':>8} {r['writes_per_s']:>10,.0f} {r['lost']:>7}")
+            if atomic and r["lost"]:
+                failed = True
+    if failed:
+        sys.exit("FAIL: atomic updates lost scores")
+    print("OK: no scores lost with atomic updates")
+
+
+if __name__ == "__main__":
+    main()
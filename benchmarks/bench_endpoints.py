@@ -0,0 +1,175 @@
+"""
+Endpoint Microbenchmarks
+Per-operation latency of the hot paths against a synthetic dataset
+(synthetic_data.py), with machine-readable results and a regression check
+against a saved baseline.
+
+- calculate_streak, get_streak_color: streak_tracker functions, called directly
+- get_leaderboard: GET /api/leaderboard?limit=50
+- get_study_history: GET /api/study-history/<random user>?days=30
+- record_score_user: POST /api/record-score/<random user>
+- start_session: POST /api/session/start/<random user>
+- heartbeat_session, get_presence: POST /api/session/heartbeat/<random user>
+  and GET /api/presence (skipped for --ref trees without them)
+
+Requests go through Flask's test client; only the app's own time is counted
+(the WSGI call, including after_request hooks), not the client's. The app
+runs in a child process from a copy of the working tree, or of --ref, with
+the generated data in its data directory, so runs are reproducible and never
+touch the repo's data/.
+
+Usage:
+    python benchmarks/bench_endpoints.py                           # 1k users, compare to baseline
+    python benchmarks/bench_endpoints.py --users 20000 --output /tmp/results.json
+    python benchmarks/bench_endpoints.py --save-baseline           # record benchmarks/endpoints_baseline.json
+    python benchmarks/bench_endpoints.py --ref HEAD~5 --baseline none
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import results
+import synthetic_data
+from bench_http import export
+
+BASELINE_PATH = Path(__file__).resolve().parent / "endpoints_baseline.json"
+
+
+def measure(app_dir: Path, iterations: int, seed: int) -> dict:
+    """Runs inside the child process, with app_dir as the working directory."""
+    os.chdir(app_dir)
+    sys.path.insert(0, str(app_dir))
+    import server
+    import streak_tracker
+    from timestamps import now_ms, to_iso
+
+    app = server.app
+    client = app.test_client()
+    usernames = sorted(username for username, _ in server.store.items())
+    rng = random.Random(seed)
+
+    elapsed = [0.0]
+    wsgi_app = app.wsgi_app
+
+    def timed_app(environ, start_response):
+        start = time.perf_counter()
+        body = wsgi_app(environ, start_response)
+        try:
+            chunks = list(body)
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+        elapsed[0] = time.perf_counter() - start
+        return chunks
+
+    app.wsgi_app = timed_app
+
+    def request(method: str, url: str, **kwargs) -> float:
+        response = client.open(url, method=method, **kwargs)
+        assert response.status_code < 400, (url, response.status_code, response.get_data()[:200])
+        return elapsed[0]
+
+    def call(fn, *args) -> float:
+        start = time.perf_counter()
+        fn(*args)
+        return time.perf_counter() - start
+
+    def score_body():
+        return {"timestamp": to_iso(now_ms()), "exam": rng.choice(synthetic_data.EXAMS),
+                "score": 600, "total": 800, "percentage": round(rng.uniform(30, 100), 2)}
+
+    cases = {
+        "calculate_streak": lambda: call(streak_tracker.calculate_streak),
+        "get_streak_color": lambda: call(streak_tracker.get_streak_color, rng.randrange(40)),
+        "get_leaderboard": lambda: request("GET", "/api/leaderboard?limit=50"),
+        "get_study_history": lambda: request("GET", f"/api/study-history/{rng.choice(usernames)}?days=30"),
+        "record_score_user": lambda: request("POST", f"/api/record-score/{rng.choice(usernames)}",
+                                             json=score_body()),
+        "start_session": lambda: request("POST", f"/api/session/start/{rng.choice(usernames)}"),
+    }
+    if "heartbeat_session" in app.view_functions:
+        # Sessions started above stay live for the whole run
+        started = usernames[:max(1, len(usernames) // 10)]
+        for username in started:
+            client.post(f"/api/session/start/{username}")
+        cases["heartbeat_session"] = lambda: request("POST", f"/api/session/heartbeat/{rng.choice(started)}")
+        cases["get_presence"] = lambda: request("GET", "/api/presence")
+
+    out = {}
+    for name, case in cases.items():
+        for _ in range(max(1, iterations // 10)):
+            case()
+        out[name] = results.summarize([case() * 1000 for _ in range(iterations)])
+    return out
+
+
+def run(ref, iterations: int, dataset: dict) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        app_dir = Path(tmp) / "app"
+        export(ref, app_dir)
+        synthetic_data.write(app_dir / "data", **dataset)
+        out = subprocess.run(
+            [sys.executable, __file__, "--measure", str(app_dir),
+             "--iterations", str(iterations), "--seed", str(dataset["seed"])],
+            check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    synthetic_data.add_arguments(parser)
+    parser.add_argument("--iterations", type=int, default=2000, help="Timed calls per benchmark")
+    parser.add_argument("--ref", help="Git revision to benchmark instead of the working tree")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH),
+                        help="Results file to compare against ('none' to skip)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results to --baseline")
+    parser.add_argument("--metric", default="p50_ms", help="Metric compared with the baseline")
+    parser.add_argument("--tolerance", type=float, default=results.DEFAULT_TOLERANCE,
+                        help="Allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(Path(args.measure), args.iterations, args.seed)))
+        return
+
+    dataset = synthetic_data.dataset_params(args)
+    params = {"dataset": dataset, "iterations": args.iterations, "ref": args.ref}
+    current = run(args.ref, args.iterations, dataset)
+
+    print(f"{args.users} users, {args.scores} scores and {args.sessions} sessions each, "
+          f"{args.iterations} calls per benchmark")
+    print(f"{'benchmark':<24} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10}")
+    for name, r in current.items():
+        print(f"{name:<24} {r['p50_ms']:>9.4f} {r['p95_ms']:>9.4f} {r['p99_ms']:>9.4f} {r['ops_per_sec']:>10}")
+
+    if args.output:
+        results.save(args.output, current, params)
+        print(f"\nWrote {args.output}")
+
+    baseline_path = None if args.baseline == "none" else Path(args.baseline)
+    if args.save_baseline and baseline_path:
+        results.save(baseline_path, current, params)
+        print(f"Saved baseline to {baseline_path}")
+    elif baseline_path and baseline_path.exists():
+        baseline = results.load(baseline_path)
+        if baseline.get("params", {}).get("dataset") != dataset:
+            print(f"\n⚠️ {baseline_path.name} was recorded with a different dataset: {baseline['params'].get('dataset')}")
+        rows = results.compare(current, baseline, args.metric, args.tolerance)
+        if results.print_comparison(rows, args.metric, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
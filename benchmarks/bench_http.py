@@ -0,0 +1,153 @@
+"""
+HTTP Caching Benchmark
+Replays a browser-like mix of GET requests (/, static files, /status,
+/api/leaderboard, /api/study-history/<user>) against two versions of the
+app and reports bytes on the wire and server CPU per 1k requests.
+
+The client behaves like a browser: it sends Accept-Encoding and revalidates
+with If-None-Match using the last ETag it saw for each URL. A score is posted
+every 50 requests, so the leaderboard keeps changing.
+
+"before" is exported from a git revision (e.g. the commit before the caching
+layer; default HEAD~1) and "after" is the working tree. Each runs in its own
+process through Flask's test client.
+
+Usage:
+    python benchmarks/bench_http.py --before-ref HEAD~1 --requests 1000
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+USERS = 20
+
+
+def measure(app_dir: Path, requests: int) -> dict:
+    """Runs inside the child process, with app_dir as the working directory."""
+    os.chdir(app_dir)
+    sys.path.insert(0, str(app_dir))
+    import server
+
+    # Count only the app's own CPU time, not the test client's
+    server_cpu = [0.0]
+    wsgi_app = server.app.wsgi_app
+
+    def timed_app(environ, start_response):
+        start = time.process_time()
+        body = wsgi_app(environ, start_response)
+        try:
+            chunks = list(body)
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+        server_cpu[0] += time.process_time() - start
+        return chunks
+
+    server.app.wsgi_app = timed_app
+    client = server.app.test_client()
+    usernames = [f"bench{i}" for i in range(USERS)]
+    for name in usernames:
+        client.post("/api/login", json={"username": name})
+
+    def post_score():
+        client.post(f"/api/record-score/{random.choice(usernames)}", json={
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "exam": "NEET_PG", "percentage": round(random.uniform(20, 100), 1),
+        })
+
+    for _ in range(50):
+        post_score()
+
+    html = client.get("/").get_data(as_text=True)
+    statics = [part.split('"')[0] for part in html.split('"/static/')[1:]]
+    urls = (["/", "/status", "/api/leaderboard", "/api/leaderboard?limit=50"]
+            + [f"/static/{s}" for s in statics]
+            + [f"/api/study-history/{name}?days=30" for name in usernames[:5]])
+
+    etags = {}
+    wire_bytes = 0
+    statuses = {}
+    rng = random.Random(0)
+    server_cpu[0] = 0.0
+    for i in range(requests):
+        if i % 50 == 49:
+            # Writes aren't part of the GET mix being measured
+            spent = server_cpu[0]
+            post_score()
+            server_cpu[0] = spent
+        url = rng.choice(urls)
+        headers = {"Accept-Encoding": "gzip, deflate, br"}
+        if url in etags:
+            headers["If-None-Match"] = etags[url]
+        response = client.get(url, headers=headers)
+        body = response.get_data()
+        if response.headers.get("ETag"):
+            etags[url] = response.headers["ETag"]
+        head = f"HTTP/1.1 {response.status}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in response.headers.items())
+        wire_bytes += len(head) + 2 + len(body)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    cpu = server_cpu[0]
+
+    return {
+        "bytes_per_1k": round(wire_bytes * 1000 / requests),
+        "cpu_ms_per_1k": round(cpu * 1000 * 1000 / requests, 1),
+        "statuses": statuses,
+    }
+
+
+def export(ref, dest: Path):
+    """Copy the app at a git revision (or the working tree when ref is None) to dest."""
+    if ref is None:
+        shutil.copytree(REPO, dest, ignore=shutil.ignore_patterns(".git", "data", "__pycache__"))
+    else:
+        archive = subprocess.run(["git", "archive", ref], cwd=REPO, check=True, capture_output=True).stdout
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(dest)
+        shutil.rmtree(dest / "data", ignore_errors=True)
+    (dest / "data").mkdir()
+
+
+def run(ref, requests: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        app_dir = Path(tmp) / "app"
+        export(ref, app_dir)
+        out = subprocess.run(
+            [sys.executable, __file__, "--measure", str(app_dir), "--requests", str(requests)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--before-ref", default="HEAD~1", help="Git revision to compare against")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        random.seed(0)
+        result = measure(Path(args.measure), args.requests)
+        print(json.dumps(result))
+        return
+
+    results = {"before": run(args.before_ref, args.requests), "after": run(None, args.requests)}
+    print(f"{'':8} {'bytes/1k req':>14} {'CPU ms/1k req':>14}  statuses")
+    for name, r in results.items():
+        print(f"{name:8} {r['bytes_per_1k']:>14,} {r['cpu_ms_per_1k']:>14}  {r['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
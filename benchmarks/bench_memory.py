@@ -0,0 +1,160 @@
+"""
+User Cache Memory Benchmark
+Resident memory of the in-memory user cache (user_cache.py), reported per
+100k users, for the working tree and, with --ref, an earlier revision, on
+the same synthetic dataset (synthetic_data.py). Most real users haven't
+logged in for weeks, so by default 70% of the generated users are inactive
+(--inactive).
+
+For each tree the users are first written to SQLite in one child process.
+A second, fresh child process then loads them into a CachedUserStore; the
+figure is its RSS growth across the load. Load time, and get() latency for
+recently active and inactive users, are reported alongside.
+
+Usage:
+    python benchmarks/bench_memory.py --users 20000
+    python benchmarks/bench_memory.py --users 20000 --ref HEAD~1
+"""
+
+import argparse
+import gc
+import inspect
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import results
+import synthetic_data
+from bench_http import export
+
+PER_USERS = 100_000
+GET_SAMPLES = 2000
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak rather than current RSS, but the load is the peak here
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def populate(app_dir: Path):
+    """Child process: users.json -> data/users.db, so the measuring process starts clean."""
+    os.chdir(app_dir)
+    sys.path.insert(0, str(app_dir))
+    import serializer
+    from storage import SQLiteUserStore
+    backend = SQLiteUserStore(app_dir / "data" / "users.db")
+    backend.put_many(serializer.load_file(app_dir / "data" / "users.json"))
+    backend.close()
+
+
+def measure(app_dir: Path, cold_after_days: float, seed: int) -> dict:
+    """Child process: load the users into a CachedUserStore and measure it."""
+    os.chdir(app_dir)
+    sys.path.insert(0, str(app_dir))
+    from storage import SQLiteUserStore
+    from timestamps import now_ms
+    from user_cache import CachedUserStore
+
+    backend = SQLiteUserStore(app_dir / "data" / "users.db")
+    # Revisions before the cold tier don't take cold_after_days
+    options = {"journal_path": app_dir / "data" / "users.journal"}
+    if "cold_after_days" in inspect.signature(CachedUserStore).parameters:
+        options["cold_after_days"] = cold_after_days
+
+    gc.collect()
+    before = rss_bytes()
+    start = time.perf_counter()
+    store = CachedUserStore(backend, **options)
+    load_seconds = time.perf_counter() - start
+    gc.collect()
+    grown = rss_bytes() - before
+
+    cutoff = now_ms() - cold_after_days * synthetic_data.DAY_MS
+    groups = {"active": [], "inactive": []}
+    for username, user in store.items():
+        groups["active" if user.get("last_login_ms", 0) >= cutoff else "inactive"].append(username)
+
+    rng = random.Random(seed)
+    out = {
+        "users": store.count(),
+        "rss_mb_per_100k": round(grown / store.count() * PER_USERS / 2 ** 20, 1),
+        "load_seconds": round(load_seconds, 2),
+    }
+    for group, usernames in groups.items():
+        if not usernames:
+            continue
+        samples = []
+        for username in (rng.choice(usernames) for _ in range(GET_SAMPLES)):
+            t = time.perf_counter()
+            store.get(username)
+            samples.append((time.perf_counter() - t) * 1e6)
+        out[f"get_{group}_us"] = round(statistics.median(samples), 1)
+    store.close()
+    return out
+
+
+def run(ref, dataset: dict, cold_after_days: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        app_dir = Path(tmp) / "app"
+        export(ref, app_dir)
+        synthetic_data.write(app_dir / "data", **dataset)
+        subprocess.run([sys.executable, __file__, "--populate", str(app_dir)], check=True)
+        out = subprocess.run(
+            [sys.executable, __file__, "--measure", str(app_dir),
+             "--cold-after-days", str(cold_after_days), "--seed", str(dataset["seed"])],
+            check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    synthetic_data.add_arguments(parser)
+    parser.set_defaults(users=20_000, inactive=0.7)
+    parser.add_argument("--cold-after-days", type=float, default=14,
+                        help="user_cold_after_days for trees that have it")
+    parser.add_argument("--ref", help="Also measure this git revision, for comparison")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--populate", help=argparse.SUPPRESS)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.populate:
+        populate(Path(args.populate))
+        return
+    if args.measure:
+        print(json.dumps(measure(Path(args.measure), args.cold_after_days, args.seed)))
+        return
+
+    dataset = synthetic_data.dataset_params(args)
+    runs = {"working tree": run(None, dataset, args.cold_after_days)}
+    if args.ref:
+        runs = {args.ref: run(args.ref, dataset, args.cold_after_days), **runs}
+
+    print(f"{args.users} users ({args.inactive:.0%} inactive), {args.scores} scores and "
+          f"{args.sessions} sessions each, cold after {args.cold_after_days:g} days")
+    print(f"{'tree':<16} {'RSS MB/100k':>12} {'load s':>8} {'get active us':>14} {'get inactive us':>16}")
+    for name, r in runs.items():
+        print(f"{name:<16} {r['rss_mb_per_100k']:>12} {r['load_seconds']:>8} "
+              f"{r.get('get_active_us', '-'):>14} {r.get('get_inactive_us', '-'):>16}")
+
+    if args.output:
+        results.save(args.output, runs, {"dataset": dataset, "cold_after_days": args.cold_after_days, "ref": args.ref})
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
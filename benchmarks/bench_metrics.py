@@ -0,0 +1,130 @@
+"""
+Metrics Overhead Benchmark
+Times a mix of GET requests through the app's WSGI callable with the
+/metrics instrumentation middleware on and off, alternating rounds so
+both see the same machine state, and reports the relative overhead.
+
+The app runs from a copy of the working tree (fresh data directory) in a
+child process, like bench_http.py.
+
+Usage:
+    python benchmarks/bench_metrics.py --rounds 20 --requests 500
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_http import export
+
+USERS = 20
+
+
+def measure(app_dir: Path, rounds: int, requests: int) -> dict:
+    """Runs inside the child process, with app_dir as the working directory."""
+    os.chdir(app_dir)
+    sys.path.insert(0, str(app_dir))
+    import server
+    from timestamps import now_ms, to_iso
+
+    app = server.app
+    client = app.test_client()
+    usernames = [f"bench{i}" for i in range(USERS)]
+    for name in usernames:
+        client.post("/api/login", json={"username": name})
+    for i in range(200):
+        client.post(f"/api/record-score/{usernames[i % USERS]}", json={
+            "timestamp": to_iso(now_ms()), "exam": "NEET_PG", "percentage": 40 + i % 60,
+        })
+    urls = ["/status", "/api/leaderboard?limit=50", "/api/streak/bench1"] + [
+        f"/api/study-history/{name}?days=30" for name in usernames[:5]]
+
+    # instrument_app() wrapped the WSGI callable and added a before_request
+    # hook; keep both versions to switch between
+    instrumented = app.wsgi_app
+    plain = instrumented.__wrapped__
+    hooks = app.before_request_funcs[None]
+    current = [instrumented]
+
+    def set_enabled(on: bool):
+        current[0] = instrumented if on else plain
+        if on and instrumented.route_hook not in hooks:
+            hooks.insert(0, instrumented.route_hook)
+        elif not on and instrumented.route_hook in hooks:
+            hooks.remove(instrumented.route_hook)
+
+    rng = random.Random(0)
+    batch = [rng.choice(urls) for _ in range(requests)]
+
+    # Count only the app's own time, not the test client's
+    app_time = [0.0]
+    def timed_app(environ, start_response):
+        start = time.perf_counter()
+        body = current[0](environ, start_response)
+        try:
+            chunks = list(body)
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+        app_time[0] += time.perf_counter() - start
+        return chunks
+
+    app.wsgi_app = timed_app
+
+    def run_batch() -> float:
+        app_time[0] = 0.0
+        for url in batch:
+            client.get(url)
+        return app_time[0]
+
+    run_batch()
+    timings = {True: [], False: []}
+    for i in range(rounds):
+        for on in ((True, False) if i % 2 else (False, True)):
+            set_enabled(on)
+            timings[on].append(run_batch())
+    set_enabled(True)
+
+    on, off = statistics.median(timings[True]), statistics.median(timings[False])
+    return {
+        "us_per_request_off": round(off / requests * 1e6, 1),
+        "us_per_request_on": round(on / requests * 1e6, 1),
+        "overhead_pct": round((on - off) / off * 100, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(Path(args.measure), args.rounds, args.requests)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_dir = Path(tmp) / "app"
+        export(None, app_dir)
+        out = subprocess.run(
+            [sys.executable, __file__, "--measure", str(app_dir),
+             "--rounds", str(args.rounds), "--requests", str(args.requests)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+    r = json.loads(out.strip().splitlines()[-1])
+    print(f"metrics off: {r['us_per_request_off']} us/request")
+    print(f"metrics on:  {r['us_per_request_on']} us/request ({r['overhead_pct']:+.2f}%)")
+
+
+if __name__ == "__main__":
+    main()
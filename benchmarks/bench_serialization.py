@@ -0,0 +1,104 @@
+"""
+JSON Serialization Benchmark
+Times dumping and loading a users.json-shaped map with each JSON backend, and
+reports the file size. "json indent=2" is the old on-disk format.
+
+Also times the /api/leaderboard body: jsonify() on every request versus the
+pre-serialized body cache.
+
+Usage:
+    python benchmarks/bench_serialization.py --users 100000
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_storage import make_user
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def backends() -> dict:
+    result = {
+        "json indent=2": (lambda obj: json.dumps(obj, indent=2).encode(), json.loads),
+        "json compact": (lambda obj: json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode(), json.loads),
+    }
+    if orjson is not None:
+        result["orjson"] = (orjson.dumps, orjson.loads)
+    return result
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_files(users: dict, repeat: int):
+    print(f"{'backend':14} {'dump ms':>9} {'load ms':>9} {'size MB':>9}")
+    for name, (dumps, loads) in backends().items():
+        data = dumps(users)
+        dump_s = best_of(repeat, lambda: dumps(users))
+        load_s = best_of(repeat, lambda: loads(data))
+        print(f"{name:14} {dump_s * 1000:>9.0f} {load_s * 1000:>9.0f} {len(data) / 1e6:>9.1f}")
+
+
+def bench_leaderboard(requests: int):
+    from datetime import datetime, timezone
+    from flask import Flask, jsonify
+
+    import serializer
+    from http_cache import BodyCache, JSONProvider
+    from leaderboard import WeeklyLeaderboard
+
+    app = Flask(__name__)
+    app.json = JSONProvider(app)
+    board = WeeklyLeaderboard()
+    now = datetime.now(timezone.utc).isoformat()
+    for i in range(1000):
+        board.set_display_name(f"user{i}", f"Grinder_{i}")
+        board.add_score(f"user{i}", {"timestamp": now, "exam": "NEET_PG", "percentage": 40 + i % 60})
+    bodies = BodyCache()
+
+    def uncached():
+        jsonify({"status": "success", "leaderboard": board.top(100)}).get_data()
+
+    def cached():
+        bodies.response((100, None), board.version(), lambda: {
+            "status": "success", "leaderboard": board.top(100),
+        }).get_data()
+
+    print(f"\n/api/leaderboard?limit=100 body ({serializer.BACKEND}), per request:")
+    with app.test_request_context("/api/leaderboard?limit=100"):
+        for name, fn in (("build + jsonify", uncached), ("cached bytes", cached)):
+            per_request = statistics.median(best_of(1, fn) for _ in range(requests))
+            print(f"  {name:16} {per_request * 1e6:8.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    users = {f"user{i}": make_user(i) for i in range(args.users)}
+    print(f"{args.users} users")
+    bench_files(users, args.repeat)
+    bench_leaderboard(args.requests)
+
+
+if __name__ == "__main__":
+    main()
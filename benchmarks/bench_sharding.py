@@ -0,0 +1,74 @@
+"""
+Sharding Benchmark
+Single-user write latency and full load time against the number of shards,
+plus how many users a reshard moves and how long it takes.
+
+Usage:
+    python benchmarks/bench_sharding.py                          # json, 100k users, 1/4/16 shards
+    python benchmarks/bench_sharding.py --backend sqlite --users 1000000 --shards 1 8
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_storage import make_user, percentile
+from storage import ShardedUserStore
+
+
+def run(backend: str, users: int, shards: int, writes: int, reshard_to: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ShardedUserStore(Path(tmp), shards, backend)
+        store.put_many({f"user{i}": make_user(i) for i in range(users)})
+
+        start = time.perf_counter()
+        assert len(store.all()) == users
+        load_ms = (time.perf_counter() - start) * 1000
+
+        samples = []
+        for i in range(writes):
+            username = f"user{(i * 7919) % users}"
+            start = time.perf_counter()
+            store.update(username, lambda user: dict(user, last_login="2026-02-01T00:00:00+00:00"))
+            samples.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        moved = store.reshard(reshard_to)
+        reshard_s = time.perf_counter() - start
+        assert store.count() == users
+        store.close()
+
+    return {
+        "shards": shards,
+        "load_ms": round(load_ms, 1),
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "reshard_to": reshard_to,
+        "moved_pct": round(moved / users * 100, 1),
+        "reshard_s": round(reshard_s, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["sqlite", "json"], default="json")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--writes", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.backend}, {args.users} users")
+    print(f"{'shards':>6} {'load ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'reshard':>9} {'moved':>7} {'seconds':>8}")
+    for shards in args.shards:
+        r = run(args.backend, args.users, shards, args.writes, shards + 1)
+        print(f"{r['shards']:>6} {r['load_ms']:>9} {r['p50_ms']:>9} {r['p99_ms']:>9} "
+              f"{'-> ' + str(r['reshard_to']):>9} {r['moved_pct']:>6}% {r['reshard_s']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Shared Snapshot Benchmark
+Cost of the shared leaderboard snapshot (shared_snapshot.py) for a
+leaderboard of --users users: building and publishing it, a reader's first
+read after a publish (copy + parse), and the steady-state read every
+/api/leaderboard request does (one seq check), next to the local
+leaderboard.top() call it replaces.
+
+Usage:
+    python benchmarks/bench_snapshot.py --users 100000
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import serializer
+from leaderboard import WeeklyLeaderboard, snapshot
+from shared_snapshot import SnapshotReader, SnapshotWriter
+from timestamps import now_ms
+
+EXAMS = ("NEET_PG", "USMLE", "PLAB", "FMGE", "OTHER")
+
+
+def per_call_us(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        samples.append((time.perf_counter() - start) / repeat * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    now = now_ms()
+    board = WeeklyLeaderboard()
+    for i in range(args.users):
+        board.add(f"user{i}", rng.choice(EXAMS), rng.uniform(20, 100), now - rng.randrange(6 * 86_400_000), now)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "leaderboard.snapshot"
+        writer = SnapshotWriter(path)
+        reader = SnapshotReader(path)
+
+        build_us = per_call_us(lambda: serializer.dumps(snapshot(board)), 20)
+        payload = serializer.dumps(snapshot(board))
+        publish_us = per_call_us(lambda: writer.publish(payload), 200)
+
+        def fresh_read():
+            writer.publish(payload)
+            reader.current()
+        # Subtract the publish it has to do to make the read a fresh one
+        fresh_us = per_call_us(fresh_read, 200) - publish_us
+        reader.current()
+        steady_us = per_call_us(reader.current, 100_000)
+        local_us = per_call_us(lambda: board.top(10), 10_000)
+        writer.close()
+        reader.close()
+
+    print(f"{args.users} users, snapshot {len(payload) / 1024:.1f} KiB ({1 + len(EXAMS)} tables of 100 rows)")
+    print(f"  build + serialize (publisher):   {build_us:>9.1f} us")
+    print(f"  publish (seqlock write):         {publish_us:>9.1f} us")
+    print(f"  first read after publish:        {fresh_us:>9.1f} us")
+    print(f"  steady-state read:               {steady_us:>9.2f} us")
+    print(f"  local leaderboard.top(10):       {local_us:>9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
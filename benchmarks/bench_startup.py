@@ -0,0 +1,129 @@
+"""
+Startup Benchmark
+Time from a fresh interpreter to `import server` finishing and to the first
+response (GET /status), with a `python -X importtime` breakdown of the
+slowest imports and a check that optional heavy modules (NumPy, TinyTuya)
+are not imported at startup.
+
+Each run is a new process against a copy of the working tree (fresh data
+directory, like bench_http.py). One warm-up run compiles the .pyc files
+first, as a deployed dyno would have.
+
+Results are compared with benchmarks/startup_baseline.json (see
+results.py); the script exits non-zero if import time regressed by more than
+--tolerance, so it can run in CI. The baseline is machine-specific: re-record
+it with --save after an intended change or on a new machine.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --top 15
+    python benchmarks/bench_startup.py --save
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import results
+from bench_http import export
+
+BASELINE_PATH = Path(__file__).resolve().parent / "startup_baseline.json"
+# Should only be imported on first use, never at startup
+LAZY_MODULES = ("numpy", "tinytuya", "analytics")
+
+CHILD = f"""
+import json, sys, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+server.app.test_client().get("/status")
+served = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (served - start) * 1000,
+    "eager": [m for m in {LAZY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Module -> cumulative import time in ms, from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative) / 1000
+    return modules
+
+
+def run_once(app_dir: Path) -> tuple:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD],
+        cwd=app_dir, check=True, capture_output=True, text=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1]), parse_importtime(proc.stderr)
+
+
+def measure(count: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        app_dir = Path(tmp) / "app"
+        export(None, app_dir)
+        run_once(app_dir)
+        runs = [run_once(app_dir) for _ in range(count)]
+
+    timings = [r for r, _ in runs]
+    modules = {}
+    for _, breakdown in runs:
+        for name, ms in breakdown.items():
+            modules.setdefault(name, []).append(ms)
+    return {
+        "results": {
+            "import": results.summarize([r["import_ms"] for r in timings]),
+            "first_request": results.summarize([r["first_request_ms"] for r in timings]),
+        },
+        "eager": sorted({m for r in timings for m in r["eager"]}),
+        "modules": {name: round(statistics.median(ms), 2) for name, ms in modules.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    parser.add_argument("--tolerance", type=float, default=results.DEFAULT_TOLERANCE,
+                        help="Allowed import time growth over the baseline (0.25 = 25%%)")
+    parser.add_argument("--save", action="store_true", help="Record this run as the baseline")
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    current = result["results"]
+    print(f"import server:  {current['import']['p50_ms']:.1f} ms")
+    print(f"first response: {current['first_request']['p50_ms']:.1f} ms")
+    print("\nslowest imports (cumulative ms):")
+    top_level = {name: ms for name, ms in result["modules"].items() if "." not in name and name != "server"}
+    for name, ms in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {ms:>8.1f}  {name}")
+
+    failed = False
+    if result["eager"]:
+        print(f"\n❌ imported at startup, should be lazy: {', '.join(result['eager'])}")
+        failed = True
+
+    if args.save:
+        results.save(BASELINE_PATH, current, {"runs": args.runs})
+        print(f"\nSaved baseline to {BASELINE_PATH.name}")
+    elif BASELINE_PATH.exists():
+        rows = results.compare(current, results.load(BASELINE_PATH), tolerance=args.tolerance)
+        failed = results.print_comparison(rows, tolerance=args.tolerance) or failed
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Streak Status Benchmark
+Times streak_tracker.get_status() against the previous behaviour of
+re-parsing config.json and the study log on every call and walking the log
+one day at a time.
+
+Usage:
+    python benchmarks/bench_status.py --days 730 --repeat 2000
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import streak_tracker
+from app_config import CONFIG_PATH, get_config
+
+
+def reparse_config():
+    """The old per-call cost: open and parse config.json."""
+    with open(CONFIG_PATH, "r") as f:
+        return json.load(f)
+
+
+def get_status_uncached() -> dict:
+    """get_status() as it was: three config parses, two study log reads, a day-by-day walk."""
+    reparse_config()
+    log = streak_tracker._load_study_log()
+    check_date = (datetime.now() - timedelta(hours=4)).date()
+    streak = 0
+    while True:
+        date_str = check_date.strftime("%Y-%m-%d")
+        if date_str in log and log[date_str].get("success", False):
+            streak += 1
+            check_date = check_date - timedelta(days=1)
+        else:
+            break
+    config = reparse_config()
+    colors = config.get("streak_colors", {})
+    for threshold in sorted([int(k) for k in colors.keys()], reverse=True):
+        if streak >= threshold:
+            break
+    reparse_config()
+    streak_tracker._load_study_log()
+    return streak
+
+
+def time_calls(fn, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365, help="Days of study log")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        streak_tracker.STUDY_LOG_PATH = Path(tmp) / "study_log.json"
+        today = date.today()
+        streak_tracker._save_study_log({
+            (today - timedelta(days=i)).isoformat(): {"minutes": 150, "success": True, "logged_at": ""}
+            for i in range(args.days)
+        })
+        get_config()
+
+        before = time_calls(get_status_uncached, args.repeat)
+        after = time_calls(streak_tracker.get_status, args.repeat)
+        lookup = time_calls(lambda: get_config().streak_color(17), args.repeat)
+
+    print(f"get_status() over {args.days} days of study log, {args.repeat} calls")
+    print(f"  uncached walk:      median {statistics.median(before):8.1f} us")
+    print(f"  indexed:            median {statistics.median(after):8.1f} us")
+    print(f"  streak_color():     median {statistics.median(lookup):8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Storage Write Benchmark
+Measures p50/p99 latency of a single-user write as the user count grows.
+
+Usage:
+    python benchmarks/bench_storage.py                       # sqlite, 1k..1M users
+    python benchmarks/bench_storage.py --backend json --sizes 1000 10000
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import JSONUserStore, SQLiteUserStore
+
+
+def make_user(i: int) -> dict:
+    return {
+        "created_at": "2026-01-11T07:31:04.048082+00:00",
+        "last_login": "2026-01-12T08:09:34.621016+00:00",
+        "display_name": f"Grinder_{i % 10000}",
+        "scores": [
+            {
+                "timestamp": "2026-01-11T16:00:40.919Z",
+                "exam": "NEET_PG",
+                "score": 500,
+                "total": 800,
+                "percentage": 62.5,
+            }
+        ],
+    }
+
+
+def populate(store, backend: str, n: int):
+    if backend == "sqlite":
+        conn = store._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO users (username, data) VALUES (?, ?)",
+                ((f"user{i}", json.dumps(make_user(i))) for i in range(n)),
+            )
+    else:
+        store.replace_all({f"user{i}": make_user(i) for i in range(n)})
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(backend: str, n: int, writes: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        if backend == "sqlite":
+            store = SQLiteUserStore(Path(tmp) / "users.db")
+        else:
+            store = JSONUserStore(Path(tmp) / "users.json")
+        populate(store, backend, n)
+
+        samples = []
+        for i in range(writes):
+            username = f"user{(i * 7919) % n}"
+            start = time.perf_counter()
+            user = store.get(username)
+            user["last_login"] = "2026-02-01T00:00:00+00:00"
+            store.put(username, user)
+            samples.append((time.perf_counter() - start) * 1000)
+        store.close()
+
+    return {
+        "backend": backend,
+        "users": n,
+        "writes": writes,
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["sqlite", "json"], default="sqlite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--writes", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'users':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for n in args.sizes:
+        # The JSON backend rewrites the whole file per write; keep its run short
+        writes = args.writes if args.backend == "sqlite" else min(args.writes, 20)
+        result = run(args.backend, n, writes)
+        print(f"{result['backend']:<8} {result['users']:>10} {result['p50_ms']:>10} {result['p99_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
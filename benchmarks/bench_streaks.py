@@ -0,0 +1,54 @@
+"""
+Streak Batch Benchmark
+Loads synthetic per-user daily study totals into a StreakTracker and times
+one evaluate_all() pass (streak, color tier and days-to-habit for everyone).
+
+Usage:
+    python benchmarks/bench_streaks.py --users 500000 --days 30
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from streak_tracker import StreakTracker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500_000)
+    parser.add_argument("--days", type=int, default=30, help="Days of history per user")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    today = date.today()
+    dates = [(today - timedelta(days=i)).isoformat() for i in range(args.days)]
+    tracker = StreakTracker(threshold_minutes=120)
+
+    start = time.perf_counter()
+    for i in range(args.users):
+        # Each user studies on a random subset of days, some past the threshold
+        daily = {d: {"minutes": rng.choice((30, 90, 150, 200))} for d in dates if rng.random() < 0.7}
+        tracker.load(f"user{i}", daily)
+    load_s = time.perf_counter() - start
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = tracker.evaluate_all()
+        timings.append(time.perf_counter() - start)
+
+    active = sum(1 for n in result["streak"] if n > 0)
+    print(f"{args.users} users x {args.days} days, loaded in {load_s:.1f}s")
+    print(f"evaluate_all: median {statistics.median(timings) * 1000:.0f} ms, {active} users with an active streak")
+
+
+if __name__ == "__main__":
+    main()
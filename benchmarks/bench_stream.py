@@ -0,0 +1,90 @@
+"""
+Event Hub Benchmark
+Opens many idle subscriptions on an EventHub and measures what a writer pays
+per publish(), how long the dispatcher takes to fan one event out to every
+client, memory per idle client, and that clients which never read are
+dropped once their buffer fills.
+
+Usage:
+    python benchmarks/bench_stream.py --clients 10000 --events 200
+"""
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from event_hub import EventHub
+
+
+def wait_for_dispatch(hub: EventHub, timeout: float = 30):
+    deadline = time.perf_counter() + timeout
+    while hub._pending and time.perf_counter() < deadline:
+        time.sleep(0.0005)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--buffer", type=int, default=64, help="Events buffered per client")
+    parser.add_argument("--readers", type=int, default=8, help="Threads draining client buffers")
+    args = parser.parse_args()
+
+    hub = EventHub(max_clients=args.clients, max_buffered=args.buffer)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subs = [hub.subscribe(["leaderboard"]) for _ in range(args.clients)]
+    per_client = (tracemalloc.get_traced_memory()[0] - before) / args.clients
+    tracemalloc.stop()
+
+    # Readers keep every client drained, like connected browsers would
+    stop = threading.Event()
+
+    def drain(part):
+        while not stop.is_set():
+            for sub in part:
+                sub.read(0)
+            time.sleep(0.001)
+
+    readers = [threading.Thread(target=drain, args=(subs[i::args.readers],), daemon=True) for i in range(args.readers)]
+    for t in readers:
+        t.start()
+
+    payload = {"changes": [{"rank": 1, "display_name": "Grinder_1234", "weekly_avg": 81.5, "scores_count": 12}], "size": 10}
+    publish_us = []
+    fanout_ms = []
+    for _ in range(args.events):
+        start = time.perf_counter()
+        hub.publish("leaderboard", "leaderboard", payload)
+        publish_us.append((time.perf_counter() - start) * 1e6)
+        wait_for_dispatch(hub)
+        fanout_ms.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.002)
+    stop.set()
+    for t in readers:
+        t.join()
+    connected = len(hub)
+
+    # Nobody reads now: after `buffer` more events every client is dropped
+    for _ in range(args.buffer + 1):
+        hub.publish("leaderboard", "leaderboard", payload)
+    deadline = time.perf_counter() + 30
+    while len(hub) and time.perf_counter() < deadline:
+        time.sleep(0.01)
+
+    print(f"{args.clients} idle clients, {args.events} events, {per_client:.0f} bytes per client")
+    print(f"  publish() on the writer:   median {statistics.median(publish_us):6.1f} us, max {max(publish_us):6.1f} us")
+    print(f"  fan-out to all clients:    median {statistics.median(fanout_ms):6.1f} ms")
+    print(f"  still connected after run: {connected}")
+    print(f"  after stalling readers:    {len(hub)} connected, {hub.dropped_total} dropped")
+    hub.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Fake Tuya Bulbs
+Local stand-ins for Tuya bulbs so BulbController can be exercised without hardware.
+
+Each fake bulb listens on its own 127.0.0.1 port and answers newline-delimited
+JSON commands after a configurable delay. This does not emulate Tuya's
+encrypted wire format; it models what matters for throughput: one TCP
+connection per bulb, one command in flight per connection, and device latency.
+
+Usage:
+    python benchmarks/fake_tuya.py --bulbs 50 --latency-ms 20
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import threading
+
+
+class FakeBulbServer:
+    """Runs N fake bulbs on an asyncio loop in a background thread."""
+
+    def __init__(self, count: int, latency_ms: float = 20.0, host: str = "127.0.0.1"):
+        self.count = count
+        self.latency = latency_ms / 1000
+        self.host = host
+        self.addresses = []
+        self._servers = []
+        self.commands_handled = 0
+        self.connections_opened = 0
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fake-tuya", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _shutdown(self):
+        for server in self._servers:
+            server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start_servers())
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _start_servers(self):
+        for i in range(self.count):
+            state = {"devId": f"fake{i:04d}", "dps": {"20": False, "22": 255, "24": "000000"}}
+            server = await asyncio.start_server(
+                lambda r, w, state=state: self._handle(r, w, state), self.host, 0
+            )
+            self._servers.append(server)
+            port = server.sockets[0].getsockname()[1]
+            self.addresses.append((state["devId"], f"{self.host}:{port}"))
+
+    async def _handle(self, reader, writer, state):
+        self.connections_opened += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                await asyncio.sleep(self.latency)
+                state["dps"].update(request.get("dps", {}))
+                self.commands_handled += 1
+                writer.write((json.dumps({"devId": state["devId"], "dps": state["dps"]}) + "\n").encode())
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+class FakeBulbDevice:
+    """BulbDevice-like client for FakeBulbServer (pass `fake_device` as BulbController's device_factory)."""
+
+    def __init__(self, device_id: str, ip: str, local_key: str = "", version: float = 3.3,
+                 persistent: bool = True):
+        host, port = ip.rsplit(":", 1)
+        self.device_id = device_id
+        self.address = (host, int(port))
+        self.persistent = persistent
+        self._sock = None
+        self._file = None
+
+    def _send(self, dps: dict) -> dict:
+        if self._sock is None:
+            self._sock = socket.create_connection(self.address, timeout=5)
+            self._file = self._sock.makefile("rb")
+        self._sock.sendall((json.dumps({"devId": self.device_id, "dps": dps}) + "\n").encode())
+        reply = json.loads(self._file.readline())
+        if not self.persistent:
+            self.close()
+        return reply
+
+    def status(self):
+        return self._send({})
+
+    def set_colour(self, r, g, b):
+        return self._send({"24": f"{r:02x}{g:02x}{b:02x}"})
+
+    def set_brightness(self, value):
+        return self._send({"22": value})
+
+    def turn_on(self):
+        return self._send({"20": True})
+
+    def turn_off(self):
+        return self._send({"20": False})
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = None
+
+
+def fake_device(device_id, ip, local_key, version):
+    return FakeBulbDevice(device_id, ip, local_key, version)
+
+
+def fake_device_reconnecting(device_id, ip, local_key, version):
+    """Opens a new connection for every command, like a non-persistent TinyTuya device."""
+    return FakeBulbDevice(device_id, ip, local_key, version, persistent=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bulbs", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    server = FakeBulbServer(args.bulbs, args.latency_ms).start()
+    print("Fake bulbs (device_id, ip) — paste into config.json \"bulbs\":")
+    for device_id, address in server.addresses:
+        print(f"  {device_id}  {address}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Load Test Harness
+Starts the server, drives /api/record-score/<username> and /api/leaderboard
+with concurrent keep-alive clients, and reports throughput per server core.
+
+Usage:
+    python benchmarks/loadtest.py                      # compare dev server vs gunicorn
+    python benchmarks/loadtest.py --server gunicorn --clients 32 --seconds 10
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+def cpu_seconds(pid: int) -> float:
+    """User+system CPU time of a process and its children (Linux /proc)."""
+    total = 0.0
+    pids = [pid]
+    children = Path(f"/proc/{pid}/task/{pid}/children")
+    if children.exists():
+        pids += [int(p) for p in children.read_text().split()]
+    for p in pids:
+        fields = Path(f"/proc/{p}/stat").read_text().rsplit(")", 1)[1].split()
+        total += (int(fields[11]) + int(fields[12])) / CLK_TCK
+    return total
+
+
+def start_server(kind: str, workdir: Path, port: int) -> subprocess.Popen:
+    env = dict(os.environ, PORT=str(port))
+    if kind == "dev":
+        cmd = [sys.executable, "server.py"]
+    else:
+        cmd = [sys.executable, "-m", "gunicorn", "server:app", "-c", "gunicorn.conf.py"]
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/status")
+            conn.getresponse().read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+def client(port: int, usernames, stop: threading.Event, counts: dict, write_ratio: float):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    rng = random.Random()
+    while not stop.is_set():
+        if rng.random() < write_ratio:
+            pct = rng.uniform(20, 100)
+            body = json.dumps({
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "exam": "NEET_PG", "score": round(pct * 8), "total": 800, "percentage": round(pct, 2),
+            })
+            conn.request("POST", f"/api/record-score/{rng.choice(usernames)}", body,
+                         {"Content-Type": "application/json"})
+            key = "record-score"
+        else:
+            conn.request("GET", "/api/leaderboard")
+            key = "leaderboard"
+        response = conn.getresponse()
+        response.read()
+        counts[key if response.status < 400 else "errors"] += 1
+
+
+def run(kind: str, clients: int, seconds: float, users: int, write_ratio: float) -> dict:
+    port = random.randint(20000, 40000)
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp) / "app"
+        shutil.copytree(REPO, workdir, ignore=shutil.ignore_patterns(".git", "data", "benchmarks"))
+        (workdir / "data").mkdir()
+        proc = start_server(kind, workdir, port)
+        try:
+            usernames = [f"load{i}" for i in range(users)]
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            for name in usernames:
+                conn.request("POST", "/api/login", json.dumps({"username": name}), {"Content-Type": "application/json"})
+                conn.getresponse().read()
+
+            counts = {"record-score": 0, "leaderboard": 0, "errors": 0}
+            stop = threading.Event()
+            threads = [
+                threading.Thread(target=client, args=(port, usernames, stop, counts, write_ratio), daemon=True)
+                for _ in range(clients)
+            ]
+            cpu_before = cpu_seconds(proc.pid)
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            time.sleep(seconds)
+            stop.set()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+            cpu_used = cpu_seconds(proc.pid) - cpu_before
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    total = counts["record-score"] + counts["leaderboard"]
+    return {
+        "server": kind,
+        "requests": total,
+        "errors": counts["errors"],
+        "req_per_sec": round(total / elapsed, 1),
+        "server_cpu_sec": round(cpu_used, 2),
+        # Throughput per fully used core: requests divided by CPU-seconds spent serving them
+        "req_per_core_sec": round(total / cpu_used, 1) if cpu_used else None,
+        **{k: v for k, v in counts.items() if k != "errors"},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["dev", "gunicorn", "both"], default="both")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    kinds = ["dev", "gunicorn"] if args.server == "both" else [args.server]
+    results = [run(k, args.clients, args.seconds, args.users, args.write_ratio) for k in kinds]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'server':<10} {'req/s':>10} {'req/core-s':>12} {'writes':>8} {'reads':>8} {'errors':>7}")
+    for r in results:
+        print(f"{r['server']:<10} {r['req_per_sec']:>10} {str(r['req_per_core_sec']):>12} "
+              f"{r['record-score']:>8} {r['leaderboard']:>8} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
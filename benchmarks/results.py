@@ -0,0 +1,107 @@
+"""
+Benchmark Results
+Machine-readable results and baseline comparison, shared by the benchmarks
+that are tracked over time (bench_endpoints.py, bench_startup.py).
+
+A results file is JSON:
+    {"environment": {...}, "params": {...},
+     "results": {"<benchmark>": {"p50_ms": ..., "p95_ms": ..., ...}}}
+
+compare() checks each benchmark's metric against a saved baseline and
+reports the ones that got slower by more than a tolerance. Baselines are
+machine-specific; record them on the machine that runs the comparison.
+"""
+
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+DEFAULT_TOLERANCE = 0.25
+
+
+def environment() -> dict:
+    """Where and on what the results were measured."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO,
+                                check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "measured_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples_ms) -> dict:
+    """Latency summary of per-operation timings in milliseconds."""
+    total = sum(samples_ms)
+    return {
+        "n": len(samples_ms),
+        "mean_ms": round(total / len(samples_ms), 4),
+        "p50_ms": round(statistics.median(samples_ms), 4),
+        "p95_ms": round(percentile(samples_ms, 95), 4),
+        "p99_ms": round(percentile(samples_ms, 99), 4),
+        "ops_per_sec": round(len(samples_ms) / total * 1000, 1) if total else None,
+    }
+
+
+def save(path, results: dict, params: dict = None):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    document = {"environment": environment(), "params": params or {}, "results": results}
+    path.write_text(json.dumps(document, indent=2) + "\n")
+
+
+def load(path) -> dict:
+    return json.loads(Path(path).read_text())
+
+
+def compare(results: dict, baseline: dict, metric: str = "p50_ms",
+            tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """
+    One row per benchmark present in both: (name, baseline value, current
+    value, relative change, regressed). Lower is better for every metric.
+    """
+    rows = []
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name, {}).get(metric)
+        now = current.get(metric)
+        if before is None or now is None:
+            continue
+        change = (now - before) / before if before else 0.0
+        rows.append((name, before, now, change, change > tolerance))
+    return rows
+
+
+def print_comparison(rows, metric: str = "p50_ms", tolerance: float = DEFAULT_TOLERANCE) -> bool:
+    """Print compare() rows. Returns True if anything regressed."""
+    print(f"\n{'benchmark':<24} {'baseline':>10} {'current':>10} {'change':>9}   ({metric}, tolerance {tolerance:.0%})")
+    for name, before, now, change, regressed in rows:
+        flag = "  ❌ regressed" if regressed else ""
+        print(f"{name:<24} {before:>10} {now:>10} {change:>+9.1%}{flag}")
+    return any(row[-1] for row in rows)
+
+
+if __name__ == "__main__":
+    # python benchmarks/results.py current.json baseline.json [tolerance]
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(2)
+    tolerance = float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_TOLERANCE
+    regressed = print_comparison(compare(load(sys.argv[1])["results"], load(sys.argv[2]), tolerance=tolerance),
+                                 tolerance=tolerance)
+    sys.exit(1 if regressed else 0)
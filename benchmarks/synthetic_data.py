@@ -0,0 +1,186 @@
+"""
+Synthetic Data Generator
+Realistic, reproducible data/users.json and data/study_log.json files for
+benchmarks and local load tests. The same seed and parameters always give
+the same files (timestamps are relative to --now).
+
+Users look like records the app writes: onboarding fields, scores with
+ISO timestamps (plus the epoch ms fields added at ingest, unless --legacy)
+and finished study sessions. Each user has a steady ability, so averages
+and leaderboard ranks are stable rather than uniform noise. The app keeps
+the latest 50 scores per user record; more than that per user only lands
+in the score archive when the server imports the file.
+
+Usage:
+    python benchmarks/synthetic_data.py --out /tmp/yeet-data --users 10000
+    python benchmarks/synthetic_data.py --out data --users 500 --scores 40 --spread-days 60
+"""
+
+import argparse
+import random
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import serializer
+from timestamps import to_iso
+
+EXAMS = ("NEET_PG", "USMLE", "PLAB", "FMGE", "OTHER")
+TOTAL_MARKS = 800
+DAY_MS = 86_400_000
+MINUTE_MS = 60_000
+SUCCESS_THRESHOLD_MINUTES = 120
+
+
+def _iso_z(ms: int) -> str:
+    """Score timestamps as the browser sends them (toISOString)."""
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.") + f"{ms % 1000:03d}Z"
+
+
+def make_user(rng: random.Random, now_ms: int, scores: int, sessions: int, spread_days: int,
+              legacy: bool = False) -> dict:
+    spread_ms = spread_days * DAY_MS
+    created_ms = now_ms - spread_ms - rng.randrange(DAY_MS)
+    exam = rng.choice(EXAMS)
+    ability = min(95.0, max(25.0, rng.gauss(65, 12)))
+
+    score_list = []
+    for ts_ms in sorted(now_ms - rng.randrange(spread_ms) for _ in range(scores)):
+        percentage = round(min(100.0, max(0.0, rng.gauss(ability, 8))), 2)
+        score = {
+            "timestamp": _iso_z(ts_ms),
+            "exam": exam,
+            "score": round(percentage * TOTAL_MARKS / 100),
+            "total": TOTAL_MARKS,
+            "percentage": percentage,
+        }
+        if not legacy:
+            score["ts_ms"] = ts_ms
+        score_list.append(score)
+
+    # Keen users study most days for long stretches; others now and then
+    keenness = rng.random()
+    session_list = []
+    for _ in range(sessions):
+        start_ms = now_ms - rng.randrange(spread_ms)
+        minutes = int(rng.triangular(10, 180, 30 + 120 * keenness))
+        session_list.append({
+            "date": to_iso(start_ms)[:10],
+            "duration_mins": minutes,
+            "pomodoros": minutes // 25,
+        })
+    session_list.sort(key=lambda s: s["date"])
+
+    last_login_ms = now_ms - rng.randrange(min(spread_ms, 7 * DAY_MS))
+    user = {
+        "created_at": to_iso(created_ms),
+        "last_login": to_iso(last_login_ms),
+        "scores": score_list[-50:] if scores > 50 else score_list,
+        "exam": exam,
+        "total_marks": TOTAL_MARKS,
+        "goal": rng.randrange(400, 760, 10),
+        "exam_date": to_iso(now_ms + rng.randrange(30, 365) * DAY_MS)[:10],
+        "onboarded": True,
+        "display_name": f"Grinder_{rng.randrange(1000, 10000)}",
+        "current_session": None,
+        "study_sessions": session_list,
+    }
+    if not legacy:
+        user["last_login_ms"] = last_login_ms
+    return user
+
+
+def make_study_log(rng: random.Random, now_ms: int, spread_days: int) -> dict:
+    """The single-user study log: one entry per day, with streaky runs of successful days."""
+    log = {}
+    studying = True
+    for days_ago in range(spread_days, 0, -1):
+        # Runs of good and bad days rather than independent coin flips
+        if rng.random() < 0.15:
+            studying = not studying
+        minutes = rng.randrange(SUCCESS_THRESHOLD_MINUTES, 300) if studying else rng.randrange(0, SUCCESS_THRESHOLD_MINUTES)
+        day_ms = now_ms - days_ago * DAY_MS
+        log[to_iso(day_ms)[:10]] = {
+            "minutes": minutes,
+            "success": minutes >= SUCCESS_THRESHOLD_MINUTES,
+            "logged_at": to_iso(day_ms + 22 * 60 * MINUTE_MS)[:19],
+        }
+    return log
+
+
+def generate(users: int = 1000, scores: int = 20, sessions: int = 30, spread_days: int = 30,
+             seed: int = 0, now_ms: int = None, legacy: bool = False, inactive: float = 0.0) -> tuple:
+    """
+    Returns:
+        (users dict keyed by username, study log dict)
+    """
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000) if now_ms is None else now_ms
+    rng = random.Random(seed)
+    user_map = {
+        f"grinder{i}": make_user(rng, now_ms, scores, sessions, spread_days, legacy)
+        for i in range(users)
+    }
+    if inactive:
+        # A separate generator, so the rest of the data matches runs without --inactive
+        idle_rng = random.Random(f"{seed}-inactive")
+        for user in user_map.values():
+            if idle_rng.random() < inactive:
+                last_login_ms = now_ms - idle_rng.randrange(15, 120) * DAY_MS
+                user["last_login"] = to_iso(last_login_ms)
+                if not legacy:
+                    user["last_login_ms"] = last_login_ms
+    return user_map, make_study_log(rng, now_ms, spread_days)
+
+
+def write(out_dir, **params) -> dict:
+    """Generate and write users.json and study_log.json into out_dir. Returns the user map."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    users, study_log = generate(**params)
+    serializer.dump_file(users, out_dir / "users.json")
+    serializer.dump_file(study_log, out_dir / "study_log.json")
+    return users
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Dataset options, shared with the benchmarks that generate their own data."""
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--scores", type=int, default=20, help="Scores per user")
+    parser.add_argument("--sessions", type=int, default=30, help="Study sessions per user")
+    parser.add_argument("--spread-days", type=int, default=30, help="Days the timestamps are spread over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--legacy", action="store_true",
+                        help="Omit the epoch ms fields, like records stored before they existed")
+    parser.add_argument("--inactive", type=float, default=0.0,
+                        help="Share of users whose last login is 15-120 days old")
+
+
+def dataset_params(args) -> dict:
+    params = {"users": args.users, "scores": args.scores, "sessions": args.sessions,
+              "spread_days": args.spread_days, "seed": args.seed, "legacy": args.legacy}
+    # Only when set, so baselines recorded before the option existed still match
+    if args.inactive:
+        params["inactive"] = args.inactive
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="Directory for users.json and study_log.json")
+    parser.add_argument("--now", help="ISO-8601 time the data ends at (default: now)")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    now_ms = None
+    if args.now:
+        from timestamps import parse_ms
+        now_ms = parse_ms(args.now)
+    users = write(args.out, now_ms=now_ms, **dataset_params(args))
+    print(f"Wrote {len(users)} users to {Path(args.out) / 'users.json'} and a "
+          f"{args.spread_days}-day study log to {Path(args.out) / 'study_log.json'}")
+
+
+if __name__ == "__main__":
+    main()
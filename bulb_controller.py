@@ -1,113 +1,277 @@
 """
 Crompton Smart Bulb Controller
 Uses TinyTuya for local LAN control of Tuya-based Crompton bulbs.
+Keeps a pool of persistent connections and can drive many bulbs at once.
 """
 
-import json
+import importlib.util
+import threading
 import time
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
-try:
-    import tinytuya
-    TINYTUYA_AVAILABLE = True
-except ImportError:
-    TINYTUYA_AVAILABLE = False
+import metrics
+from app_config import get_config
+
+# TinyTuya (and its crypto dependencies) is imported on the first connection,
+# off the startup path; here we only check that it is installed
+TINYTUYA_AVAILABLE = importlib.util.find_spec("tinytuya") is not None
+if not TINYTUYA_AVAILABLE:
     print("⚠️  TinyTuya not installed. Run: pip install tinytuya")
 
+CONNECT_TIMEOUT_SECONDS = 3
 
-def _load_config():
-    """Load configuration from config.json"""
-    config_path = Path(__file__).parent / "config.json"
-    with open(config_path, "r") as f:
-        return json.load(f)
 
+BULB_COMMAND_SECONDS = metrics.histogram(
+    "bulb_command_seconds", "Time for one command to one bulb, including reconnects", ("method",))
+BULB_COMMAND_FAILURES = metrics.counter(
+    "bulb_command_failures_total", "Bulb commands that failed or were skipped while backing off", ("method",))
 
-class BulbController:
-    """Controller for Crompton/Tuya smart bulb"""
+
+def _tinytuya_device(device_id: str, ip: str, local_key: str, version: float):
+    """Default device factory: a TinyTuya bulb that keeps its socket open between commands."""
+    import tinytuya
+
+    device = tinytuya.BulbDevice(
+        dev_id=device_id, address=ip, local_key=local_key,
+        connection_timeout=get_config().get("bulb_connect_timeout_seconds", CONNECT_TIMEOUT_SECONDS),
+    )
+    device.set_version(version)
+    device.set_socketPersistent(True)
+    return device
+
+
+class PooledBulb:
+    """
+    One bulb in the connection pool.
+    Keeps a persistent connection, serializes commands on it, and backs off
+    exponentially after failures before reconnecting.
+    """
     
-    def __init__(self):
-        config = _load_config()
-        bulb_config = config.get("bulb", {})
-        
-        self.device_id = bulb_config.get("device_id", "")
-        self.local_key = bulb_config.get("local_key", "")
-        self.ip = bulb_config.get("ip", "")
+    MIN_BACKOFF = 1.0
+    MAX_BACKOFF = 60.0
+    
+    def __init__(self, device_id: str, ip: str, local_key: str, version: float = 3.3,
+                 group: str = "default", device_factory=None):
+        self.device_id = device_id
+        self.ip = ip
+        self.local_key = local_key
+        self.version = version
+        self.group = group
+        self.device_factory = device_factory or _tinytuya_device
+        self.device = None
+        self.failures = 0
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+    
+    @property
+    def healthy(self) -> bool:
+        return self.device is not None and self.failures == 0
+    
+    def _connect(self):
+        """Open the device connection unless we're still backing off. Caller holds the lock."""
+        if self.device is not None:
+            return True
+        if time.monotonic() < self.retry_at:
+            return False
+        try:
+            self.device = self.device_factory(self.device_id, self.ip, self.local_key, self.version)
+            return True
+        except Exception as e:
+            self._mark_failed(e)
+            return False
+    
+    def _mark_failed(self, error):
+        """Drop the connection and schedule the next reconnect attempt. Caller holds the lock."""
+        if self.device is not None:
+            try:
+                self.device.close()
+            except Exception:
+                pass
         self.device = None
+        self.failures += 1
+        backoff = min(self.MAX_BACKOFF, self.MIN_BACKOFF * 2 ** (self.failures - 1))
+        self.retry_at = time.monotonic() + backoff
+        print(f"❌ Bulb {self.device_id} at {self.ip} failed ({error}); retrying in {backoff:.0f}s")
+    
+    def call(self, method: str, *args) -> bool:
+        """Run one device command over the pooled connection. Returns True on success."""
+        start = time.perf_counter()
+        ok = self._call(method, *args)
+        BULB_COMMAND_SECONDS.observe(time.perf_counter() - start, method)
+        if not ok:
+            BULB_COMMAND_FAILURES.inc(method)
+        return ok
+
+    def _call(self, method: str, *args) -> bool:
+        with self._lock:
+            if not self._connect():
+                return False
+            try:
+                result = getattr(self.device, method)(*args)
+                # TinyTuya reports most failures as an error payload rather than raising
+                if isinstance(result, dict) and ("Error" in result or "Err" in result):
+                    raise ConnectionError(result.get("Error") or result.get("Err"))
+            except Exception as e:
+                self._mark_failed(e)
+                return False
+            self.failures = 0
+            return True
+    
+    def close(self):
+        with self._lock:
+            if self.device is not None:
+                try:
+                    self.device.close()
+                except Exception:
+                    pass
+                self.device = None
+
+
+class BulbController:
+    """Controller for one or more Crompton/Tuya smart bulbs"""
+    
+    def __init__(self, config: dict = None, device_factory=None):
+        """
+        Args:
+            config: Parsed config.json (the shared app config if omitted)
+            device_factory: Callable(device_id, ip, local_key, version) returning a
+                BulbDevice-like object. Defaults to TinyTuya.
+        """
+        config = config if config is not None else get_config().data
+        self.devices = {}
+        self._executor = None
+        self._health_thread = None
         
-        if not TINYTUYA_AVAILABLE:
+        if device_factory is None and not TINYTUYA_AVAILABLE:
             print("❌ TinyTuya not available. Bulb control disabled.")
             return
         
-        if self.device_id == "YOUR_DEVICE_ID":
+        # "bulbs" lists every device; the single "bulb" entry is still supported
+        bulb_configs = config.get("bulbs") or [config.get("bulb", {})]
+        for bulb_config in bulb_configs:
+            device_id = bulb_config.get("device_id", "")
+            if not device_id or device_id == "YOUR_DEVICE_ID":
+                continue
+            self.devices[device_id] = PooledBulb(
+                device_id,
+                bulb_config.get("ip", ""),
+                bulb_config.get("local_key", ""),
+                version=bulb_config.get("version", 3.3),  # Most Crompton bulbs use protocol 3.3
+                group=bulb_config.get("group", "default"),
+                device_factory=device_factory,
+            )
+        
+        if not self.devices:
             print("⚠️  Bulb not configured. Update config.json with your device credentials.")
             return
         
-        self._connect()
+        self._executor = ThreadPoolExecutor(
+            max_workers=min(32, len(self.devices)), thread_name_prefix="bulb"
+        )
+        
+        # Connecting can take seconds per unreachable bulb, so it happens in the
+        # background; commands sent before then connect on demand
+        interval = config.get("bulb_health_check_seconds", 30)
+        self._health_thread = threading.Thread(
+            target=self._health_loop, args=(interval,), name="bulb-health", daemon=True
+        )
+        self._health_thread.start()
     
     def _connect(self):
-        """Establish connection to the bulb"""
-        if not TINYTUYA_AVAILABLE:
-            return
+        """Open a persistent connection to every configured bulb"""
+        results = self._fanout("status")
+        for device_id, ok in results.items():
+            bulb = self.devices[device_id]
+            if ok:
+                print(f"✅ Connected to bulb at {bulb.ip}")
+    
+    def _health_loop(self, interval: float):
+        self._connect()
+        while interval:
+            time.sleep(interval)
+            self.health_check()
+    
+    def health_check(self) -> dict:
+        """
+        Ping every bulb (also keeps idle sockets from being dropped by the device).
         
-        try:
-            self.device = tinytuya.BulbDevice(
-                dev_id=self.device_id,
-                address=self.ip,
-                local_key=self.local_key
-            )
-            self.device.set_version(3.3)  # Most Crompton bulbs use protocol 3.3
-            print(f"✅ Connected to bulb at {self.ip}")
-        except Exception as e:
-            print(f"❌ Failed to connect to bulb: {e}")
-            self.device = None
+        Returns:
+            dict of device_id -> healthy
+        """
+        return self._fanout("status")
     
-    def set_color(self, r: int, g: int, b: int):
+    def groups(self) -> dict:
+        """Map of group name -> list of device ids"""
+        groups = {}
+        for bulb in self.devices.values():
+            groups.setdefault(bulb.group, []).append(bulb.device_id)
+        return groups
+    
+    def _fanout(self, method: str, *args, group: str = None) -> dict:
+        """Send one command to every bulb (optionally one group) in parallel."""
+        targets = [b for b in self.devices.values() if group is None or b.group == group]
+        if not targets:
+            return {}
+        if len(targets) == 1:
+            return {targets[0].device_id: targets[0].call(method, *args)}
+        futures = {b.device_id: self._executor.submit(b.call, method, *args) for b in targets}
+        return {device_id: f.result() for device_id, f in futures.items()}
+    
+    def set_color(self, r: int, g: int, b: int, group: str = None):
         """
-        Set bulb to specific RGB color.
+        Set bulbs to specific RGB color.
         
         Args:
             r: Red (0-255)
             g: Green (0-255)
             b: Blue (0-255)
+            group: Only bulbs in this group (default: all bulbs)
         """
-        if not self.device:
+        if not self.devices:
             print(f"🎨 [SIMULATION] Setting color to RGB({r}, {g}, {b})")
             return False
         
-        try:
-            # TinyTuya uses HSV internally, but set_colour handles RGB
-            self.device.set_colour(r, g, b)
-            print(f"💡 Bulb color set to RGB({r}, {g}, {b})")
-            return True
-        except Exception as e:
-            print(f"❌ Failed to set color: {e}")
-            return False
+        # TinyTuya uses HSV internally, but set_colour handles RGB
+        results = self._fanout("set_colour", r, g, b, group=group)
+        ok = sum(results.values())
+        print(f"💡 Bulb color set to RGB({r}, {g}, {b}) on {ok}/{len(results)} bulb(s)")
+        return ok == len(results) and ok > 0
     
-    def turn_on(self):
-        """Turn the bulb on"""
-        if not self.device:
-            print("🔆 [SIMULATION] Turning bulb ON")
-            return False
+    def set_group_color(self, group: str, r: int, g: int, b: int) -> dict:
+        """
+        Send one color to every bulb in a group in parallel.
         
-        try:
-            self.device.turn_on()
-            return True
-        except Exception as e:
-            print(f"❌ Failed to turn on: {e}")
+        Returns:
+            dict of device_id -> success
+        """
+        return self._fanout("set_colour", r, g, b, group=group)
+    
+    def turn_on(self, group: str = None):
+        """Turn the bulbs on"""
+        if not self.devices:
+            print("🔆 [SIMULATION] Turning bulb ON")
             return False
+        return all(self._fanout("turn_on", group=group).values())
     
-    def turn_off(self):
-        """Turn the bulb off"""
-        if not self.device:
+    def turn_off(self, group: str = None):
+        """Turn the bulbs off"""
+        if not self.devices:
             print("🌑 [SIMULATION] Turning bulb OFF")
             return False
+        return all(self._fanout("turn_off", group=group).values())
+    
+    def set_brightness(self, value: int, group: str = None):
+        """
+        Set bulb brightness.
         
-        try:
-            self.device.turn_off()
-            return True
-        except Exception as e:
-            print(f"❌ Failed to turn off: {e}")
+        Args:
+            value: Brightness (10-1000 on v3.3 bulbs, 25-255 on older ones)
+            group: Only bulbs in this group (default: all bulbs)
+        """
+        if not self.devices:
+            print(f"🔅 [SIMULATION] Setting brightness to {value}")
             return False
+        return all(self._fanout("set_brightness", value, group=group).values())
     
     def pulse_color(self, r: int, g: int, b: int, pulses: int = 3, duration: float = 0.5):
         """
@@ -119,21 +283,25 @@ class BulbController:
             pulses: Number of pulse cycles
             duration: Duration of each pulse phase in seconds
         """
-        if not self.device:
+        if not self.devices:
             print(f"✨ [SIMULATION] Pulsing RGB({r}, {g}, {b}) x{pulses}")
             return
         
-        try:
-            for _ in range(pulses):
-                self.set_color(r, g, b)
-                time.sleep(duration)
-                # Dim to 20% brightness
-                self.device.set_brightness(50)
-                time.sleep(duration)
-                self.device.set_brightness(255)
-            print(f"✨ Pulse effect complete!")
-        except Exception as e:
-            print(f"❌ Pulse effect failed: {e}")
+        for _ in range(pulses):
+            self.set_color(r, g, b)
+            time.sleep(duration)
+            # Dim to 20% brightness
+            self.set_brightness(50)
+            time.sleep(duration)
+            self.set_brightness(255)
+        print(f"✨ Pulse effect complete!")
+    
+    def close(self):
+        """Close every pooled connection"""
+        for bulb in self.devices.values():
+            bulb.close()
+        if self._executor:
+            self._executor.shutdown(wait=False)
     
     def update_from_streak(self, streak: int, celebrate_milestone: bool = False):
         """
@@ -143,9 +311,7 @@ class BulbController:
             streak: Current streak count
             celebrate_milestone: If True, play pulse animation for milestones
         """
-        from streak_tracker import get_streak_color
-        
-        color = get_streak_color(streak)
+        color = get_config().streak_color(streak)
         r, g, b = color["r"], color["g"], color["b"]
         
         # Milestone celebrations
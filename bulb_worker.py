@@ -0,0 +1,123 @@
+"""
+Bulb Command Worker
+Runs bulb commands on a dedicated background thread so web requests never
+wait on the bulb.
+
+- Color changes coalesce: only the latest requested color is sent.
+- Other commands (on/off) go through a small bounded queue.
+- Pulse animations run as scheduled steps and are cancelled by any newer
+  color or pulse instead of sleeping through the whole animation.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class BulbWorker:
+    """Background executor for a BulbController."""
+
+    def __init__(self, controller, max_queue: int = 32):
+        self.controller = controller
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._pending_color = None
+        self._commands = deque()
+        # Active pulse animation: iterator of (action, args, delay) steps
+        self._pulse = None
+        self._next_step_at = 0.0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="bulb-worker", daemon=True)
+        self._thread.start()
+
+    # --- Submission (called from request threads, never blocks on the bulb) ---
+
+    def set_color(self, r: int, g: int, b: int) -> bool:
+        """Queue a color change, replacing any color that hasn't been sent yet."""
+        with self._cond:
+            self._pending_color = (r, g, b)
+            self._pulse = None
+            self._cond.notify()
+        return True
+
+    def pulse_color(self, r: int, g: int, b: int, pulses: int = 3, duration: float = 0.5) -> bool:
+        """Start a pulse animation, cancelling any animation already running."""
+        with self._cond:
+            self._pending_color = None
+            self._pulse = self._pulse_steps(r, g, b, pulses, duration)
+            self._next_step_at = time.monotonic()
+            self._cond.notify()
+        return True
+
+    def cancel_pulse(self):
+        with self._cond:
+            self._pulse = None
+
+    def submit(self, method: str, *args) -> bool:
+        """
+        Queue any other controller call (e.g. "turn_on").
+
+        Returns:
+            False if the queue is full and the command was dropped
+        """
+        with self._cond:
+            if len(self._commands) >= self.max_queue:
+                return False
+            self._commands.append((method, args))
+            self._cond.notify()
+        return True
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._commands) + (self._pending_color is not None)
+
+    def close(self, timeout: float = 2.0):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    # --- Worker thread ---
+
+    @staticmethod
+    def _pulse_steps(r, g, b, pulses, duration):
+        for _ in range(pulses):
+            yield "set_color", (r, g, b), duration
+            # Dim to 20% brightness
+            yield "set_brightness", (50,), duration
+            yield "set_brightness", (255,), 0
+
+    def _next_job(self):
+        """Wait for the next thing to do. Returns (method, args) or None when stopping."""
+        with self._cond:
+            while not self._stopped:
+                if self._pending_color is not None:
+                    color, self._pending_color = self._pending_color, None
+                    return "set_color", color
+                if self._commands:
+                    return self._commands.popleft()
+                if self._pulse is not None:
+                    wait = self._next_step_at - time.monotonic()
+                    if wait <= 0:
+                        step = next(self._pulse, None)
+                        if step is None:
+                            self._pulse = None
+                            continue
+                        method, args, delay = step
+                        self._next_step_at = time.monotonic() + delay
+                        return method, args
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            return None
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            method, args = job
+            try:
+                getattr(self.controller, method)(*args)
+            except Exception as e:
+                print(f"❌ Bulb command {method} failed: {e}")
@@ -0,0 +1,140 @@
+"""
+Bulk Score Ingestion
+Imports newline-delimited JSON score rows in fixed-size batches.
+
+Each row is one score for one user:
+    {"username": "alice", "timestamp": "2026-01-11T16:00:40Z", "exam": "NEET_PG",
+     "score": 500, "total": 800, "percentage": 62.5}
+
+Rows are validated as they stream in, grouped by user, and written with one
+store write per batch, so memory stays bounded by the batch size rather than
+the input size. Bad rows are reported individually and never abort the import.
+"""
+
+from contextlib import nullcontext
+
+import serializer
+from timestamps import normalize_score
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+MAX_SCORES_PER_USER = 50
+
+
+class RowError(ValueError):
+    """A single NDJSON row that can't be imported."""
+
+
+def validate_row(row) -> tuple:
+    """
+    Check one parsed row.
+
+    Returns:
+        (username, score dict without the username, with "ts_ms" added)
+    """
+    if not isinstance(row, dict):
+        raise RowError("row must be a JSON object")
+    username = row.get("username")
+    if not isinstance(username, str) or not username.strip():
+        raise RowError("missing username")
+
+    score = {k: v for k, v in row.items() if k != "username"}
+    try:
+        normalize_score(score)
+    except ValueError as e:
+        raise RowError(str(e))
+    return username.strip().lower(), score
+
+
+class BulkImport:
+    """Accumulates validated rows and flushes them to the store in batches."""
+
+    def __init__(self, store, leaderboard=None, archive=None, batch_size: int = BATCH_SIZE):
+        self.store = store
+        self.leaderboard = leaderboard
+        self.archive = archive
+        self.batch_size = batch_size
+        self.accepted = 0
+        self.rejected = 0
+        self.errors = []
+        self._batch = {}
+        self._batch_rows = 0
+
+    def _error(self, line_no: int, message: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "error": message})
+
+    def add_line(self, line_no: int, line):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        line = line.strip()
+        if not line:
+            return
+        try:
+            username, score = validate_row(serializer.loads(line))
+        except ValueError as e:
+            # json.JSONDecodeError and RowError are both ValueErrors
+            self._error(line_no, str(e))
+            return
+
+        self._batch.setdefault(username, []).append((line_no, score))
+        self._batch_rows += 1
+        if self._batch_rows >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Apply the pending batch with a single store write."""
+        if not self._batch:
+            return
+        def add_scores(username, user):
+            if user is None:
+                return None
+            scores = user.setdefault("scores", [])
+            scores.extend(score for _, score in self._batch[username])
+            if len(scores) > MAX_SCORES_PER_USER:
+                user["scores"] = scores[-MAX_SCORES_PER_USER:]
+            return user
+
+        # The store write and the leaderboard updates for it go together (see
+        # leaderboard.FeedLeaderboard.writing)
+        with self.leaderboard.writing() if self.leaderboard is not None else nullcontext():
+            # Atomic per user, so scores posted concurrently through the API aren't lost
+            stored = self.store.update_many(self._batch, add_scores)
+            records = {}
+            added = []
+            for username, rows in self._batch.items():
+                if stored[username] is None:
+                    for line_no, _ in rows:
+                        self._error(line_no, f"user not found: {username}")
+                    continue
+                records[username] = stored[username]
+                added.extend((username, score) for _, score in rows)
+            if self.leaderboard is not None:
+                for username, score in added:
+                    self.leaderboard.add_score(username, score)
+
+        if self.archive is not None:
+            for username in records:
+                self.archive.append_many(username, [score for _, score in self._batch[username]])
+
+        self.accepted += len(added)
+        self._batch = {}
+        self._batch_rows = 0
+
+    def summary(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "errors_truncated": self.rejected > len(self.errors),
+        }
+
+
+def ingest_lines(lines, store, leaderboard=None, archive=None, batch_size: int = BATCH_SIZE) -> dict:
+    """Import an iterable of NDJSON lines. Returns the accepted/rejected summary."""
+    job = BulkImport(store, leaderboard, archive, batch_size)
+    for line_no, line in enumerate(lines, start=1):
+        job.add_line(line_no, line)
+    job.flush()
+    return job.summary()
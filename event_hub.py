@@ -0,0 +1,185 @@
+"""
+Event Hub
+Fans server-sent events out to many connected clients.
+
+Writers call publish() and return at once: the event is serialized a single
+time and queued for a dispatcher thread, which appends it to the buffer of
+every client subscribed to that topic and wakes it. Buffers are bounded. A
+client that falls that far behind is disconnected rather than holding up
+anyone else; browsers reconnect on their own and get a fresh snapshot.
+"""
+
+import threading
+from collections import deque
+
+import serializer
+
+MAX_CLIENTS = 10000
+MAX_BUFFERED_EVENTS = 64
+HEARTBEAT_SECONDS = 15
+
+
+def format_event(event: str, data) -> bytes:
+    """One SSE message: `event:` line plus the JSON payload."""
+    return b"event: " + event.encode() + b"\ndata: " + serializer.dumps(data) + b"\n\n"
+
+
+class Subscription:
+    """One connected client: a bounded buffer of encoded events."""
+
+    def __init__(self, hub, topics, max_buffered: int):
+        self.topics = frozenset(topics)
+        self.max_buffered = max_buffered
+        self.dropped = False
+        self._hub = hub
+        self._buffer = deque()
+        self._ready = threading.Event()
+
+    def push(self, chunk: bytes) -> bool:
+        """Queue an encoded event. Returns False if this event overflowed the buffer and dropped the client."""
+        if self.dropped:
+            return True
+        if len(self._buffer) >= self.max_buffered:
+            self.dropped = True
+            self._ready.set()
+            return False
+        self._buffer.append(chunk)
+        self._ready.set()
+        return True
+
+    def send(self, event: str, data) -> bool:
+        """Queue an event for this client only (e.g. the initial snapshot)."""
+        return self.push(format_event(event, data))
+
+    def read(self, timeout: float = None):
+        """
+        Wait for events.
+
+        Returns:
+            All buffered events as one bytes object (b"" on timeout), or None
+            once the client has been dropped
+        """
+        if not self._buffer and not self.dropped:
+            self._ready.wait(timeout)
+        self._ready.clear()
+        if self.dropped:
+            return None
+        chunks = []
+        while self._buffer:
+            chunks.append(self._buffer.popleft())
+        return b"".join(chunks)
+
+    def stream(self, heartbeat: float = HEARTBEAT_SECONDS):
+        """WSGI body: events as they arrive, with a comment line as keepalive when idle."""
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                chunk = self.read(heartbeat)
+                if chunk is None:
+                    return
+                yield chunk or b": keepalive\n\n"
+        finally:
+            self.close()
+
+    def close(self):
+        self.dropped = True
+        self._ready.set()
+        self._hub.unsubscribe(self)
+
+
+class EventHub:
+    """Topic-based fan-out with one dispatcher thread."""
+
+    def __init__(self, max_clients: int = MAX_CLIENTS, max_buffered: int = MAX_BUFFERED_EVENTS):
+        self.max_clients = max_clients
+        self.max_buffered = max_buffered
+        self.dropped_total = 0
+        self._lock = threading.Lock()
+        self._topics = {}
+        self._clients = 0
+        self._pending = deque()
+        self._wakeup = threading.Condition(threading.Lock())
+        self._closed = False
+        self._thread = threading.Thread(target=self._dispatch_loop, name="event-hub", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        """Connected clients."""
+        return self._clients
+
+    def topics(self) -> list:
+        """Topics with at least one subscriber."""
+        with self._lock:
+            return list(self._topics)
+
+    def pending(self) -> int:
+        """Published events the dispatcher hasn't fanned out yet."""
+        return len(self._pending)
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self._topics
+
+    def subscribe(self, topics) -> Subscription:
+        """Register a client for some topics. Returns None when the hub is full."""
+        with self._lock:
+            if self._closed or self._clients >= self.max_clients:
+                return None
+            sub = Subscription(self, topics, self.max_buffered)
+            for topic in sub.topics:
+                self._topics.setdefault(topic, set()).add(sub)
+            self._clients += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            removed = False
+            for topic in sub.topics:
+                subs = self._topics.get(topic)
+                if subs is not None and sub in subs:
+                    subs.discard(sub)
+                    removed = True
+                    if not subs:
+                        del self._topics[topic]
+            if removed:
+                self._clients -= 1
+
+    def publish(self, topic: str, event: str, data):
+        """Queue an event for every subscriber of `topic`. Never blocks on clients."""
+        if topic not in self._topics:
+            return
+        chunk = format_event(event, data)
+        with self._wakeup:
+            self._pending.append((topic, chunk))
+            self._wakeup.notify()
+
+    def _dispatch_loop(self):
+        while True:
+            with self._wakeup:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                batch = list(self._pending)
+                self._pending.clear()
+
+            dropped = []
+            for topic, chunk in batch:
+                with self._lock:
+                    subs = list(self._topics.get(topic, ()))
+                for sub in subs:
+                    if not sub.push(chunk):
+                        dropped.append(sub)
+            for sub in dropped:
+                self.unsubscribe(sub)
+            self.dropped_total += len(dropped)
+
+    def close(self):
+        """Stop dispatching and end every open stream."""
+        with self._lock:
+            self._closed = True
+            subs = {sub for subs in self._topics.values() for sub in subs}
+        with self._wakeup:
+            self._wakeup.notify()
+        for sub in subs:
+            sub.close()
+        self._thread.join(timeout=2)
@@ -0,0 +1,66 @@
+"""
+Gunicorn configuration - production entry point (see Procfile).
+
+    gunicorn server:app -c gunicorn.conf.py
+
+Each worker process owns the in-memory user cache, write journal and
+leaderboard, so WEB_CONCURRENCY is held at 1 while the cache is on; scale
+with threads instead: the gthread worker keeps many requests in flight per
+process while they wait on the journal fsync or the network. Writes lock
+only the user they touch, so threads updating different users don't wait
+on each other. (The cache also locks its journal, so a second process
+started some other way fails at startup instead of corrupting it.)
+
+To run several workers against one SQLite database, set USER_CACHE=0: user
+records are then read and written through SQLite with per-row version
+checks, so no update is lost across processes. The leaderboard is then
+served from a shared-memory snapshot (shared_snapshot.py) that one worker
+per host publishes, fed every worker's scores through a shared file. Workers share the score archive files,
+and reload a user's study history and streak from SQLite on every read.
+Cohort analytics, live streams and studying-now counts are still per
+process.
+
+Each open /api/stream connection holds one gthread thread while it waits,
+so a process accepts at most GUNICORN_THREADS / 2 streams (unless
+stream_max_clients is set in config.json) and the browsers over that poll
+the leaderboard instead. For thousands of live clients per process, set
+GUNICORN_WORKER_CLASS=gevent (pip install gevent), which lifts the cap to
+10k; the event hub only uses threading primitives, which gevent makes
+cooperative.
+"""
+
+import json
+import os
+from pathlib import Path
+
+
+def user_cache_enabled() -> bool:
+    """Same setting as server.USER_CACHE (config.json is read directly: app_config takes over SIGHUP)."""
+    try:
+        with open(Path(__file__).parent / "config.json", "r") as f:
+            default = json.load(f).get("user_cache", True)
+    except (OSError, ValueError):
+        default = True
+    return os.environ.get("USER_CACHE", str(default)).lower() not in ("0", "false", "no")
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5555)}"
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+if workers > 1 and user_cache_enabled():
+    print(f"⚠️ WEB_CONCURRENCY={workers} needs USER_CACHE=0 (each worker would cache and journal "
+          f"the same users); starting 1 worker")
+    workers = 1
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+
+# The app starts background threads (journal flusher, bulb worker) at import,
+# so it must be loaded inside each worker, after the fork
+preload_app = False
+
+keepalive = 5
+timeout = 30
+graceful_timeout = 10
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG")  # e.g. "-" for stdout
+errorlog = "-"
@@ -0,0 +1,204 @@
+"""
+HTTP Caching
+Conditional GETs, response compression and fingerprinted static assets.
+
+Dynamic endpoints build their ETag from in-memory change counters, never from
+storage, so an unchanged resource is answered with 304 before any work is
+done. Static files and the index page are read, fingerprinted and compressed
+once at startup, and served from memory. Hot JSON bodies are kept serialized
+(and compressed) per version, so an unchanged leaderboard is never re-encoded.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from pathlib import Path
+
+from flask import Response, request
+from flask.json.provider import DefaultJSONProvider
+
+import serializer
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Counters restart at zero with the process; this keeps a restart from
+# matching an ETag a client got from the previous run
+BOOT_ID = os.urandom(4).hex()
+MIN_COMPRESS_BYTES = 512
+MAX_CACHED_BODIES = 256
+JSON_GZIP_LEVEL = 6
+JSON_BROTLI_QUALITY = 4
+STATIC_MAX_AGE = 365 * 86400
+ENCODINGS = ("br", "gzip") if BROTLI_AVAILABLE else ("gzip",)
+
+
+def version_tag(*parts) -> str:
+    """ETag value for a resource version, e.g. version_tag("leaderboard", 42, limit)."""
+    return "-".join([BOOT_ID, *map(str, parts)])
+
+
+def negotiate_encoding(available=ENCODINGS):
+    """The first of `available` the client accepts, or None for identity."""
+    for encoding in available:
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def _compress(data: bytes, encoding: str, static: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if static else JSON_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if static else JSON_GZIP_LEVEL, mtime=0)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """jsonify() and request.json through serializer (orjson when installed), always compact."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return serializer.dumps_str(obj)
+
+    def loads(self, s, **kwargs):
+        return serializer.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(serializer.dumps(obj), mimetype=self.mimetype)
+
+
+def not_modified(etag: str):
+    """A 304 response if the client already has this version, otherwise None."""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+
+def tag(response, etag: str, cache_control: str = "no-cache"):
+    """
+    Attach a (weak) ETag. "no-cache" lets browsers keep the body but makes them
+    revalidate each time, which not_modified() answers without a body.
+    """
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def compress_response(response):
+    """after_request hook: compress JSON bodies for clients that accept it."""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code in (204, 304) or response.status_code < 200
+            or "Content-Encoding" in response.headers
+            or response.mimetype != "application/json"):
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate_encoding()
+    if encoding is not None:
+        response.set_data(_compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+class BodyCache:
+    """
+    Serialized JSON bodies keyed by (key, version), with compressed variants
+    made on first request. Only the latest version of each key is kept.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_BODIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def response(self, key, version, build):
+        """
+        Response for this version of a resource. build() returns the object to
+        serialize and is only called when the cached body is missing or stale.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            entry = (version, {None: serializer.dumps(build())})
+            with self._lock:
+                if key not in self._entries and len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                self._entries[key] = entry
+        variants = entry[1]
+        body = variants[None]
+
+        response = Response(mimetype="application/json")
+        encoding = None
+        if len(body) >= MIN_COMPRESS_BYTES:
+            response.vary.add("Accept-Encoding")
+            encoding = negotiate_encoding()
+        if encoding is None:
+            response.set_data(body)
+        else:
+            if encoding not in variants:
+                # Racing threads may both compress; either result is fine
+                variants[encoding] = _compress(body, encoding)
+            response.set_data(variants[encoding])
+            response.headers["Content-Encoding"] = encoding
+        return response
+
+
+class Asset:
+    """One file held in memory with its precompressed variants."""
+
+    def __init__(self, data: bytes, mimetype: str):
+        self.mimetype = mimetype
+        self.fingerprint = hashlib.sha256(data).hexdigest()[:12]
+        self.variants = {None: data}
+        for encoding in ENCODINGS:
+            compressed = _compress(data, encoding, static=True)
+            if len(compressed) < len(data):
+                self.variants[encoding] = compressed
+
+    def response(self, immutable: bool = False):
+        encoding = negotiate_encoding(tuple(e for e in ENCODINGS if e in self.variants))
+        # Strong ETag per encoding, since the bytes differ
+        etag = f"{self.fingerprint}-{encoding or 'identity'}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(self.variants[encoding], mimetype=self.mimetype)
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        response.vary.add("Accept-Encoding")
+        response.headers["Cache-Control"] = (
+            f"public, max-age={STATIC_MAX_AGE}, immutable" if immutable else "no-cache"
+        )
+        return response
+
+
+class StaticAssets:
+    """Every file under a folder, fingerprinted for long-lived URLs."""
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        self.assets = {}
+        for path in sorted(self.folder.rglob("*")):
+            if path.is_file():
+                name = path.relative_to(self.folder).as_posix()
+                mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                self.assets[name] = Asset(path.read_bytes(), mimetype)
+
+    def url(self, name: str) -> str:
+        """URL with the content fingerprint, cacheable for a year."""
+        return f"/static/{name}?v={self.assets[name].fingerprint}"
+
+    def response(self, name: str):
+        """The asset's response, or None if there is no such file."""
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+        return asset.response(immutable=request.args.get("v") == asset.fingerprint)
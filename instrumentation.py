@@ -0,0 +1,163 @@
+"""
+Request Instrumentation
+Per-route latency and status metrics for the Flask app, plus an opt-in
+sampling profiler for slow requests.
+
+The profiler is off unless "profile_slow_ms" is set in config.json (picked up
+within a second, no restart). While on, a background thread samples the
+stack of every in-flight request every few milliseconds. Requests that take
+longer than profile_slow_ms have their samples appended to
+data/profiles/slow_requests.folded as folded stacks ("root;...;leaf count"),
+which flamegraph.pl, inferno and speedscope read directly.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter as SampleCounter
+from pathlib import Path
+
+from flask import request
+
+import metrics
+
+PROFILE_DIR = Path(__file__).parent / "data" / "profiles"
+SAMPLE_INTERVAL_SECONDS = 0.005
+MAX_PROFILE_BYTES = 16 * 1024 * 1024
+MAX_STACK_DEPTH = 64
+# WSGI environ key where the matched route is left for the middleware
+ROUTE_KEY = "yeet.route"
+
+# Its _count series doubles as the request counter per route and status
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "Time to produce a response, by route and status",
+    ("method", "route", "status"))
+SLOW_PROFILES = metrics.counter(
+    "profiler_slow_requests_total", "Slow requests whose stacks were written to the profile")
+
+
+def _fold(frame) -> str:
+    """One sample as a folded stack, outermost frame first."""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SlowRequestProfiler:
+    """Stack sampler for in-flight requests; see the module docstring."""
+
+    def __init__(self, config, path=PROFILE_DIR / "slow_requests.folded",
+                 interval: float = SAMPLE_INTERVAL_SECONDS):
+        """
+        Args:
+            config: Shared Config; "profile_slow_ms" (0 or missing = off) is re-read every second
+            path: Folded-stack output file (rotated to .1 past MAX_PROFILE_BYTES)
+            interval: Seconds between samples while on
+        """
+        self.config = config
+        self.path = Path(path)
+        self.interval = interval
+        self.slow_ms = 0
+        self._lock = threading.Lock()
+        # thread ident -> sample counts of the request running on it
+        self._active = {}
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    @property
+    def enabled(self) -> bool:
+        return self.slow_ms > 0
+
+    def begin(self):
+        """Start sampling the current thread's request."""
+        self._active[threading.get_ident()] = SampleCounter()
+
+    def end(self, label: str, seconds: float):
+        """Stop sampling; write the samples out if the request was slow."""
+        samples = self._active.pop(threading.get_ident(), None)
+        if not samples or seconds * 1000 < self.slow_ms:
+            return
+        SLOW_PROFILES.inc()
+        # The route becomes the root frame, so one flame graph separates endpoints
+        lines = "".join(f"{label};{stack} {n}\n" for stack, n in samples.items())
+        try:
+            with self._lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                if self.path.exists() and self.path.stat().st_size > MAX_PROFILE_BYTES:
+                    os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+                with open(self.path, "a") as f:
+                    f.write(lines)
+        except OSError as e:
+            # Never fail the request over its profile
+            print(f"⚠️ Could not write slow request profile: {e}")
+
+    def _run(self):
+        me = threading.get_ident()
+        next_check = 0.0
+        while True:
+            now = time.monotonic()
+            if now >= next_check:
+                self.slow_ms = self.config.get("profile_slow_ms", 0) or 0
+                next_check = now + 1.0
+            if not self.enabled:
+                self._active.clear()
+                time.sleep(1.0)
+                continue
+            frames = sys._current_frames()
+            for ident, samples in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is not None and ident != me:
+                    samples[_fold(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+def instrument_app(app, profiler: SlowRequestProfiler = None):
+    """
+    Record latency and status for every request, as WSGI middleware around
+    app.wsgi_app (cheaper than Flask hooks, and includes after_request work
+    such as compression). Streamed bodies are timed up to the first byte.
+    """
+    wsgi_app = app.wsgi_app
+    perf_counter = time.perf_counter
+
+    # Flask drops the request (and its url_rule) from the environ before
+    # wsgi_app returns, so note the matched rule while the request is live.
+    # First in line, so another hook that short-circuits can't skip it
+    def remember_route():
+        # One LocalProxy lookup instead of two
+        req = request._get_current_object()
+        rule = req.url_rule
+        req.environ[ROUTE_KEY] = rule.rule if rule is not None else "unmatched"
+
+    app.before_request_funcs.setdefault(None, []).insert(0, remember_route)
+
+    def instrumented(environ, start_response):
+        status = []
+
+        def capture_status(code, headers, exc_info=None):
+            status.append(code)
+            return start_response(code, headers, exc_info)
+
+        profiling = profiler is not None and profiler.slow_ms > 0
+        if profiling:
+            profiler.begin()
+        start = perf_counter()
+        try:
+            return wsgi_app(environ, capture_status)
+        finally:
+            seconds = perf_counter() - start
+            # The rule, not the path, keeps per-user URLs in one series
+            route = environ.get(ROUTE_KEY, "unmatched")
+            method = environ.get("REQUEST_METHOD", "")
+            REQUEST_SECONDS.observe(seconds, method, route, status[0][:3] if status else "500")
+            if profiling:
+                profiler.end(f"{method} {route}", seconds)
+
+    instrumented.__wrapped__ = wsgi_app
+    instrumented.route_hook = remember_route
+    app.wsgi_app = instrumented
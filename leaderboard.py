@@ -0,0 +1,447 @@
+"""
+Weekly Leaderboard
+Incrementally maintained rolling-window averages, so reading the top K
+costs O(K) instead of a scan over every user's scores.
+
+Each score is added once, to a per-user running sum/count and to a time
+bucket. When a bucket falls out of the window its scores are subtracted
+again. Rankings are kept sorted (overall and per exam) as scores come and go,
+in fixed-size sorted blocks so an update moves one block rather than the
+whole list. rebuild() adds up every user's totals first and sorts each
+ranking once. All times are integer epoch milliseconds (see timestamps.py).
+
+ShardedLeaderboard splits users over several of these by the same shard_of()
+as the user store, and answers top() by merging each shard's top K.
+
+FeedLeaderboard wraps either one for worker processes that don't share a
+user cache: their changes also go to a host-wide feed, from which the
+process publishing the shared snapshot keeps its own leaderboard live.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+from bisect import bisect_left, insort
+from contextlib import nullcontext
+
+from sharding import shard_of, stable_hash
+from timestamps import is_percentage, ms_of, now_ms as current_ms
+
+WINDOW_DAYS = 7
+BUCKET_SECONDS = 60
+ALL_EXAMS = None
+# Entries per _Ranking block; a block is split when it doubles
+RANKING_BLOCK = 512
+# Rows per table in a snapshot(): the most /api/leaderboard serves
+SNAPSHOT_LIMIT = 100
+
+
+def fallback_name(username: str) -> str:
+    """Display name for users who never chose one; the same in every process."""
+    return f"Grinder_{stable_hash(username) % 10000}"
+
+
+def _score_fields(score: dict):
+    """(exam, percentage, ts_ms) of a score dict, or None without a usable timestamp or percentage."""
+    ts_ms = ms_of(score, "ts_ms", "timestamp")
+    percentage = score.get("percentage", 0)
+    if ts_ms is None or not is_percentage(percentage):
+        return None
+    return score.get("exam"), percentage, ts_ms
+
+
+def _exam_key(exam):
+    # Exams are keyed (and sorted, see snapshot()) as strings, as ?exam= asks for them
+    return exam if exam is None or isinstance(exam, str) else str(exam)
+
+
+class _Ranking:
+    """
+    Users ordered by average score (descending). Keys (-avg, username) are
+    kept in sorted blocks of up to 2 * RANKING_BLOCK, indexed by each
+    block's last key, so an update is two bisects plus a move within one
+    block: O(log n) comparisons, however many users are ranked.
+    """
+
+    def __init__(self, keys=()):
+        """keys: (-avg, username) pairs, in any order (sorted once here)."""
+        keys = sorted(keys)
+        self._blocks = [keys[i:i + RANKING_BLOCK] for i in range(0, len(keys), RANKING_BLOCK)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._key_of = {key[1]: key for key in keys}
+
+    def _insert(self, key):
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            return
+        i = min(bisect_left(self._maxes, key), len(self._maxes) - 1)
+        block = self._blocks[i]
+        insort(block, key)
+        self._maxes[i] = block[-1]
+        if len(block) > 2 * RANKING_BLOCK:
+            self._blocks.insert(i + 1, block[RANKING_BLOCK:])
+            del block[RANKING_BLOCK:]
+            self._maxes.insert(i, block[-1])
+
+    def _remove(self, key):
+        i = bisect_left(self._maxes, key)
+        block = self._blocks[i]
+        del block[bisect_left(block, key)]
+        if block:
+            self._maxes[i] = block[-1]
+        else:
+            del self._blocks[i]
+            del self._maxes[i]
+
+    def update(self, username: str, avg):
+        old = self._key_of.pop(username, None)
+        if old is not None:
+            self._remove(old)
+        if avg is not None:
+            key = (-avg, username)
+            self._insert(key)
+            self._key_of[username] = key
+
+    def top(self, limit: int):
+        rows = []
+        for block in self._blocks:
+            if len(rows) >= limit:
+                break
+            rows.extend((username, -neg_avg) for neg_avg, username in block[:limit - len(rows)])
+        return rows
+
+    def __len__(self):
+        return len(self._key_of)
+
+
+class WeeklyLeaderboard:
+    """Top grinders by average percentage over the last `window_days`."""
+
+    def __init__(self, window_days: int = WINDOW_DAYS, bucket_seconds: int = BUCKET_SECONDS):
+        self.window_ms = window_days * 86_400_000
+        self.bucket_ms = bucket_seconds * 1000
+        self._lock = threading.Lock()
+        # (exam or ALL_EXAMS, username) -> [sum, count] of in-window percentages
+        self._totals = {}
+        self._rankings = {ALL_EXAMS: _Ranking()}
+        # bucket id -> [(username, exam, percentage)], plus a min-heap of live bucket ids
+        self._buckets = {}
+        self._bucket_heap = []
+        self._display_names = {}
+        # Bumped on every change to what top() returns (scores, expiry, names)
+        self._version = 0
+
+    # --- Ingest ---
+
+    def rebuild(self, users, now_ms: int = None):
+        """
+        Load every in-window score from an iterable of (username, record)
+        pairs. Malformed stored scores are skipped (see add_score). The
+        totals are added up first and each ranking is sorted once at the end,
+        so this is O(N log N) rather than one ranking update per score.
+        """
+        now_ms = current_ms() if now_ms is None else now_ms
+        for username, user in users:
+            self.accumulate(username, user, now_ms)
+        self.rank()
+
+    def accumulate(self, username: str, user: dict, now_ms: int):
+        """Add a record's in-window scores to the totals without ranking them; rank() must follow."""
+        cutoff = now_ms - self.window_ms
+        with self._lock:
+            if "display_name" in user:
+                self._display_names[username] = user["display_name"]
+            for score in user.get("scores", []):
+                ts_ms = ms_of(score, "ts_ms", "timestamp")
+                percentage = score.get("percentage", 0)
+                if ts_ms is None or ts_ms <= cutoff or not is_percentage(percentage):
+                    continue
+                exam = _exam_key(score.get("exam"))
+                self._bucket(ts_ms).append((username, exam, percentage))
+                for key in ((ALL_EXAMS, username), (exam, username)) if exam is not None else ((ALL_EXAMS, username),):
+                    totals = self._totals.get(key)
+                    if totals is None:
+                        self._totals[key] = [percentage, 1]
+                    else:
+                        totals[0] += percentage
+                        totals[1] += 1
+
+    def rank(self):
+        """Re-sort every ranking from the totals (after accumulate())."""
+        with self._lock:
+            keys = {ALL_EXAMS: []}
+            for (exam, username), (total, count) in self._totals.items():
+                keys.setdefault(exam, []).append((-(total / count), username))
+            self._rankings = {exam: _Ranking(exam_keys) for exam, exam_keys in keys.items()}
+            self._version += 1
+
+    def add_score(self, username: str, score: dict, now_ms: int = None) -> bool:
+        """
+        Add one score dict ({ts_ms, exam, percentage, ...}). Scores without a
+        usable timestamp or percentage (written before ingest validated them)
+        are skipped rather than raised on, so one bad row can't stop a rebuild.
+
+        Returns:
+            True if the score is inside the window and was counted
+        """
+        fields = _score_fields(score)
+        if fields is None:
+            return False
+        return self.add(username, *fields, now_ms=now_ms)
+
+    def add(self, username: str, exam, percentage: float, ts_ms: int, now_ms: int = None) -> bool:
+        now_ms = current_ms() if now_ms is None else now_ms
+        if ts_ms <= now_ms - self.window_ms:
+            return False
+        exam = _exam_key(exam)
+
+        with self._lock:
+            self._bucket(ts_ms).append((username, exam, percentage))
+
+            self._apply(ALL_EXAMS, username, percentage, 1)
+            if exam is not None:
+                self._apply(exam, username, percentage, 1)
+        return True
+
+    def _bucket(self, ts_ms: int) -> list:
+        """The time bucket a score belongs in. Caller holds the lock."""
+        bucket_id = ts_ms // self.bucket_ms
+        bucket = self._buckets.get(bucket_id)
+        if bucket is None:
+            bucket = self._buckets[bucket_id] = []
+            heapq.heappush(self._bucket_heap, bucket_id)
+        return bucket
+
+    def writing(self):
+        """Context to hold around a storage write and its add_score() calls (see FeedLeaderboard)."""
+        return nullcontext()
+
+    def set_display_name(self, username: str, display_name: str):
+        with self._lock:
+            if self._display_names.get(username) != display_name:
+                self._display_names[username] = display_name
+                self._version += 1
+
+    def _apply(self, exam, username: str, percentage: float, sign: int):
+        self._version += 1
+        totals = self._totals.get((exam, username))
+        if totals is None:
+            totals = self._totals[(exam, username)] = [0.0, 0]
+        totals[0] += sign * percentage
+        totals[1] += sign
+
+        ranking = self._rankings.get(exam)
+        if ranking is None:
+            ranking = self._rankings[exam] = _Ranking()
+
+        if totals[1] > 0:
+            ranking.update(username, totals[0] / totals[1])
+        else:
+            del self._totals[(exam, username)]
+            ranking.update(username, None)
+
+    # --- Expiry ---
+
+    def _expire(self, now_ms: int):
+        """Drop buckets that lie entirely before the window start. Caller holds the lock."""
+        cutoff = now_ms - self.window_ms
+        while self._bucket_heap and (self._bucket_heap[0] + 1) * self.bucket_ms <= cutoff:
+            bucket_id = heapq.heappop(self._bucket_heap)
+            for username, exam, percentage in self._buckets.pop(bucket_id):
+                self._apply(ALL_EXAMS, username, percentage, -1)
+                if exam is not None:
+                    self._apply(exam, username, percentage, -1)
+
+    # --- Queries ---
+
+    def version(self, now_ms: int = None) -> int:
+        """Change counter: equal versions mean top() would return the same rows."""
+        now_ms = current_ms() if now_ms is None else now_ms
+        with self._lock:
+            self._expire(now_ms)
+            return self._version
+
+    def top(self, limit: int = 10, exam=ALL_EXAMS, now_ms: int = None) -> list:
+        """Return the `limit` best weekly averages, optionally for a single exam."""
+        return [row for _, _, row in self.ranked(limit, exam, now_ms)]
+
+    def ranked(self, limit: int = 10, exam=ALL_EXAMS, now_ms: int = None) -> list:
+        """top() rows, each as (-avg, username, row): the order they rank in."""
+        now_ms = current_ms() if now_ms is None else now_ms
+        with self._lock:
+            self._expire(now_ms)
+            ranking = self._rankings.get(exam)
+            if ranking is None:
+                return []
+            return [
+                (-avg, username, {
+                    "display_name": self._display_names.get(username, fallback_name(username)),
+                    "weekly_avg": round(avg, 1),
+                    "scores_count": self._totals[(exam, username)][1],
+                })
+                for username, avg in ranking.top(limit)
+            ]
+
+    def exams(self) -> list:
+        """Exams with at least one ranked user."""
+        with self._lock:
+            return [exam for exam, ranking in self._rankings.items() if exam is not ALL_EXAMS and len(ranking)]
+
+    def stats(self, now_ms: int = None) -> dict:
+        now_ms = current_ms() if now_ms is None else now_ms
+        with self._lock:
+            self._expire(now_ms)
+            return {
+                "ranked_users": len(self._rankings[ALL_EXAMS]),
+                "scores_in_window": sum(len(bucket) for bucket in self._buckets.values()),
+            }
+
+    def __len__(self):
+        return len(self._rankings[ALL_EXAMS])
+
+
+class ShardedLeaderboard:
+    """
+    WeeklyLeaderboard partitioned by username, so writers to different shards
+    don't share a lock. top() gathers each shard's top `limit` and merges them.
+    """
+
+    def __init__(self, shards: int, window_days: int = WINDOW_DAYS, bucket_seconds: int = BUCKET_SECONDS):
+        self.shards = [WeeklyLeaderboard(window_days, bucket_seconds) for _ in range(max(1, shards))]
+
+    def _shard(self, username: str) -> WeeklyLeaderboard:
+        return self.shards[shard_of(username, len(self.shards))]
+
+    def rebuild(self, users, now_ms: int = None):
+        now_ms = current_ms() if now_ms is None else now_ms
+        for username, user in users:
+            self.accumulate(username, user, now_ms)
+        self.rank()
+
+    def accumulate(self, username: str, user: dict, now_ms: int):
+        self._shard(username).accumulate(username, user, now_ms)
+
+    def rank(self):
+        for shard in self.shards:
+            shard.rank()
+
+    def add_score(self, username: str, score: dict, now_ms: int = None) -> bool:
+        return self._shard(username).add_score(username, score, now_ms)
+
+    def add(self, username: str, exam, percentage: float, ts_ms: int, now_ms: int = None) -> bool:
+        return self._shard(username).add(username, exam, percentage, ts_ms, now_ms)
+
+    def writing(self):
+        return nullcontext()
+
+    def set_display_name(self, username: str, display_name: str):
+        self._shard(username).set_display_name(username, display_name)
+
+    def version(self, now_ms: int = None) -> int:
+        # Every shard's version only grows, so the sum changes whenever any does
+        now_ms = current_ms() if now_ms is None else now_ms
+        return sum(shard.version(now_ms) for shard in self.shards)
+
+    def top(self, limit: int = 10, exam=ALL_EXAMS, now_ms: int = None) -> list:
+        now_ms = current_ms() if now_ms is None else now_ms
+        ranked = heapq.merge(*(shard.ranked(limit, exam, now_ms) for shard in self.shards),
+                             key=lambda entry: entry[:2])
+        return [row for _, _, row in itertools.islice(ranked, limit)]
+
+    def exams(self) -> list:
+        return sorted({exam for shard in self.shards for exam in shard.exams()})
+
+    def stats(self, now_ms: int = None) -> dict:
+        now_ms = current_ms() if now_ms is None else now_ms
+        totals = {"ranked_users": 0, "scores_in_window": 0}
+        for shard in self.shards:
+            for key, value in shard.stats(now_ms).items():
+                totals[key] += value
+        return totals
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+
+class FeedLeaderboard:
+    """
+    A WeeklyLeaderboard or ShardedLeaderboard whose score and display-name
+    changes are also appended to a shared_snapshot.EventFeed. Every worker
+    process appends its own; the one publishing the shared snapshot calls
+    catch_up() to apply everyone else's, so its leaderboard stays live
+    without rebuilding from storage. Everything else is the wrapped board's.
+    """
+
+    def __init__(self, board, feed):
+        self.board = board
+        self.feed = feed
+
+    def __getattr__(self, name):
+        return getattr(self.board, name)
+
+    def writing(self):
+        """
+        Hold around a storage write and the add_score()/set_display_name()
+        calls for it, so that reload() sees the write in storage or in the
+        feed but never in both.
+        """
+        return self.feed.writing()
+
+    def add_score(self, username: str, score: dict, now_ms: int = None) -> bool:
+        fields = _score_fields(score)
+        if fields is None:
+            return False
+        return self.add(username, *fields, now_ms=now_ms)
+
+    def add(self, username: str, exam, percentage: float, ts_ms: int, now_ms: int = None) -> bool:
+        with self.feed.writing():
+            self.feed.append({"pid": os.getpid(), "user": username, "exam": exam,
+                              "percentage": percentage, "ts_ms": ts_ms})
+            return self.board.add(username, exam, percentage, ts_ms, now_ms)
+
+    def set_display_name(self, username: str, display_name: str):
+        with self.feed.writing():
+            self.feed.append({"pid": os.getpid(), "user": username, "display_name": display_name})
+            self.board.set_display_name(username, display_name)
+
+    def catch_up(self) -> int:
+        """Apply the changes other processes have appended since the last call. Returns how many."""
+        pid = os.getpid()
+        applied = 0
+        for event in self.feed.drain():
+            if event["pid"] == pid:
+                continue
+            if "display_name" in event:
+                self.board.set_display_name(event["user"], event["display_name"])
+            else:
+                self.board.add(event["user"], event["exam"], event["percentage"], event["ts_ms"])
+            applied += 1
+        return applied
+
+    def reload(self, new_board, users):
+        """
+        Replace the board with new_board() rebuilt from users() ((username,
+        record) pairs) and drop the feed: what other processes wrote before
+        this one started catching up. Writes in every process wait meanwhile.
+        """
+        def rebuild():
+            board = new_board()
+            board.rebuild(users())
+            self.board = board
+        self.feed.reset(rebuild)
+
+
+def snapshot(board, limit: int = SNAPSHOT_LIMIT, now_ms: int = None) -> dict:
+    """
+    Everything /api/leaderboard can return, as plain data: the top `limit`
+    rows overall and for each exam, plus global stats. `board` is a
+    WeeklyLeaderboard or ShardedLeaderboard.
+    """
+    now_ms = current_ms() if now_ms is None else now_ms
+    exams = sorted(board.exams())
+    tables = [[exam, board.top(limit, exam, now_ms)] for exam in [ALL_EXAMS] + exams]
+    stats = board.stats(now_ms)
+    stats["exams"] = len(exams)
+    return {"tables": tables, "stats": stats}
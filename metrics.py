@@ -0,0 +1,190 @@
+"""
+Metrics
+Process-wide counters, gauges and latency histograms, rendered in the
+Prometheus text exposition format by /metrics.
+
+Modules declare their metrics at import time (metrics.histogram(...)) and
+record into them directly. Recording is a dict lookup, a bisect and a
+couple of additions under a lock, so it is cheap enough for every request.
+Gauges are usually callbacks (queue depths, connected clients), evaluated
+only when /metrics is scraped.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; from well under a millisecond (cached reads) up to bulb timeouts
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _samples(self):
+        """(suffix, label values, extra label, value) tuples to render."""
+        with self._lock:
+            return [("", labels, "", value) for labels, value in self._values.items()]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_labels(self.labelnames, labels, extra)} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        super().__init__(name, help, labels)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. Either set() it, or pass `callback`:
+    a function returning the value (or a dict of label tuple -> value)
+    that is called at scrape time.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels=(), callback=None):
+        super().__init__(name, help, labels)
+        self.callback = callback
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def _samples(self):
+        if self.callback is None:
+            return super()._samples()
+        try:
+            value = self.callback()
+        except Exception:
+            # A component that failed to start shouldn't break the scrape
+            return []
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [("", labels, "", v) for labels, v in value.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._values.get(labels)
+            if child is None:
+                # Per-bucket counts (last slot is +Inf), then sum
+                child = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            child[i] += 1
+            child[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the duration of a with-block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels) -> int:
+        child = self._values.get(labels)
+        return sum(child[:-1]) if child else 0
+
+    def _samples(self):
+        with self._lock:
+            children = [(labels, list(child)) for labels, child in self._values.items()]
+        samples = []
+        for labels, child in children:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), child):
+                cumulative += n
+                samples.append(("_bucket", labels, f'le="{_number(bound)}"', cumulative))
+            samples.append(("_sum", labels, "", child[-1]))
+            samples.append(("_count", labels, "", cumulative))
+        return samples
+
+
+class Registry:
+    """A set of metrics rendered together."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        """Add a metric. Registering a name again returns the existing metric."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labels=(), registry: Registry = REGISTRY) -> Counter:
+    return registry.register(Counter(name, help, labels))
+
+
+def gauge(name: str, help: str, labels=(), callback=None, registry: Registry = REGISTRY) -> Gauge:
+    return registry.register(Gauge(name, help, labels, callback))
+
+
+def histogram(name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS,
+              registry: Registry = REGISTRY) -> Histogram:
+    return registry.register(Histogram(name, help, labels, buckets))
@@ -0,0 +1,244 @@
+"""
+Presence
+Live study sessions ("who is studying right now"), kept in memory with a TTL.
+
+A session stays alive while its client heartbeats (the focus timer does so
+every minute). A session that misses heartbeats for ttl_ms is expired, so a
+closed tab no longer leaves "current_session" set on the user forever. The
+number of live sessions, overall and per exam, is kept up to date as they
+come and go, so reading it is O(1).
+
+Starting a session or heartbeating doesn't write the user record.
+checkpoint() saves the sessions that changed since the previous call into
+"current_session" (with "seen_ms", the last heartbeat), and clears the ones
+that expired, so live sessions survive a restart. Ending a session is saved
+along with the finished session itself.
+
+With several worker processes each keeps its own registry. The checkpoint is
+then what they share: a worker that gets a heartbeat or end for a session it
+hasn't seen picks it up from the user record (see alive()), and ending a
+session stamps "session_ended_ms" so other workers drop their copy.
+"""
+
+import threading
+from collections import OrderedDict
+
+from timestamps import ms_of, now_ms, to_iso
+
+DEFAULT_TTL_MS = 10 * 60_000
+
+
+def alive(stored: dict, now: int, ttl_ms: int = DEFAULT_TTL_MS) -> bool:
+    """Whether a stored "current_session" has heard from its client within ttl_ms."""
+    if not stored:
+        return False
+    seen = stored.get("seen_ms") or ms_of(stored, "start_ms", "start_time")
+    return seen is not None and now - seen <= ttl_ms
+
+
+class Session:
+    """One live session."""
+
+    __slots__ = ("start_ms", "seen_ms", "exam")
+
+    def __init__(self, start_ms: int, seen_ms: int, exam: str = None):
+        self.start_ms = start_ms
+        self.seen_ms = seen_ms
+        self.exam = exam
+
+    def record(self) -> dict:
+        """The session as stored in "current_session"."""
+        return {"start_time": to_iso(self.start_ms), "start_ms": self.start_ms,
+                "seen_ms": self.seen_ms, "exam": self.exam}
+
+
+class PresenceRegistry:
+    """In-memory live sessions with TTL expiry; see the module docstring."""
+
+    def __init__(self, ttl_ms: int = DEFAULT_TTL_MS):
+        self.ttl_ms = ttl_ms
+        self._lock = threading.Lock()
+        # username -> Session, least recently seen first (expiry pops from the front)
+        self._sessions = OrderedDict()
+        self._exams = {}
+        # username -> seen_ms of sessions that ended by expiry, until checkpointed
+        self._expired = {}
+        # users whose stored session is behind the registry
+        self._dirty = set()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._sessions
+
+    def _add(self, username: str, session: Session):
+        self._remove(username)
+        self._sessions[username] = session
+        self._exams[session.exam] = self._exams.get(session.exam, 0) + 1
+        self._expired.pop(username, None)
+
+    def _remove(self, username: str):
+        session = self._sessions.pop(username, None)
+        if session is not None:
+            left = self._exams[session.exam] - 1
+            if left:
+                self._exams[session.exam] = left
+            else:
+                del self._exams[session.exam]
+        return session
+
+    def _expire(self, now: int):
+        # Amortized O(1): every session is popped from the front at most once
+        cutoff = now - self.ttl_ms
+        while self._sessions:
+            username, session = next(iter(self._sessions.items()))
+            if session.seen_ms >= cutoff:
+                break
+            self._remove(username)
+            self._expired[username] = session.seen_ms
+            self._dirty.add(username)
+
+    def start(self, username: str, exam: str = None, now: int = None) -> Session:
+        """Start (or restart) a user's session."""
+        now = now_ms() if now is None else now
+        session = Session(now, now, exam)
+        with self._lock:
+            self._expire(now)
+            self._add(username, session)
+            self._dirty.add(username)
+        return session
+
+    def restore(self, username: str, stored: dict, now: int = None) -> bool:
+        """
+        Pick up a session from a user record ("current_session"). A live one
+        is added as of its last heartbeat; a stale one is queued to be cleared
+        by the next checkpoint. Returns whether it was live.
+        """
+        now = now_ms() if now is None else now
+        if not stored:
+            return False
+        start = ms_of(stored, "start_ms", "start_time")
+        seen = stored.get("seen_ms") or start
+        with self._lock:
+            self._expire(now)
+            if username in self._sessions:
+                return True
+            if start is not None and alive(stored, now, self.ttl_ms):
+                newest = next(reversed(self._sessions.values()), None)
+                self._add(username, Session(start, seen, stored.get("exam")))
+                if newest is not None and seen < newest.seen_ms:
+                    # Keep least recently seen first; restores are rare enough to re-sort
+                    self._sessions = OrderedDict(sorted(self._sessions.items(), key=lambda item: item[1].seen_ms))
+                return True
+            self._expired[username] = seen or 0
+            self._dirty.add(username)
+            return False
+
+    def heartbeat(self, username: str, now: int = None) -> bool:
+        """Keep a user's session alive. False if it isn't live (never started, ended or expired)."""
+        now = now_ms() if now is None else now
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(username)
+            if session is None:
+                return False
+            session.seen_ms = now
+            self._sessions.move_to_end(username)
+            self._dirty.add(username)
+            return True
+
+    def end(self, username: str, now: int = None):
+        """
+        Remove a user's session. The caller saves the finished session and
+        clears "current_session" itself. Returns the Session, or None if it
+        wasn't live.
+        """
+        now = now_ms() if now is None else now
+        with self._lock:
+            self._expire(now)
+            self._dirty.discard(username)
+            self._expired.pop(username, None)
+            return self._remove(username)
+
+    def get(self, username: str):
+        """A user's live Session, or None."""
+        with self._lock:
+            self._expire(now_ms())
+            return self._sessions.get(username)
+
+    def count(self, exam: str = None, now: int = None) -> int:
+        """Live sessions, for one exam or (exam=None) overall."""
+        with self._lock:
+            self._expire(now_ms() if now is None else now)
+            return len(self._sessions) if exam is None else self._exams.get(exam, 0)
+
+    def counts(self, now: int = None) -> dict:
+        """{"studying": live sessions, "exams": {exam: live sessions}} (sessions without an exam count only overall)."""
+        with self._lock:
+            self._expire(now_ms() if now is None else now)
+            return {"studying": len(self._sessions),
+                    "exams": {exam: n for exam, n in self._exams.items() if exam}}
+
+    def checkpoint(self, store, now: int = None) -> int:
+        """
+        Save sessions changed since the last checkpoint to their user records
+        and clear expired ones. A record that another process updated more
+        recently (a later heartbeat, a new session, or ending it) is left alone.
+
+        Returns:
+            Number of user records written
+        """
+        now = now_ms() if now is None else now
+        with self._lock:
+            self._expire(now)
+            dirty, self._dirty = self._dirty, set()
+            live = {u: self._sessions[u].record() for u in dirty if u in self._sessions}
+            expired = {u: self._expired.pop(u) for u in dirty if u in self._expired}
+        if not dirty:
+            return 0
+        written = set()
+        ended = set()
+
+        def save(username, user):
+            # update_many() may call this again for a user after a lost race;
+            # only the last (committed) attempt's outcome counts
+            written.discard(username)
+            ended.discard(username)
+            if user is None:
+                return None
+            stored = user.get("current_session")
+            stored_seen = (stored.get("seen_ms") or stored.get("start_ms") or 0) if stored else 0
+            if username in live:
+                session = live[username]
+                ended_ms = user.get("session_ended_ms")
+                if ended_ms is not None and ended_ms >= session["start_ms"]:
+                    # Ended through another worker
+                    ended.add(username)
+                    return None
+                if stored and stored_seen >= session["seen_ms"]:
+                    return None
+                user["current_session"] = session
+            elif stored and stored_seen <= expired.get(username, now):
+                user["current_session"] = None
+            else:
+                return None
+            written.add(username)
+            return user
+
+        try:
+            store.update_many(dirty, save)
+        except Exception:
+            # Try again at the next checkpoint
+            with self._lock:
+                self._dirty |= dirty
+                for username, seen in expired.items():
+                    self._expired.setdefault(username, seen)
+            raise
+        if ended:
+            with self._lock:
+                for username in ended:
+                    session = self._sessions.get(username)
+                    if session is not None and session.start_ms == live[username]["start_ms"]:
+                        self._remove(username)
+        return len(written)
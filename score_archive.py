@@ -0,0 +1,472 @@
+"""
+Score Archive
+Append-only, full-history score storage with daily/weekly rollups.
+
+Every score is appended as a fixed-size binary record to one file per user,
+so nothing is ever truncated and a write never rewrites old data. Loaded
+users are held as array-backed columns (timestamp, percentage, score,
+total, exam id) plus rollups per day and per ISO week, which are updated
+on every append. Trend queries read the rollups (a few hundred points per
+year) and the "last N scores for this exam" tail is kept per exam, so the
+record-score response is O(1).
+
+Files are named after the hex-encoded username, so no username (however
+odd) can name a path outside the archive directory. Next to each .scores
+file, a .raw file keeps every score dict as it was posted (one
+"<index>\t<json>" line per record), which the tail returns verbatim so the
+record-score response is the same as before the archive existed.
+
+Several processes can share one archive directory. Exam ids are assigned
+under a lock on exams.json and re-read from it when a process meets one it
+doesn't know, and a cached user's series picks up records that other
+processes appended to the file.
+"""
+
+import json
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from pathlib import Path
+
+from timestamps import ms_of
+
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): only one process may write an archive directory
+    fcntl = None
+
+DATA_DIR = Path(__file__).parent / "data"
+ARCHIVE_DIR = DATA_DIR / "archive"
+
+# timestamp (epoch s), percentage, score, total, exam id
+RECORD = struct.Struct("<ddddI")
+TAIL_SIZE = 5
+MAX_CACHED_USERS = 10000
+RESOLUTIONS = {"day": 86400, "week": 7 * 86400}
+# 1970-01-01 was a Thursday; shift so weekly buckets start on Monday
+WEEK_OFFSET = 3 * 86400
+
+
+def format_timestamp(ts: float) -> str:
+    """Epoch seconds -> ISO string in the browser's toISOString() format."""
+    dt = datetime.fromtimestamp(ts, timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def period_start(ts: float, resolution: str) -> int:
+    """Start (epoch s) of the day or Monday-based week containing ts."""
+    width = RESOLUTIONS[resolution]
+    offset = WEEK_OFFSET if resolution == "week" else 0
+    return int((ts + offset) // width * width - offset)
+
+
+def _number(value, default=math.nan) -> float:
+    """Numeric field as float; missing fields are stored as NaN and left out on read."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return default
+    return float(value)
+
+
+def _plain(value: float):
+    """Give back whole numbers as ints, as they were originally posted."""
+    return int(value) if value.is_integer() else value
+
+
+class ScoreSeries:
+    """One user's full score history as parallel arrays, plus rollups and per-exam tails."""
+
+    def __init__(self):
+        self.timestamps = array("d")
+        self.percentages = array("d")
+        self.scores = array("d")
+        self.totals = array("d")
+        self.exams = array("I")
+        # (resolution, exam id or None) -> {period start: [sum, count, min, max]}
+        self.rollups = {}
+        # exam id -> indices of its most recent scores
+        self.tails = {}
+        # tail index -> score as posted (JSON bytes); bytes of the .raw file read so far
+        self.raw = {}
+        self.raw_offset = 0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, ts: float, percentage: float, score: float, total: float, exam_id: int):
+        index = len(self.timestamps)
+        self.timestamps.append(ts)
+        self.percentages.append(percentage)
+        self.scores.append(score)
+        self.totals.append(total)
+        self.exams.append(exam_id)
+
+        for resolution in RESOLUTIONS:
+            start = period_start(ts, resolution)
+            for key in ((resolution, None), (resolution, exam_id)):
+                bucket = self.rollups.setdefault(key, {}).get(start)
+                if bucket is None:
+                    self.rollups[key][start] = [percentage, 1, percentage, percentage]
+                else:
+                    bucket[0] += percentage
+                    bucket[1] += 1
+                    bucket[2] = min(bucket[2], percentage)
+                    bucket[3] = max(bucket[3], percentage)
+
+        tail = self.tails.get(exam_id)
+        if tail is None:
+            tail = self.tails[exam_id] = deque(maxlen=TAIL_SIZE)
+        if len(tail) == TAIL_SIZE:
+            self.raw.pop(tail[0], None)
+        tail.append(index)
+
+    def add_raw(self, data: bytes):
+        """
+        Take the posted form of tail scores from "<index>\t<json>" lines of the
+        .raw file, stopping at a partial or garbled line or one for a record
+        not read yet.
+        """
+        tail_indices = {i for tail in self.tails.values() for i in tail}
+        for line in data.split(b"\n")[:-1]:
+            index, _, raw = line.partition(b"\t")
+            if not index.isdigit() or int(index) >= len(self.timestamps):
+                break
+            index = int(index)
+            if index in tail_indices:
+                self.raw[index] = raw
+            self.raw_offset += len(line) + 1
+
+
+class ScoreArchive:
+    """Per-user append-only score files under one directory."""
+
+    def __init__(self, root=ARCHIVE_DIR, max_cached_users: int = MAX_CACHED_USERS):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_cached_users = max_cached_users
+        self._lock = threading.RLock()
+        self._series = OrderedDict()
+        self._exams_path = self.root / "exams.json"
+        self._exam_names = []
+        self._exam_ids = {}
+        self._listeners = []
+        self._read_exams()
+        self._encode_file_names()
+
+    # --- Files ---
+
+    def _path(self, username: str) -> Path:
+        # Fan files out over 256 directories so no directory gets huge
+        bucket = f"{zlib.crc32(username.encode()) & 0xff:02x}"
+        return self.root / bucket / f"{username.encode().hex()}.scores"
+
+    @staticmethod
+    def _raw_path(path: Path) -> Path:
+        return path.with_suffix(".raw")
+
+    @staticmethod
+    def _username(path: Path) -> str:
+        return bytes.fromhex(path.stem).decode()
+
+    def _encode_file_names(self):
+        """Rename files from archives that named them by the raw username (once per directory)."""
+        marker = self.root / ".hex_names"
+        if marker.exists():
+            return
+        for path in list(self.root.glob("*/*.scores")):
+            target = self._path(path.stem)
+            if target != path:
+                os.replace(path, target)
+        marker.touch()
+
+    def _read_exams(self):
+        """Pick up exam names added by other processes (ids are never reused or reordered)."""
+        if not self._exams_path.exists():
+            return
+        with open(self._exams_path, "r") as f:
+            names = json.load(f)
+        for name in names[len(self._exam_names):]:
+            self._exam_ids[name] = len(self._exam_names)
+            self._exam_names.append(name)
+
+    def _known_exam_id(self, exam, default=None):
+        """Existing id for an exam name, re-reading exams.json on a miss. Caller holds the lock."""
+        name = exam if isinstance(exam, str) else ""
+        if name not in self._exam_ids:
+            self._read_exams()
+        return self._exam_ids.get(name, default)
+
+    def _exam_id(self, exam) -> int:
+        """Map an exam name to a small integer, persisting new names. Caller holds the lock."""
+        name = exam if isinstance(exam, str) else ""
+        exam_id = self._exam_ids.get(name)
+        if exam_id is not None:
+            return exam_id
+        with open(self._exams_path.with_suffix(".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another process may have added it (or others) since we last looked
+            self._read_exams()
+            exam_id = self._exam_ids.get(name)
+            if exam_id is None:
+                exam_id = self._exam_ids[name] = len(self._exam_names)
+                self._exam_names.append(name)
+                tmp_path = self._exams_path.with_suffix(".tmp")
+                with open(tmp_path, "w") as f:
+                    json.dump(self._exam_names, f)
+                os.replace(tmp_path, self._exams_path)
+        return exam_id
+
+    def _exam_name(self, exam_id: int) -> str:
+        """Caller holds the lock."""
+        if exam_id >= len(self._exam_names):
+            self._read_exams()
+        return self._exam_names[exam_id]
+
+    @staticmethod
+    def _catch_up(series: ScoreSeries, data: bytes):
+        """Append data, the user's file from the end of series on, minus any partial final record."""
+        for record in RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size]):
+            series.append(*record)
+
+    def _catch_up_raw(self, series: ScoreSeries, path: Path):
+        """Read the .raw file from where series left off. Caller holds the lock."""
+        try:
+            with open(self._raw_path(path), "rb") as f:
+                f.seek(series.raw_offset)
+                series.add_raw(f.read())
+        except FileNotFoundError:
+            pass
+
+    def _load(self, username: str) -> ScoreSeries:
+        """Return the user's series, reading it from disk on first use. Caller holds the lock."""
+        path = self._path(username)
+        series = self._series.get(username)
+        if series is not None:
+            self._series.move_to_end(username)
+            # Another process may have appended to the file since
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                return series
+            if size >= (len(series) + 1) * RECORD.size:
+                with open(path, "rb") as f:
+                    f.seek(len(series) * RECORD.size)
+                    self._catch_up(series, f.read())
+                self._catch_up_raw(series, path)
+            return series
+
+        series = ScoreSeries()
+        if path.exists():
+            # A partially written final record (a crash) is ignored
+            self._catch_up(series, path.read_bytes())
+            self._catch_up_raw(series, path)
+
+        self._series[username] = series
+        if len(self._series) > self.max_cached_users:
+            self._series.popitem(last=False)
+        return series
+
+    def has_user(self, username: str) -> bool:
+        return username in self._series or self._path(username).exists()
+
+    # --- Writes ---
+
+    @staticmethod
+    def _to_raw(score: dict) -> bytes:
+        """The score as posted: without the "ts_ms" that normalize_score() adds."""
+        return json.dumps({k: v for k, v in score.items() if k != "ts_ms"}, separators=(",", ":")).encode()
+
+    def _to_record(self, score: dict) -> tuple:
+        """Caller holds the lock."""
+        ts_ms = ms_of(score, "ts_ms", "timestamp")
+        return (
+            time.time() if ts_ms is None else ts_ms / 1000,
+            _number(score.get("percentage"), 0.0),
+            _number(score.get("score")),
+            _number(score.get("total")),
+            self._exam_id(score.get("exam")),
+        )
+
+    def append(self, username: str, score: dict):
+        """Append one score dict ({timestamp, exam, score, total, percentage})."""
+        self.append_many(username, [score])
+
+    def append_many(self, username: str, scores: list):
+        """Append several scores for one user with a single write + fsync."""
+        if not scores:
+            return
+        with self._lock:
+            series = self._load(username)
+            records = [self._to_record(s) for s in scores]
+            raws = [self._to_raw(s) for s in scores]
+            path = self._path(username)
+            path.parent.mkdir(exist_ok=True)
+            with open(path, "a+b") as f, open(self._raw_path(path), "a+b") as raw_file:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                # Records other processes appended since _load(), so the series keeps file order
+                f.seek(len(series) * RECORD.size)
+                self._catch_up(series, f.read())
+                end = f.tell()
+                if end % RECORD.size:
+                    # Drop a partial record left by a crash rather than writing after it
+                    f.truncate(end - end % RECORD.size)
+                raw_file.seek(series.raw_offset)
+                series.add_raw(raw_file.read())
+                # Anything left is a partial line or lines without records (a crash)
+                raw_file.truncate(series.raw_offset)
+                first = len(series)
+                raw_data = b"".join(b"%d\t%s\n" % (first + i, raw) for i, raw in enumerate(raws))
+                # Only the records are fsynced: a score whose line is lost in a
+                # crash is still returned, rebuilt from its record
+                raw_file.write(raw_data)
+                raw_file.flush()
+                f.write(b"".join(RECORD.pack(*r) for r in records))
+                f.flush()
+                os.fsync(f.fileno())
+            for record, raw in zip(records, raws):
+                series.append(*record)
+                series.raw[len(series) - 1] = raw
+            series.raw_offset += len(raw_data)
+            for listener in self._listeners:
+                listener(username, records)
+
+    def subscribe(self, listener):
+        """Call listener(username, records) after every append, while the archive lock is held."""
+        self._listeners.append(listener)
+
+    def migrate_from(self, users) -> int:
+        """
+        Seed archives from existing user records' "scores" lists.
+        Runs once per archive directory.
+
+        Returns:
+            Number of users seeded
+        """
+        if self.migrated:
+            return 0
+        count = sum(self.migrate_user(username, user) for username, user in users)
+        self.finish_migration(count)
+        return count
+
+    @property
+    def migrated(self) -> bool:
+        """Whether this directory has been seeded from the user records already."""
+        return (self.root / ".migrated").exists()
+
+    def migrate_user(self, username: str, user: dict) -> bool:
+        """One user's part of migrate_from(), for callers making their own pass over the users."""
+        if user.get("scores") and not self.has_user(username):
+            self.append_many(username, user["scores"])
+            return True
+        return False
+
+    def finish_migration(self, count: int):
+        """Mark the directory seeded, after migrate_user() has seen every user."""
+        (self.root / ".migrated").touch()
+        if count:
+            print(f"📦 Archived score history for {count} users")
+
+    # --- Reads ---
+
+    def _score_dict(self, series: ScoreSeries, index: int) -> dict:
+        """The score as posted, or rebuilt from its record if it has no .raw line (older archives)."""
+        raw = series.raw.get(index)
+        if raw is not None:
+            return json.loads(raw)
+        score = {
+            "timestamp": format_timestamp(series.timestamps[index]),
+            "exam": self._exam_name(series.exams[index]) or None,
+            "percentage": _plain(series.percentages[index]),
+        }
+        for field, column in (("score", series.scores), ("total", series.totals)):
+            if not math.isnan(column[index]):
+                score[field] = _plain(column[index])
+        return score
+
+    def tail(self, username: str, exam, n: int = TAIL_SIZE) -> list:
+        """The last n (<= 5) scores for one exam, oldest first."""
+        with self._lock:
+            series = self._load(username)
+            exam_id = self._known_exam_id(exam)
+            indices = list(series.tails.get(exam_id, ()))[-n:]
+            return [self._score_dict(series, i) for i in indices]
+
+    def count(self, username: str) -> int:
+        with self._lock:
+            return len(self._load(username))
+
+    def columns(self, username: str) -> dict:
+        """Copies of the user's column arrays: timestamps, percentages, scores, totals, exams."""
+        with self._lock:
+            series = self._load(username)
+            return {
+                "timestamps": array("d", series.timestamps),
+                "percentages": array("d", series.percentages),
+                "scores": array("d", series.scores),
+                "totals": array("d", series.totals),
+                "exams": array("I", series.exams),
+            }
+
+    def scan(self, callback, finished=None):
+        """
+        Call callback(username, raw_bytes) for every user's archive file, then finished().
+        Holds the archive lock throughout, so a subscriber that switches from scanning
+        to live appends in finished() neither misses nor double-counts a score.
+        """
+        with self._lock:
+            for path in self.root.glob("*/*.scores"):
+                data = path.read_bytes()
+                callback(self._username(path), data[:len(data) - len(data) % RECORD.size])
+            if finished is not None:
+                finished()
+
+    @property
+    def exam_names(self) -> list:
+        with self._lock:
+            self._read_exams()
+            return list(self._exam_names)
+
+    def exam_name(self, exam_id: int) -> str:
+        with self._lock:
+            return self._exam_name(exam_id)
+
+    def exam_id(self, exam):
+        """Existing id for an exam name, or None if it has never been recorded."""
+        with self._lock:
+            return self._known_exam_id(exam)
+
+    def trend(self, username: str, resolution: str = "day", since: float = None, exam=None) -> list:
+        """
+        Rolled-up averages per day or week.
+
+        Args:
+            resolution: "day" or "week"
+            since: Only periods starting at or after this epoch time
+            exam: Only scores for this exam (default: all exams)
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {sorted(RESOLUTIONS)}")
+        with self._lock:
+            series = self._load(username)
+            exam_id = None if exam is None else self._known_exam_id(exam, -1)
+            buckets = series.rollups.get((resolution, exam_id), {})
+            floor = -math.inf if since is None else period_start(since, resolution)
+            return [
+                {
+                    "period": datetime.fromtimestamp(start, timezone.utc).strftime("%Y-%m-%d"),
+                    "avg": round(total / count, 2),
+                    "count": count,
+                    "min": _plain(low),
+                    "max": _plain(high),
+                }
+                for start, (total, count, low, high) in sorted(buckets.items())
+                if start >= floor
+            ]
@@ -0,0 +1,63 @@
+"""
+JSON Serializer
+One place that turns records and responses into JSON bytes and back.
+
+Uses orjson when it is installed (several times faster on both ends) and the
+standard library otherwise; set JSON_BACKEND=json to force the fallback.
+Output is always compact: no indentation, no spaces after separators.
+Values orjson can't handle (e.g. integers over 64 bits) fall back to the
+standard library, so both backends accept the same data.
+"""
+
+import json
+import os
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+BACKEND = "orjson" if ORJSON_AVAILABLE and os.environ.get("JSON_BACKEND", "orjson") != "json" else "json"
+
+if BACKEND == "orjson":
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj) -> bytes:
+        """Compact JSON as UTF-8 bytes."""
+        try:
+            return orjson.dumps(obj, option=_OPTIONS)
+        except TypeError:
+            return _std_dumps(obj).encode()
+
+    def dumps_str(obj) -> str:
+        """Compact JSON as a str (for TEXT columns and line-based files)."""
+        return dumps(obj).decode()
+
+    loads = orjson.loads
+else:
+    def dumps(obj) -> bytes:
+        """Compact JSON as UTF-8 bytes."""
+        return _std_dumps(obj).encode()
+
+    def dumps_str(obj) -> str:
+        """Compact JSON as a str (for TEXT columns and line-based files)."""
+        return _std_dumps(obj)
+
+    loads = json.loads
+
+
+def _std_dumps(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def load_file(path):
+    """Parse a whole JSON file."""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def dump_file(obj, path):
+    """Write obj to path as compact JSON (not atomic; callers rename if needed)."""
+    with open(path, "wb") as f:
+        f.write(dumps(obj))
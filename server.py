@@ -3,27 +3,59 @@ Exam Score Bulb - Web Server
 Serves the visual web app and optionally controls smart bulb
 """
 
+import atexit
+import importlib.util
 import json
 import os
+import threading
+import time
+from datetime import datetime, timezone
 from pathlib import Path
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
+
+from app_config import get_config, reload_on_sighup
+from bulk_ingest import ingest_lines
+from event_hub import HEARTBEAT_SECONDS, EventHub
+import metrics
+from http_cache import (Asset, BodyCache, JSONProvider, StaticAssets, compress_response,
+                        not_modified, tag, version_tag)
+from instrumentation import SlowRequestProfiler, instrument_app
+from leaderboard import FeedLeaderboard, ShardedLeaderboard, WeeklyLeaderboard, snapshot as leaderboard_snapshot
+from presence import PresenceRegistry, alive as session_alive
+from score_archive import ARCHIVE_DIR, ScoreArchive
+from shared_snapshot import EventFeed, SnapshotPublisher, SnapshotReader, default_path as snapshot_path
+from storage import DATA_DIR, ShardedUserStore, open_store
+from streak_tracker import StreakTracker, seconds_until_reset
+from timestamps import migrate as migrate_timestamps, ms_of, normalize_score, now_ms, to_iso
+from study_index import StudyHistoryIndex, add_session, build_daily
+from user_cache import CachedUserStore
 
 # --- Configuration ---
-CONFIG_PATH = Path("config.json")
-try:
-    with open(CONFIG_PATH, "r") as f:
-        config = json.load(f)
-except FileNotFoundError:
-    config = {}
+# Shared with streak_tracker and bulb_controller; reloads when config.json changes
+config = get_config()
 
 # Use PORT from environment (Railway sets this) or fallback to config
 PORT = int(os.environ.get("PORT", config.get("server_port", 5555)))
-app = Flask(__name__, template_folder='templates', static_folder='static')
+# Static files are served from memory by the /static route below
+app = Flask(__name__, template_folder='templates', static_folder=None)
+app.json = JSONProvider(app)
+app.after_request(compress_response)
+# Latency/status per route for /metrics; set profile_slow_ms in config.json to sample slow requests
+profiler = SlowRequestProfiler(config)
+instrument_app(app, profiler)
+
+# index.html has no per-request content: render it once, with fingerprinted asset URLs
+assets = StaticAssets(Path(__file__).parent / "static")
+with app.app_context():
+    index_page = Asset(render_template("index.html", asset_url=assets.url).encode(), "text/html")
 
-# Bulb controller is optional (for local use only)
+# Bulb controller is optional (for local use only). It connects to the bulbs
+# on a background thread, so startup never waits on the LAN
 try:
     from bulb_controller import BulbController
-    bulb = BulbController()
+    from bulb_worker import BulbWorker
+    bulb = BulbWorker(BulbController(), max_queue=config.get("bulb_queue_size", 32))
+    atexit.register(bulb.close)
 except Exception as e:
     print(f"⚠️ Bulb controller not available: {e}")
     bulb = None
@@ -33,17 +65,26 @@ except Exception as e:
 @app.route("/")
 def home():
     """Serves the viral web visualizer."""
-    return render_template("index.html")
+    return index_page.response()
+
+@app.route("/static/<path:filename>")
+def static_file(filename):
+    """Precompressed static files; immutable for a year when requested with their ?v= fingerprint."""
+    response = assets.response(filename)
+    if response is None:
+        return jsonify({"status": "error", "message": "Not found"}), 404
+    return response
 
 @app.route("/api/set-color", methods=["POST"])
 def set_color():
-    """Receives color from web app and syncs to bulb."""
+    """Receives color from web app and queues it for the bulb (202: applied asynchronously)."""
     data = request.json
     try:
         r, g, b = data['r'], data['g'], data['b']
         if bulb:
             bulb.set_color(r, g, b)
-        return jsonify({"status": "success", "color": f"rgb({r},{g},{b})"}), 200
+        publish_bulb_color({"r": r, "g": g, "b": b})
+        return jsonify({"status": "success", "color": f"rgb({r},{g},{b})"}), 202
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -53,26 +94,14 @@ def record_score():
     try:
         data = request.json
         # Structure: {timestamp, exam, score, total, percentage}
+        try:
+            normalize_score(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        anonymous_archive.append(ANONYMOUS_KEY, data)
         
-        history_file = Path("data/score_history.json")
-        history = []
-        if history_file.exists():
-            with open(history_file, "r") as f:
-                history = json.load(f)
-        
-        # Append new score
-        history.append(data)
-        
-        # Keep last 100 entries to prevent infinite growth
-        if len(history) > 100:
-            history = history[-100:]
-            
-        with open(history_file, "w") as f:
-            json.dump(history, f, indent=2)
-
-        # Calculate context (Delta & Previous Scores)
-        exam_type = data.get('exam')
-        exam_history = [h for h in history if h.get('exam') == exam_type]
+        # Calculate context (Delta & Previous Scores) from the archive's tail
+        exam_history = anonymous_archive.tail(ANONYMOUS_KEY, data.get('exam'))
         
         # We need the one BEFORE the current one we just added
         previous_entry = None
@@ -82,7 +111,7 @@ def record_score():
         return jsonify({
             "status": "success", 
             "previous": previous_entry,
-            "history": exam_history[-5:] # Last 5 for sparkline
+            "history": exam_history # Last 5 for sparkline
         }), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -91,67 +120,394 @@ def record_score():
 def status():
     """Health check."""
     bulb_ip = config.get("bulb", {}).get("ip", "not configured")
-    return jsonify({"status": "online", "bulb_ip": bulb_ip})
+    response = jsonify({"status": "online", "bulb_ip": bulb_ip})
+    response.add_etag()
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
 # --- User Authentication ---
-USERS_FILE = Path("data/users.json")
+MAX_USERNAME_LENGTH = 64
+# Backend is "sqlite" (default; migrates data/users.json on first start) or "json"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", config.get("storage_backend", "sqlite"))
+# Reads are served from memory; writes are journaled and compacted in the background.
+# With user_cache off, every request goes to the backend, so several worker
+# processes can share the SQLite database (see gunicorn.conf.py)
+USER_CACHE = os.environ.get("USER_CACHE", str(config.get("user_cache", True))).lower() not in ("0", "false", "no")
+# Above 1, users are split by username hash over data/shards/ (see ShardedUserStore)
+STORAGE_SHARDS = int(os.environ.get("STORAGE_SHARDS", config.get("storage_shards", 1)))
+backend_store = open_store(STORAGE_BACKEND, shards=STORAGE_SHARDS)
+if USER_CACHE:
+    store = CachedUserStore(
+        backend_store,
+        fsync_interval_ms=config.get("journal_fsync_ms", 5),
+        compact_every=config.get("journal_compact_every", 1000),
+        # Users who haven't logged in for this long are kept compressed in memory
+        cold_after_days=config.get("user_cold_after_days", 14),
+    )
+else:
+    store = backend_store
+atexit.register(store.close)
+
+
+def reshard_users():
+    """Move users to the configured shard count while requests keep being served."""
+    try:
+        backend_store.reshard(STORAGE_SHARDS)
+    except Exception as e:
+        print(f"⚠️ Resharding failed: {e}")
+
+
+if isinstance(backend_store, ShardedUserStore) and (
+        backend_store.shards != STORAGE_SHARDS or backend_store.target is not None):
+    if USER_CACHE:
+        threading.Thread(target=reshard_users, name="reshard", daemon=True).start()
+    else:
+        # Other worker processes route by the shard count they started with
+        print(f"⚠️ Users are in {backend_store.shards} shards, not {STORAGE_SHARDS}; "
+              f"stop the workers and run: python storage.py reshard {STORAGE_SHARDS} {STORAGE_BACKEND}")
+
+
+def new_leaderboard():
+    return ShardedLeaderboard(STORAGE_SHARDS) if STORAGE_SHARDS > 1 else WeeklyLeaderboard()
+
+
+# Weekly leaderboard is built by warm_up() and then updated as scores arrive
+leaderboard = new_leaderboard()
+leaderboard_bodies = BodyCache()
+
+# With several worker processes, one of them publishes the leaderboard tables
+# into a host-wide shared memory file and every worker serves /api/leaderboard
+# from it (see shared_snapshot.py). Without the user cache each worker only
+# sees its own score writes, so they also append them to a feed that the
+# publisher applies to its own leaderboard (see leaderboard.FeedLeaderboard);
+# it rebuilds from the shared store only once, when it starts publishing.
+# Without flock there is no feed, and it rebuilds every snapshot_rebuild_seconds.
+SHARED_SNAPSHOT = os.environ.get(
+    "SHARED_SNAPSHOT", str(config.get("shared_snapshot", not USER_CACHE))).lower() not in ("0", "false", "no")
+if SHARED_SNAPSHOT:
+    _snapshot_path = Path(config.get("snapshot_path") or snapshot_path("leaderboard", DATA_DIR))
+    shared_leaderboard = SnapshotReader(_snapshot_path)
+    if not USER_CACHE and EventFeed.supported:
+        leaderboard = FeedLeaderboard(leaderboard, EventFeed(_snapshot_path.with_name(_snapshot_path.name + ".feed")))
+else:
+    shared_leaderboard = None
+# Publisher thread state; "board" is the periodic rebuild's, without a feed
+_published = {"version": None, "snapshot": None, "loaded": False, "board": None, "rebuilt_at": 0.0}
+
+
+def build_leaderboard_snapshot() -> dict:
+    """
+    The publisher's snapshot of the live leaderboard, taken again only when
+    its version moves (a score, a name, or one expiring from the window).
+    """
+    board = leaderboard
+    if isinstance(leaderboard, FeedLeaderboard):
+        if not _published["loaded"]:
+            leaderboard.reload(new_leaderboard, store.items)
+            _published["loaded"] = True
+        leaderboard.catch_up()
+    elif not USER_CACHE:
+        if time.monotonic() - _published["rebuilt_at"] >= config.get("snapshot_rebuild_seconds", 5):
+            board = new_leaderboard()
+            board.rebuild(store.items())
+            _published.update(board=board, rebuilt_at=time.monotonic(), version=None)
+        board = _published["board"]
+    version = board.version()
+    if version != _published["version"]:
+        _published.update(version=version, snapshot=leaderboard_snapshot(board))
+    return _published["snapshot"]
 
-def load_users():
-    if USERS_FILE.exists():
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
-    return {}
 
-def save_users(users):
-    USERS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=2)
+def start_snapshot_publisher():
+    """Compete to publish the shared snapshot; started by warm_up(), once there's a leaderboard to publish."""
+    if not SHARED_SNAPSHOT:
+        return
+    publisher = SnapshotPublisher(
+        _snapshot_path, build_leaderboard_snapshot, interval=config.get("snapshot_interval_ms", 500) / 1000)
+    atexit.register(publisher.close)
+
+
+def shared_rows(snapshot, limit: int, exam) -> list:
+    for table_exam, rows in snapshot.data["tables"]:
+        if table_exam == exam:
+            return rows[:limit]
+    return []
+
+# Full score history per user (the user record only keeps the latest 50);
+# seeded from the user records by warm_up() on first start
+archive = ScoreArchive()
+
+
+def migrate_user_timestamps():
+    """Add integer epoch ms fields to users stored before they existed (see timestamps.py)."""
+    try:
+        migrated = migrate_timestamps(store)
+        if migrated:
+            print(f"🕒 Added epoch ms timestamps to {migrated} users")
+    except Exception as e:
+        print(f"⚠️ Timestamp migration failed: {e}")
+
+
+threading.Thread(target=migrate_user_timestamps, name="timestamp-migration", daemon=True).start()
+
+# Scores posted without a user share one anonymous history
+ANONYMOUS_KEY = "all"
+anonymous_archive = ScoreArchive(ARCHIVE_DIR.with_name("archive_anonymous"))
+if not anonymous_archive.has_user(ANONYMOUS_KEY) and Path("data/score_history.json").exists():
+    with open("data/score_history.json", "r") as f:
+        anonymous_archive.append_many(ANONYMOUS_KEY, json.load(f))
+
+# Analytics needs NumPy, which takes longer to import than the rest of the app:
+# analytics.py is imported on the first analytics request, and the cohort
+# columns are loaded from the archive on the first cohort request
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+_cohort = None
+_cohort_lock = threading.Lock()
+
+
+def get_cohort():
+    global _cohort
+    if _cohort is None:
+        with _cohort_lock:
+            if _cohort is None:
+                from analytics import CohortIndex
+                _cohort = CohortIndex(archive, cache_seconds=config.get("cohort_cache_seconds", 30))
+    return _cohort
+
+# Daily study totals + cached streaks, loaded per user on first access
+study_index = StudyHistoryIndex(reset_hour=config.get("streak_reset_hour", 4))
+
+# Live study sessions, in memory with a TTL (see presence.py); checkpointed to
+# "current_session" every session_checkpoint_seconds so they survive a restart
+presence = PresenceRegistry(ttl_ms=config.get("session_ttl_seconds", 600) * 1000)
+
+# Habit streaks (days with >= success_threshold_minutes) for every user, on the same UTC clock
+streaks = StreakTracker(tz=timezone.utc)
+
+# --- Warm-up ---
+# The leaderboard, first-start archive migration, live sessions and streaks are
+# all loaded in one pass over the users, on a background thread: the worker
+# answers (and gunicorn's boot timeout is met) however many users there are.
+# Until it's done, the endpoints that depend on it answer 503 and clients retry
+warm = threading.Event()
+WARM_ENDPOINTS = {
+    "record_score_user", "bulk_scores", "get_trend", "get_analytics", "get_cohort_analytics",
+    "save_onboarding", "get_leaderboard", "start_session", "heartbeat_session", "end_session",
+    "get_study_history", "get_presence", "stream", "get_streak",
+}
+
+
+def warm_up():
+    start = time.perf_counter()
+    loaded_ms = now_ms()
+    migrate = not archive.migrated
+    users = migrated = 0
+    try:
+        for username, user in store.items():
+            users += 1
+            leaderboard.accumulate(username, user, loaded_ms)
+            if migrate and archive.migrate_user(username, user):
+                migrated += 1
+            if user.get("current_session"):
+                presence.restore(username, user["current_session"])
+            daily = user.get("study_daily")
+            if daily is None and user.get("study_sessions"):
+                daily = build_daily(user["study_sessions"])
+            if daily:
+                streaks.load(username, daily)
+        if migrate:
+            archive.finish_migration(migrated)
+        print(f"🔥 Loaded {users} users in {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        # Serve what was loaded rather than 503 until a restart
+        print(f"⚠️ Warm-up failed after {users} users: {e}")
+    finally:
+        leaderboard.rank()
+        warm.set()
+    start_snapshot_publisher()
+
+
+threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
+@app.before_request
+def wait_for_warm_up():
+    if not warm.is_set() and request.endpoint in WARM_ENDPOINTS:
+        return jsonify({"status": "error", "message": "Starting up, try again shortly"}), 503, {"Retry-After": "2"}
+
+
+def load_study(username: str) -> bool:
+    """
+    Index a user's daily study totals (study_index and streaks) if they aren't
+    yet. With USER_CACHE off other workers end sessions too, so they are
+    reloaded from the store on every read instead. False if there's no such user.
+    """
+    if USER_CACHE and username in study_index:
+        return True
+    user = store.get(username)
+    if user is None:
+        return False
+    streaks.load(username, study_index.load(username, user))
+    return True
+
+
+def push_streak_color(username: str, color: dict = None):
+    """Show a user's streak color on their bulb group, if config.json maps one ("bulb_users")."""
+    group = config.get("bulb_users", {}).get(username)
+    if bulb is None or group is None:
+        return
+    color = color or streaks.status(username)["color"]
+    bulb.submit("set_group_color", group, color["r"], color["g"], color["b"])
+    publish_bulb_color(dict(color, group=group))
+
+
+def nightly_streak_pass():
+    """At every streak_reset_hour, re-evaluate all streaks at once and refresh users' bulbs."""
+    while True:
+        time.sleep(seconds_until_reset(tz=timezone.utc) + 1)
+        try:
+            result = streaks.evaluate_all()
+            broken = sum(1 for n in result["streak"] if n == 0)
+            print(f"🌙 Streak pass: {len(result['usernames'])} users, {broken} without an active streak")
+            for username in config.get("bulb_users", {}):
+                load_study(username)
+                push_streak_color(username)
+            # Day rollover can break streaks; tell every connected user
+            for topic in hub.topics():
+                if topic.startswith("user:"):
+                    load_study(topic[len("user:"):])
+                    publish_streak(topic[len("user:"):])
+        except Exception as e:
+            print(f"⚠️ Streak pass failed: {e}")
+
+
+threading.Thread(target=nightly_streak_pass, name="streak-nightly", daemon=True).start()
+
+
+def checkpoint_sessions():
+    try:
+        presence.checkpoint(store)
+    except Exception as e:
+        print(f"⚠️ Session checkpoint failed: {e}")
+
+
+def session_checkpoints():
+    while True:
+        time.sleep(config.get("session_checkpoint_seconds", 60))
+        checkpoint_sessions()
+
+
+threading.Thread(target=session_checkpoints, name="session-checkpoint", daemon=True).start()
+# Registered after store.close, so it runs before it
+atexit.register(checkpoint_sessions)
+
+# --- Live updates (/api/stream) ---
+# Under gthread every open stream holds one of the worker's threads (see
+# gunicorn.conf.py), so by default streams get at most half of them and the
+# rest keep serving requests. Clients turned away with a 503 poll the
+# leaderboard instead. Under gevent a stream only holds a greenlet
+_worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+if "gevent" in _worker_class or "eventlet" in _worker_class:
+    STREAM_MAX_CLIENTS = 10000
+else:
+    STREAM_MAX_CLIENTS = max(1, int(os.environ.get("GUNICORN_THREADS", 32)) // 2)
+hub = EventHub(
+    max_clients=config.get("stream_max_clients", STREAM_MAX_CLIENTS),
+    max_buffered=config.get("stream_buffer_events", 64),
+)
+atexit.register(hub.close)
+STREAM_LEADERBOARD_SIZE = 10
+# Last bulb color and leaderboard rows sent, so new clients get a snapshot and
+# existing ones only get the rows that changed
+bulb_color = None
+_streamed_top = []
+_streamed_top_lock = threading.Lock()
+
+
+def leaderboard_rows(top: list) -> list:
+    return [dict(entry, rank=rank) for rank, entry in enumerate(top, start=1)]
+
+
+def publish_leaderboard_changes():
+    """Push the leaderboard rows that changed since the last push."""
+    global _streamed_top
+    if not hub.has_subscribers("leaderboard"):
+        return
+    # Held while publishing too, so deltas are queued in the order they were computed
+    with _streamed_top_lock:
+        top = leaderboard.top(STREAM_LEADERBOARD_SIZE)
+        previous, _streamed_top = _streamed_top, top
+        changes = [
+            row for i, row in enumerate(leaderboard_rows(top))
+            if i >= len(previous) or previous[i] != top[i]
+        ]
+        if changes or len(top) != len(previous):
+            hub.publish("leaderboard", "leaderboard", {"changes": changes, "size": len(top)})
+
+
+def publish_bulb_color(color: dict):
+    global bulb_color
+    bulb_color = color
+    hub.publish("bulb", "bulb", color)
+
+
+def streak_event(username: str, status: dict = None) -> dict:
+    status = status or streaks.status(username)
+    return dict(status, study_streak=study_index.streak(username) if username in study_index else None)
+
+
+def publish_streak(username: str, status: dict = None):
+    topic = f"user:{username}"
+    if hub.has_subscribers(topic):
+        hub.publish(topic, "streak", streak_event(username, status))
 
 @app.route("/api/login", methods=["POST"])
 def login():
     """Handle username login. Creates new user or returns existing."""
-    from datetime import datetime, timezone
     try:
         data = request.json
         username = data.get("username", "").strip().lower()
         
         if not username or len(username) < 2:
             return jsonify({"status": "error", "message": "Username too short (min 2 chars)"}), 400
-        
-        users = load_users()
-        now = datetime.now(timezone.utc).isoformat()
-        
-        if username in users:
-            # Existing user - calculate days since last login
-            last_login_str = users[username].get("last_login", now)
-            last_login = datetime.fromisoformat(last_login_str.replace('Z', '+00:00'))
-            days_since = (datetime.now(timezone.utc) - last_login).days
-            
-            # Update last login
-            users[username]["last_login"] = now
-            save_users(users)
-            
-            return jsonify({
-                "status": "success",
-                "isNewUser": False,
-                "daysSince": days_since,
-                "user": users[username]
-            }), 200
-        else:
+        if len(username) > MAX_USERNAME_LENGTH:
+            return jsonify({"status": "error", "message": f"Username too long (max {MAX_USERNAME_LENGTH} chars)"}), 400
+        # Usernames end up in file names (score archive) and URLs
+        if ".." in username or any(c in "/\\" or not c.isprintable() for c in username):
+            return jsonify({"status": "error", "message": "Username can't contain '/', '\\', '..' or control characters"}), 400
+        
+        login_ms = now_ms()
+        now = to_iso(login_ms)
+        seen = {}
+        
+        def touch(user):
+            # May run more than once if another request updates this user meanwhile
+            if user is not None:
+                # Existing user - calculate days since last login
+                last_login_ms = ms_of(user, "last_login_ms", "last_login") or login_ms
+                seen.update(new=False, days_since=(login_ms - last_login_ms) // 86_400_000)
+                
+                # Update last login
+                user["last_login"] = now
+                user["last_login_ms"] = login_ms
+                return user
             # New user
-            users[username] = {
+            seen.update(new=True, days_since=0)
+            return {
                 "created_at": now,
                 "last_login": now,
+                "last_login_ms": login_ms,
                 "scores": []
             }
-            save_users(users)
-            
-            return jsonify({
-                "status": "success",
-                "isNewUser": True,
-                "daysSince": 0,
-                "user": users[username]
-            }), 200
+        
+        user = store.update(username, touch)
+        
+        return jsonify({
+            "status": "success",
+            "isNewUser": seen["new"],
+            "daysSince": seen["days_since"],
+            "user": user
+        }), 200
             
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -161,23 +517,34 @@ def record_score_user(username):
     """Records a score for a specific user."""
     try:
         data = request.json
-        users = load_users()
-        
-        if username not in users:
+        try:
+            normalize_score(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        
+        def add_score(user):
+            if user is None:
+                return None
+            # Append score to user's history
+            user["scores"].append(data)
+            
+            # Keep last 50 scores per user
+            if len(user["scores"]) > 50:
+                user["scores"] = user["scores"][-50:]
+            return user
+        
+        with leaderboard.writing():
+            user = store.update(username, add_score)
+            counted = user is not None and leaderboard.add_score(username, data)
+        if user is None:
             return jsonify({"status": "error", "message": "User not found"}), 404
         
-        # Append score to user's history
-        users[username]["scores"].append(data)
-        
-        # Keep last 50 scores per user
-        if len(users[username]["scores"]) > 50:
-            users[username]["scores"] = users[username]["scores"][-50:]
-        
-        save_users(users)
+        archive.append(username, data)
+        if counted:
+            publish_leaderboard_changes()
         
         # Get history for this exam type
-        exam_type = data.get("exam")
-        exam_history = [s for s in users[username]["scores"] if s.get("exam") == exam_type]
+        exam_history = archive.tail(username, data.get("exam"))
         
         previous_entry = None
         if len(exam_history) >= 2:
@@ -186,39 +553,129 @@ def record_score_user(username):
         return jsonify({
             "status": "success",
             "previous": previous_entry,
-            "history": exam_history[-5:]
+            "history": exam_history
         }), 200
         
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route("/api/scores/bulk", methods=["POST"])
+def bulk_scores():
+    """
+    Import many scores from a streamed NDJSON body.
+    Each line: {"username", "timestamp", "exam", "score", "total", "percentage"}.
+    Bad rows are reported per line; the rest of the batch is still imported.
+    """
+    try:
+        lines = iter(request.stream.readline, b"")
+        result = ingest_lines(lines, store, leaderboard, archive)
+        publish_leaderboard_changes()
+        return jsonify({"status": "success", **result}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/api/trend/<username>", methods=["GET"])
+def get_trend(username):
+    """
+    Get long-term score trend from the archive's rollups.
+
+    Query params:
+        resolution: "day" (default) or "week"
+        days: How far back to look (default 365)
+        exam: Only this exam type
+    """
+    try:
+        if username not in store:
+            return jsonify({"status": "error", "message": "User not found"}), 404
+        
+        resolution = request.args.get("resolution", "day")
+        if resolution not in ("day", "week"):
+            return jsonify({"status": "error", "message": "resolution must be day or week"}), 400
+        days = max(1, request.args.get("days", 365, type=int))
+        
+        return jsonify({
+            "status": "success",
+            "resolution": resolution,
+            "total_scores": archive.count(username),
+            "trend": archive.trend(
+                username,
+                resolution,
+                since=time.time() - days * 86400,
+                exam=request.args.get("exam") or None
+            )
+        }), 200
+        
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/api/analytics/<username>", methods=["GET"])
+def get_analytics(username):
+    """Score analytics for one user: moving averages, weekly deltas, per-exam percentiles, goal projection."""
+    try:
+        if not NUMPY_AVAILABLE:
+            return jsonify({"status": "error", "message": "Analytics unavailable (NumPy not installed)"}), 503
+        
+        user = store.get(username)
+        if user is None:
+            return jsonify({"status": "error", "message": "User not found"}), 404
+        
+        from analytics import user_analytics
+        return jsonify({"status": "success", **user_analytics(archive, username, user)}), 200
+        
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/api/analytics", methods=["GET"])
+def get_cohort_analytics():
+    """The same analytics aggregated across all users (refreshed every cohort_cache_seconds)."""
+    try:
+        if not NUMPY_AVAILABLE:
+            return jsonify({"status": "error", "message": "Analytics unavailable (NumPy not installed)"}), 503
+        
+        cohort = get_cohort()
+        cohort.build(store.items() if len(cohort) == 0 else None)
+        return jsonify({"status": "success", **cohort.snapshot()}), 200
+        
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route("/api/onboarding/<username>", methods=["POST"])
 def save_onboarding(username):
     """Save onboarding questionnaire data."""
     try:
         data = request.json
-        users = load_users()
         
-        if username not in users:
+        def onboard(user):
+            if user is None:
+                return None
+            # Save onboarding data
+            user["exam"] = data.get("exam", "")
+            user["total_marks"] = data.get("total_marks", 800)
+            user["goal"] = data.get("goal", 0)
+            user["exam_date"] = data.get("exam_date", "")
+            user["onboarded"] = True
+            
+            # Generate anonymous display name if not already set
+            if "display_name" not in user:
+                import random
+                user["display_name"] = f"Grinder_{random.randint(1000, 9999)}"
+            return user
+        
+        with leaderboard.writing():
+            user = store.update(username, onboard)
+            if user is not None:
+                leaderboard.set_display_name(username, user["display_name"])
+        if user is None:
             return jsonify({"status": "error", "message": "User not found"}), 404
         
-        # Save onboarding data
-        users[username]["exam"] = data.get("exam", "")
-        users[username]["total_marks"] = data.get("total_marks", 800)
-        users[username]["goal"] = data.get("goal", 0)
-        users[username]["exam_date"] = data.get("exam_date", "")
-        users[username]["onboarded"] = True
-        
-        # Generate anonymous display name if not already set
-        if "display_name" not in users[username]:
-            import random
-            users[username]["display_name"] = f"Grinder_{random.randint(1000, 9999)}"
-        
-        save_users(users)
+        publish_leaderboard_changes()
+        # Before the first cohort request there are no columns to update yet
+        if _cohort is not None:
+            _cohort.set_profile(username, user)
         
         return jsonify({
             "status": "success",
-            "user": users[username]
+            "user": user
         }), 200
         
     except Exception as e:
@@ -226,41 +683,37 @@ def save_onboarding(username):
 
 @app.route("/api/leaderboard", methods=["GET"])
 def get_leaderboard():
-    """Get top 10 grinders by weekly average score."""
-    from datetime import datetime, timezone, timedelta
+    """
+    Get top grinders by weekly average score.
+
+    Query params:
+        limit: Number of entries (default 10, max 100)
+        exam: Only rank scores for this exam type
+    """
     try:
-        users = load_users()
-        one_week_ago = datetime.now(timezone.utc) - timedelta(days=7)
-        
-        leaderboard = []
-        for username, user_data in users.items():
-            scores = user_data.get("scores", [])
-            
-            # Filter scores from last 7 days
-            weekly_scores = []
-            for s in scores:
-                try:
-                    ts = datetime.fromisoformat(s.get("timestamp", "").replace('Z', '+00:00'))
-                    if ts > one_week_ago:
-                        weekly_scores.append(s.get("percentage", 0))
-                except:
-                    pass
-            
-            if weekly_scores:
-                avg = sum(weekly_scores) / len(weekly_scores)
-                leaderboard.append({
-                    "display_name": user_data.get("display_name", f"Grinder_{hash(username) % 10000}"),
-                    "weekly_avg": round(avg, 1),
-                    "scores_count": len(weekly_scores)
-                })
-        
-        # Sort by weekly average (descending)
-        leaderboard.sort(key=lambda x: x["weekly_avg"], reverse=True)
+        # Served from the shared snapshot once one has been published
+        shared = shared_leaderboard.current() if shared_leaderboard is not None else None
+        # ETags are per URL, so the version alone identifies this limit/exam's rows.
+        # A shared snapshot's version is the same in every worker (and survives
+        # restarts), so its ETag leaves out the per-process boot id
+        if shared:
+            version = f"{shared.seq}.{shared.published_ms}"
+            etag = f"leaderboard-shared-{version}"
+        else:
+            version = leaderboard.version()
+            etag = version_tag("leaderboard", version)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        limit = max(1, min(request.args.get("limit", 10, type=int), 100))
+        exam = request.args.get("exam") or None
         
-        return jsonify({
+        # Serialized once per leaderboard version, not once per request
+        return tag(leaderboard_bodies.response((limit, exam), version, lambda: {
             "status": "success",
-            "leaderboard": leaderboard[:10]  # Top 10
-        }), 200
+            "leaderboard": shared_rows(shared, limit, exam) if shared else leaderboard.top(limit, exam=exam)
+        }), etag), 200
         
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -268,62 +721,101 @@ def get_leaderboard():
 # --- Study Session Tracking ---
 @app.route("/api/session/start/<username>", methods=["POST"])
 def start_session(username):
-    """Start a study session."""
-    from datetime import datetime, timezone
+    """Start a study session; the client then heartbeats until it ends it."""
     try:
-        users = load_users()
-        if username not in users:
+        user = store.get(username)
+        if user is None:
             return jsonify({"status": "error", "message": "User not found"}), 404
         
-        users[username]["current_session"] = {
-            "start_time": datetime.now(timezone.utc).isoformat()
-        }
-        save_users(users)
+        # Counted under the exam the user studies for unless the client says otherwise
+        data = request.get_json(silent=True) or {}
+        presence.start(username, data.get("exam") or user.get("exam") or None)
+        if not USER_CACHE:
+            # Other worker processes find the session in the user record
+            checkpoint_sessions()
         
-        return jsonify({"status": "success", "message": "Session started"}), 200
+        return jsonify({"status": "success", "message": "Session started",
+                        "heartbeat_seconds": presence.ttl_ms // 10_000}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/api/session/heartbeat/<username>", methods=["POST"])
+def heartbeat_session(username):
+    """Keep a study session alive; sessions without one for session_ttl_seconds expire."""
+    try:
+        if not presence.heartbeat(username):
+            # Started through another worker, or before a restart
+            user = store.get(username)
+            if user is None:
+                return jsonify({"status": "error", "message": "User not found"}), 404
+            if not (presence.restore(username, user.get("current_session")) and presence.heartbeat(username)):
+                return jsonify({"status": "error", "message": "No active session"}), 400
+        return jsonify({"status": "success"}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route("/api/session/end/<username>", methods=["POST"])
 def end_session(username):
     """End a study session and save duration."""
-    from datetime import datetime, timezone
     try:
         data = request.json
-        users = load_users()
+        pomodoros = data.get("pomodoros", 0)
+        end_ms = now_ms()
+        end_time = datetime.fromtimestamp(end_ms / 1000, timezone.utc)
+        # Add session (dated by study day, which starts at streak_reset_hour)
+        today = study_index.today(end_time).strftime("%Y-%m-%d")
+        session = presence.end(username, end_ms)
+        ended = {}
+        
+        def end(user):
+            ended.clear()
+            if user is None:
+                return None
+            current = user.get("current_session")
+            if session is not None:
+                start_ms = session.start_ms
+            elif session_alive(current, end_ms, presence.ttl_ms):
+                # Started through another worker, or before a restart. A legacy
+                # start time that can't be parsed counts as a zero-length session
+                start_ms = ms_of(current, "start_ms", "start_time") or end_ms
+            else:
+                return None
+            ended["duration_mins"] = max(0, (end_ms - start_ms) // 60_000)
+            
+            # Initialize study_sessions if needed
+            if "study_sessions" not in user:
+                user["study_sessions"] = []
+            
+            user["study_sessions"].append({
+                "date": today,
+                "duration_mins": ended["duration_mins"],
+                "pomodoros": pomodoros
+            })
+            add_session(user, today, ended["duration_mins"], pomodoros)
+            
+            # Clear current session (and tell other workers' registries it ended)
+            user["current_session"] = None
+            user["session_ended_ms"] = end_ms
+            return user
         
-        if username not in users:
+        user = store.update(username, end)
+        if user is None:
             return jsonify({"status": "error", "message": "User not found"}), 404
-        
-        current = users[username].get("current_session")
-        if not current:
+        if not ended:
             return jsonify({"status": "error", "message": "No active session"}), 400
+        duration_mins = ended["duration_mins"]
         
-        start_time = datetime.fromisoformat(current["start_time"].replace('Z', '+00:00'))
-        end_time = datetime.now(timezone.utc)
-        duration_mins = int((end_time - start_time).total_seconds() / 60)
-        pomodoros = data.get("pomodoros", 0)
-        
-        # Initialize study_sessions if needed
-        if "study_sessions" not in users[username]:
-            users[username]["study_sessions"] = []
-        
-        # Add session
-        today = end_time.strftime("%Y-%m-%d")
-        users[username]["study_sessions"].append({
-            "date": today,
-            "duration_mins": duration_mins,
-            "pomodoros": pomodoros
-        })
-        
-        # Clear current session
-        users[username]["current_session"] = None
-        save_users(users)
+        study_index.load(username, user)
+        streaks.record_day(username, today, user["study_daily"][today]["minutes"])
+        streak = streaks.status(username)
+        push_streak_color(username, streak["color"])
+        publish_streak(username, streak)
         
         return jsonify({
             "status": "success",
             "duration_mins": duration_mins,
-            "pomodoros": pomodoros
+            "pomodoros": pomodoros,
+            "streak": streak
         }), 200
         
     except Exception as e:
@@ -331,47 +823,113 @@ def end_session(username):
 
 @app.route("/api/study-history/<username>", methods=["GET"])
 def get_study_history(username):
-    """Get last 7 days of study data for dot graph + streak."""
-    from datetime import datetime, timezone, timedelta
+    """
+    Get recent study data for dot graph / heatmap + streak.
+
+    Query params:
+        days: Number of days to return (default 7, max 366)
+    """
     try:
-        users = load_users()
-        if username not in users:
+        if not load_study(username):
             return jsonify({"status": "error", "message": "User not found"}), 404
         
-        sessions = users[username].get("study_sessions", [])
-        today = datetime.now(timezone.utc).date()
-        
-        # Build 7-day history
-        history = []
-        streak = 0
-        for i in range(7):
-            day = today - timedelta(days=6-i)
-            day_str = day.strftime("%Y-%m-%d")
-            day_sessions = [s for s in sessions if s.get("date") == day_str]
-            total_mins = sum(s.get("duration_mins", 0) for s in day_sessions)
-            history.append({
-                "date": day_str,
-                "day_name": day.strftime("%a"),
-                "duration_mins": total_mins,
-                "dots": min(8, total_mins // 15)  # Each dot = 15 mins, max 8
-            })
-        
-        # Calculate streak (consecutive days with >0 study)
-        for i in range(len(history) - 1, -1, -1):
-            if history[i]["duration_mins"] > 0:
-                streak += 1
-            else:
-                break
+        # The history window moves with the study day, so that's part of the version
+        etag = version_tag("study", study_index.version(username), study_index.today())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        days = max(1, min(request.args.get("days", 7, type=int), 366))
         
-        return jsonify({
+        return tag(jsonify({
             "status": "success",
-            "history": history,
-            "streak": streak
-        }), 200
+            "history": study_index.history(username, days),
+            "streak": study_index.streak(username)
+        }), etag, "private, no-cache"), 200
         
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route("/api/presence", methods=["GET"])
+def get_presence():
+    """
+    How many people are studying right now: {"studying", "exams": {exam: n}}.
+    With several worker processes, each counts the sessions it has heard from.
+    """
+    response = jsonify({"status": "success", **presence.counts()})
+    response.add_etag()
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+@app.route("/api/stream", methods=["GET"])
+def stream():
+    """
+    Server-sent events, each starting with a snapshot:
+        leaderboard: {"changes": [rows with "rank"], "size"} (top 10, changed rows only)
+        bulb: current bulb color {"r", "g", "b"} (plus "group" for per-user bulbs)
+        streak: with ?username=, that user's streak status after each study session
+    Slow clients are disconnected rather than buffered without limit; EventSource reconnects.
+    """
+    username = request.args.get("username")
+    topics = ["leaderboard", "bulb"] + ([f"user:{username}"] if username else [])
+    sub = hub.subscribe(topics)
+    if sub is None:
+        return jsonify({"status": "error", "message": "Too many open streams"}), 503, {"Retry-After": "5"}
+
+    # Bring the shared "last pushed" rows up to date, then snapshot them: any
+    # delta queued after this point applies cleanly on top of the snapshot
+    publish_leaderboard_changes()
+    with _streamed_top_lock:
+        top = list(_streamed_top)
+    sub.send("leaderboard", {"changes": leaderboard_rows(top), "size": len(top)})
+    if bulb_color is not None:
+        sub.send("bulb", bulb_color)
+    if username and (username in streaks if USER_CACHE else load_study(username)):
+        sub.send("streak", streak_event(username))
+
+    response = Response(sub.stream(config.get("stream_heartbeat_seconds", HEARTBEAT_SECONDS)),
+                        mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # keep proxies from buffering the stream
+    response.call_on_close(sub.close)
+    return response
+
+@app.route("/api/streak/<username>", methods=["GET"])
+def get_streak(username):
+    """Habit streak: consecutive days at or above success_threshold_minutes, color tier, days to habit."""
+    if not load_study(username):
+        return jsonify({"status": "error", "message": "User not found"}), 404
+    return jsonify({"status": "success", **streaks.status(username)}), 200
+
+# --- Metrics ---
+# Queue depths and pool state, read when /metrics is scraped
+metrics.gauge("bulb_queue_depth", "Bulb commands waiting for the bulb worker",
+              callback=lambda: bulb.queue_depth() if bulb else None)
+metrics.gauge("bulbs", "Configured bulbs by connection state", ("state",), callback=lambda: {
+    ("healthy",): sum(b.healthy for b in bulb.controller.devices.values()),
+    ("unhealthy",): sum(not b.healthy for b in bulb.controller.devices.values()),
+} if bulb else None)
+metrics.gauge("user_journal_entries", "Journaled user writes not yet fsynced / compacted", ("state",),
+              callback=store.journal_depth if USER_CACHE else lambda: None)
+metrics.gauge("user_cache_users", "Users held in memory, by tier (cold = compressed)", ("tier",),
+              callback=lambda: {(tier,): n for tier, (n, _) in store.tiers().items()} if USER_CACHE else None)
+metrics.gauge("user_cache_bytes", "Bytes of serialized user records held in memory, by tier", ("tier",),
+              callback=lambda: {(tier,): size for tier, (_, size) in store.tiers().items()} if USER_CACHE else None)
+metrics.gauge("leaderboard_snapshot_age_seconds", "Time since the shared leaderboard publisher last checked in",
+              callback=lambda: (now_ms() - shared_leaderboard.heartbeat_ms()) / 1000
+              if shared_leaderboard is not None and shared_leaderboard.heartbeat_ms() else None)
+metrics.gauge("study_sessions_live", "Study sessions heartbeating within session_ttl_seconds",
+              callback=presence.count)
+metrics.gauge("event_hub_clients", "Connected /api/stream clients", callback=lambda: len(hub))
+metrics.gauge("event_hub_pending_events", "Events waiting for the dispatcher", callback=hub.pending)
+metrics.gauge("event_hub_dropped_clients", "Stream clients dropped for falling behind",
+              callback=lambda: hub.dropped_total)
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus text exposition of every registered metric."""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
 def main():
     print(f"\n╔═══════════════════════════════════════════════════════════╗")
     print(f"║           🎓 EXAM SCORE BULB - WEB SERVER                 ║")
@@ -379,6 +937,7 @@ def main():
     print(f"║  Open: http://localhost:{PORT}                             ║")
     print(f"╚═══════════════════════════════════════════════════════════╝\n")
     
+    reload_on_sighup()
     app.run(host="0.0.0.0", port=PORT, debug=False)
 
 if __name__ == "__main__":
@@ -0,0 +1,38 @@
+"""
+Sharding
+Stable hashing of usernames, shared by the sharded user store and the
+sharded leaderboard.
+
+Python's built-in hash() of a str is salted per process, so it can't decide
+where a user lives on disk (or which fallback name they get). stable_hash()
+is the same everywhere, always. shard_of() uses jump consistent hashing:
+going from N to M shards moves only the users whose shard must change
+(about |M - N| / max(M, N) of them), and existing shards keep their numbers.
+"""
+
+import hashlib
+
+_JUMP_MULTIPLIER = 2862933555777941757
+_MASK64 = (1 << 64) - 1
+
+
+def stable_hash(key: str) -> int:
+    """64-bit hash of a string, identical across processes and restarts."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach): a bucket in [0, buckets)."""
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * _JUMP_MULTIPLIER + 1) & _MASK64
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def shard_of(username: str, shards: int) -> int:
+    """The shard a user belongs to when there are `shards` shards."""
+    if shards <= 1:
+        return 0
+    return jump_hash(stable_hash(username), shards)
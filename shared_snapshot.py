@@ -0,0 +1,362 @@
+"""
+Shared Snapshots
+One process per host publishes a read-only snapshot (e.g. the leaderboard
+tables) into a memory-mapped file; every worker process maps the same file
+and reads it without locks or copies of its own.
+
+The file lives on /dev/shm when the host has it (RAM-backed, shared page
+cache), so there is one copy per host whatever the number of workers.
+
+Layout (little-endian):
+    0   magic "YSNP"
+    4   format u32
+    8   seq u64          seqlock: odd while a write is in progress
+    16  length u64       payload bytes
+    24  published_ms u64
+    32  heartbeat_ms u64 last time the writer checked for changes
+    40  (reserved up to HEADER_SIZE)
+    64  payload          serialized JSON
+
+The writer bumps seq to odd, writes the payload and header, then bumps seq
+to even. A reader copies the payload between two reads of seq and retries
+if they differ or are odd, so it never waits on the writer and never sees a
+torn snapshot. Readers parse a payload once per seq; until seq moves, a read
+is one 8-byte load.
+
+The file starts at DEFAULT_CAPACITY and the writer doubles it (up to
+MAX_CAPACITY) when a payload doesn't fit; a reader whose map is too short
+for the published length maps the file again. A payload over MAX_CAPACITY
+fails to publish, which leaves the heartbeat (and so the snapshot age on
+/metrics) to go stale.
+
+Which process writes is decided by an exclusive flock on "<path>.lock":
+whoever holds it publishes, and another worker takes over within one
+interval if that process exits.
+
+EventFeed carries changes the other way: any process appends small JSON
+events to "<path>.feed" and the publisher drains them, so it can keep what
+it publishes up to date without reloading it from storage.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import serializer
+from sharding import stable_hash
+from timestamps import now_ms
+
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): every process publishes its own snapshot
+    fcntl = None
+
+MAGIC = b"YSNP"
+FORMAT = 1
+HEADER = struct.Struct("<4sIQQQ")
+SEQ_OFFSET = 8
+HEARTBEAT_OFFSET = 32
+HEADER_SIZE = 64
+DEFAULT_CAPACITY = 1 << 20
+MAX_CAPACITY = 64 << 20
+READ_RETRIES = 100
+REOPEN_INTERVAL_SECONDS = 1.0
+DEFAULT_INTERVAL_SECONDS = 0.5
+
+
+def default_path(name: str, data_dir) -> Path:
+    """
+    A host-wide path for `name`, unique to one app data directory (so two
+    checkouts on a host don't share snapshots): /dev/shm if present, else data_dir.
+    """
+    tag = f"{stable_hash(str(Path(data_dir).resolve())) % 16 ** 8:08x}"
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm / f"yeet-{tag}-{name}.snapshot"
+    return Path(data_dir) / f"{name}.snapshot"
+
+
+class Snapshot:
+    """One published payload, parsed."""
+
+    __slots__ = ("seq", "published_ms", "data")
+
+    def __init__(self, seq: int, published_ms: int, data):
+        self.seq = seq
+        self.published_ms = published_ms
+        self.data = data
+
+
+class SnapshotWriter:
+    """Writes snapshots into the shared file. Only the lock holder may use it."""
+
+    def __init__(self, path, capacity: int = DEFAULT_CAPACITY):
+        self.path = Path(path)
+        self.capacity = capacity
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            size = HEADER_SIZE + capacity
+            if os.fstat(fd).st_size < size:
+                # Sparse: pages are only allocated as the payload touches them
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+        self.capacity = len(self._mm) - HEADER_SIZE
+        magic, fmt, seq, _, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or fmt != FORMAT:
+            HEADER.pack_into(self._mm, 0, MAGIC, FORMAT, 0, 0, 0)
+            seq = 0
+        # A previous writer may have died mid-write; continue from the next even seq
+        self._seq = seq + (seq & 1)
+
+    def _grow(self, size: int):
+        """Double the file (and our map) until a payload of `size` bytes fits."""
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        if capacity > MAX_CAPACITY:
+            raise ValueError(f"snapshot of {size} bytes exceeds the maximum capacity {MAX_CAPACITY}")
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            # Readers keep their shorter maps until they see a longer payload
+            if os.fstat(fd).st_size < HEADER_SIZE + capacity:
+                os.ftruncate(fd, HEADER_SIZE + capacity)
+            mm = mmap.mmap(fd, HEADER_SIZE + capacity)
+        finally:
+            os.close(fd)
+        self._mm.close()
+        self._mm = mm
+        self.capacity = capacity
+
+    def publish(self, payload: bytes, published_ms: int = None) -> int:
+        """
+        Replace the snapshot, growing the file if needed. Returns the new seq.
+
+        Raises:
+            ValueError: payload larger than MAX_CAPACITY
+        """
+        if len(payload) > self.capacity:
+            self._grow(len(payload))
+        published_ms = now_ms() if published_ms is None else published_ms
+        mm = self._mm
+        struct.pack_into("<Q", mm, SEQ_OFFSET, self._seq + 1)
+        mm[HEADER_SIZE:HEADER_SIZE + len(payload)] = payload
+        HEADER.pack_into(mm, 0, MAGIC, FORMAT, self._seq + 1, len(payload), published_ms)
+        self._seq += 2
+        struct.pack_into("<Q", mm, SEQ_OFFSET, self._seq)
+        self.heartbeat(published_ms)
+        return self._seq
+
+    def heartbeat(self, ms: int = None):
+        """Record that the writer is alive, without changing the snapshot."""
+        struct.pack_into("<Q", self._mm, HEARTBEAT_OFFSET, now_ms() if ms is None else ms)
+
+    def close(self):
+        self._mm.close()
+
+
+class SnapshotReader:
+    """Lock-free reader of the shared file; see the module docstring."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._mm = None
+        self._next_open = 0.0
+        self._current = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> bool:
+        if self._mm is not None:
+            return True
+        now = time.monotonic()
+        if now < self._next_open:
+            return False
+        self._next_open = now + REOPEN_INTERVAL_SECONDS
+        try:
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < HEADER_SIZE:
+                    return False
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return False
+        return True
+
+    def current(self):
+        """The latest Snapshot, or None if nothing has been published yet."""
+        if not self._open():
+            return None
+        mm = self._mm
+        current = self._current
+        seq = struct.unpack_from("<Q", mm, SEQ_OFFSET)[0]
+        if current is not None and current.seq == seq:
+            return current
+
+        for _ in range(READ_RETRIES):
+            magic, fmt, seq, length, published_ms = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC or fmt != FORMAT or seq == 0:
+                return current
+            if seq & 1:
+                # Mid-write; the writer finishes in microseconds
+                time.sleep(0)
+                continue
+            payload = mm[HEADER_SIZE:HEADER_SIZE + length]
+            if struct.unpack_from("<Q", mm, SEQ_OFFSET)[0] != seq:
+                continue
+            if len(payload) < length:
+                # Grown by a writer with a larger capacity since we mapped it.
+                # Other threads may still be reading the old map, so just drop it
+                self._mm = None
+                self._next_open = 0.0
+                return self.current() if self._open() else current
+            with self._lock:
+                if self._current is None or self._current.seq != seq:
+                    self._current = Snapshot(seq, published_ms, serializer.loads(payload))
+                return self._current
+        # The writer kept overtaking us: serve the previous snapshot this time
+        return current
+
+    def heartbeat_ms(self):
+        """When the writer last checked in (epoch ms), or None."""
+        if not self._open():
+            return None
+        return struct.unpack_from("<Q", self._mm, HEARTBEAT_OFFSET)[0] or None
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+class SnapshotPublisher:
+    """
+    Background thread that competes for the writer lock and, while holding
+    it, publishes build() every `interval` seconds if the result changed.
+    """
+
+    def __init__(self, path, build, interval: float = DEFAULT_INTERVAL_SECONDS,
+                 capacity: int = DEFAULT_CAPACITY):
+        """
+        Args:
+            path: Shared snapshot file (see default_path())
+            build: Returns the snapshot data (JSON-serializable); called on this thread only
+            interval: Seconds between builds while publishing, and between lock attempts otherwise
+        """
+        self.path = Path(path)
+        self.build = build
+        self.interval = interval
+        self.capacity = capacity
+        self.leader = False
+        self._writer = None
+        self._lock_file = None
+        self._last = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="snapshot-publisher", daemon=True)
+        self._thread.start()
+
+    def _acquire(self) -> bool:
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._lock_file = open(self.path.with_name(self.path.name + ".lock"), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def publish_now(self):
+        payload = serializer.dumps(self.build())
+        if payload != self._last:
+            self._writer.publish(payload)
+            self._last = payload
+        else:
+            self._writer.heartbeat()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.leader and self._acquire():
+                self.leader = True
+                self._writer = SnapshotWriter(self.path, self.capacity)
+                print(f"📤 Publishing shared snapshots to {self.path}")
+            if self.leader:
+                try:
+                    self.publish_now()
+                except Exception as e:
+                    print(f"⚠️ Snapshot publish failed: {e}")
+            self._stop.wait(self.interval)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self.leader = False
+        if self._writer is not None:
+            self._writer.close()
+        if self._lock_file is not None:
+            # Closing releases the flock, letting another worker take over
+            self._lock_file.close()
+
+
+class EventFeed:
+    """
+    Host-wide queue of small JSON events. Writers hold a shared flock on the
+    file and append one line per event with a single O_APPEND write, so they
+    don't wait on each other; drain() and reset() take the flock exclusively.
+    Needs flock (see `supported`).
+    """
+
+    supported = fcntl is not None
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+    @contextmanager
+    def writing(self):
+        """
+        Hold the shared lock on this thread until the block ends. Wrap a write
+        to storage and the append() of its events in one, so reset() sees the
+        write either in storage or in the feed. Nests.
+        """
+        if getattr(self._local, "file", None) is not None:
+            yield
+            return
+        with open(self.path, "ab", buffering=0) as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            self._local.file = f
+            try:
+                yield
+            finally:
+                self._local.file = None
+
+    def append(self, event: dict):
+        f = getattr(self._local, "file", None)
+        if f is None:
+            with self.writing():
+                self.append(event)
+            return
+        f.write(serializer.dumps(event) + b"\n")
+
+    def drain(self) -> list:
+        """Remove and return every event appended so far, oldest first."""
+        with open(self.path, "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            data = f.read()
+            f.truncate(0)
+        return [serializer.loads(line) for line in data.splitlines()]
+
+    def reset(self, reload):
+        """Call reload() (e.g. a rebuild from storage) with writers held off, then drop every event."""
+        with open(self.path, "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            reload()
+            f.truncate(0)
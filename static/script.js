@@ -24,6 +24,7 @@ const loginError = document.getElementById('login-error');
 const welcomeBanner = document.getElementById('welcome-banner');
 const welcomeText = document.getElementById('welcome-text');
 const logoutBtn = document.getElementById('logoutBtn');
+const presenceText = document.getElementById('presence-text');
 
 // Onboarding Elements
 const onboardingModal = document.getElementById('onboarding-modal');
@@ -77,6 +78,7 @@ let timerState = 'IDLE'; // IDLE, FOCUS, BREAK, PAUSED
 let timeLeft = 25 * 60; // seconds
 let timerInterval = null;
 let pomodorosToday = 0;
+let sessionHeartbeat = null;
 const FOCUS_TIME = 25 * 60;
 const BREAK_TIME = 5 * 60;
 const LONG_BREAK_TIME = 15 * 60;
@@ -163,6 +165,22 @@ const POMO_COMMENTS = {
     4: "4 POMOS?! certified grinder 💪"
 };
 
+// --- Startup Retry ---
+// The server answers 503 with Retry-After while it loads users after a
+// restart; wait it out instead of surfacing an error.
+const WARM_UP_RETRIES = 10;
+
+async function fetchWhenReady(url, options) {
+    for (let attempt = 0; ; attempt++) {
+        const response = await fetch(url, options);
+        const retryAfter = response.headers.get('Retry-After');
+        if (response.status !== 503 || !retryAfter || attempt >= WARM_UP_RETRIES) {
+            return response;
+        }
+        await new Promise(resolve => setTimeout(resolve, Number(retryAfter) * 1000));
+    }
+}
+
 // --- Auth System ---
 const WELCOME_MESSAGES = {
     0: "Back already? Obsessed much? 😏",
@@ -255,13 +273,93 @@ function showMainApp(data) {
         renderHistoryDots(lastScores);
     }
 
-    // Load leaderboard
+    // Leaderboard and streak arrive over the live stream
+    openLiveStream();
+
+    fetchPresence();
+    clearInterval(presenceTimer);
+    presenceTimer = setInterval(fetchPresence, 60 * 1000);
+}
+
+// --- Presence ("studying now") ---
+let presenceTimer = null;
+
+async function fetchPresence() {
+    try {
+        const response = await fetchWhenReady('/api/presence');
+        const data = await response.json();
+
+        if (data.status === 'success' && presenceText) {
+            presenceText.textContent = data.studying > 0 ? `🔥 ${data.studying} studying now` : '';
+        }
+    } catch (e) {
+        console.error('Presence fetch failed', e);
+    }
+}
+
+// --- Live Updates (server-sent events) ---
+// The server caps open streams (each holds one of its threads). When it turns
+// this one away, poll the leaderboard and try the stream again later
+const LEADERBOARD_POLL_MS = 30 * 1000;
+const STREAM_RETRY_MS = 2 * 60 * 1000;
+let liveStream = null;
+let leaderboardRows = [];
+let leaderboardPoll = null;
+let streamRetry = null;
+
+function pollLeaderboard() {
     fetchLeaderboard();
+    clearInterval(leaderboardPoll);
+    leaderboardPoll = setInterval(fetchLeaderboard, LEADERBOARD_POLL_MS);
+}
+
+function openLiveStream() {
+    closeLiveStream();
+    if (!window.EventSource) {
+        pollLeaderboard();
+        return;
+    }
+    liveStream = new EventSource(`/api/stream?username=${encodeURIComponent(currentUsername)}`);
+
+    // A dropped stream reconnects by itself; a refused one (503) is CLOSED for good
+    liveStream.addEventListener('error', () => {
+        if (liveStream && liveStream.readyState === EventSource.CLOSED) {
+            closeLiveStream();
+            pollLeaderboard();
+            // Jittered, so refused clients don't all come back at once
+            streamRetry = setTimeout(openLiveStream, STREAM_RETRY_MS * (1 + Math.random()));
+        }
+    });
+
+    // Only changed rows are sent; the first message after (re)connecting has them all
+    liveStream.addEventListener('leaderboard', (e) => {
+        const data = JSON.parse(e.data);
+        data.changes.forEach(row => { leaderboardRows[row.rank - 1] = row; });
+        leaderboardRows.length = data.size;
+        renderLeaderboard(leaderboardRows);
+    });
+
+    liveStream.addEventListener('streak', (e) => {
+        const data = JSON.parse(e.data);
+        if (statStreak && data.study_streak !== null) statStreak.textContent = data.study_streak;
+    });
+}
+
+function closeLiveStream() {
+    if (liveStream) {
+        liveStream.close();
+        liveStream = null;
+    }
+    clearInterval(leaderboardPoll);
+    clearTimeout(streamRetry);
+    leaderboardPoll = null;
+    streamRetry = null;
+    leaderboardRows = [];
 }
 
 async function handleOnboarding() {
     try {
-        const response = await fetch(`/api/onboarding/${currentUsername}`, {
+        const response = await fetchWhenReady(`/api/onboarding/${currentUsername}`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
@@ -286,7 +384,7 @@ async function handleOnboarding() {
 
 async function fetchLeaderboard() {
     try {
-        const response = await fetch('/api/leaderboard');
+        const response = await fetchWhenReady('/api/leaderboard');
         const data = await response.json();
 
         if (data.status === 'success') {
@@ -315,6 +413,8 @@ function handleLogout() {
     localStorage.removeItem('bulb_username');
     currentUsername = null;
     currentUserData = null;
+    closeLiveStream();
+    clearInterval(presenceTimer);
     loginModal.style.display = 'flex';
     welcomeBanner.style.display = 'none';
     if (leaderboardPanel) leaderboardPanel.style.display = 'none';
@@ -555,7 +655,7 @@ async function recordScoreAndContext(score, total, exam, percentage) {
     if (!currentUsername) return;
 
     try {
-        const response = await fetch(`/api/record-score/${currentUsername}`, {
+        const response = await fetchWhenReady(`/api/record-score/${currentUsername}`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
@@ -753,7 +853,7 @@ async function loadDashboard() {
 
     try {
         // Load study history
-        const studyRes = await fetch(`/api/study-history/${currentUsername}`);
+        const studyRes = await fetchWhenReady(`/api/study-history/${currentUsername}`);
         const studyData = await studyRes.json();
 
         if (studyData.status === 'success') {
@@ -941,7 +1041,7 @@ function startTimer() {
         timeLeft = FOCUS_TIME;
         playStartSound(); // 🔊 Sound on start
         // Start session on backend
-        fetch(`/api/session/start/${currentUsername}`, { method: 'POST' });
+        startSession();
     } else if (timerState === 'PAUSED') {
         timerState = 'FOCUS';
         playResumeSound(); // 🔊 Sound on resume
@@ -1011,6 +1111,28 @@ function startTimer() {
     }, 1000);
 }
 
+// The server expires sessions that stop heartbeating (e.g. a closed tab)
+async function startSession() {
+    try {
+        const response = await fetchWhenReady(`/api/session/start/${currentUsername}`, { method: 'POST' });
+        const data = await response.json();
+        clearInterval(sessionHeartbeat);
+        sessionHeartbeat = setInterval(heartbeatSession, (data.heartbeat_seconds || 60) * 1000);
+    } catch (e) {
+        console.error('Session start failed', e);
+    }
+}
+
+async function heartbeatSession() {
+    try {
+        const response = await fetchWhenReady(`/api/session/heartbeat/${currentUsername}`, { method: 'POST' });
+        // Expired while the tab was asleep: count from now
+        if (response.status === 400) startSession();
+    } catch (e) {
+        console.error('Session heartbeat failed', e);
+    }
+}
+
 function pauseTimer() {
     clearInterval(timerInterval);
     timerState = 'PAUSED';
@@ -1022,9 +1144,10 @@ function pauseTimer() {
 
 function stopTimer() {
     clearInterval(timerInterval);
+    clearInterval(sessionHeartbeat);
 
     // End session on backend
-    fetch(`/api/session/end/${currentUsername}`, {
+    fetchWhenReady(`/api/session/end/${currentUsername}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ pomodoros: pomodorosToday })
@@ -1076,7 +1199,7 @@ async function loadStudyHistory() {
     if (!currentUsername) return;
 
     try {
-        const response = await fetch(`/api/study-history/${currentUsername}`);
+        const response = await fetchWhenReady(`/api/study-history/${currentUsername}`);
         const data = await response.json();
 
         if (data.status === 'success') {
@@ -0,0 +1,699 @@
+"""
+User Storage
+Pluggable backends for user records, keyed by username.
+Every backend can read or write a single user without touching the rest.
+
+Read-modify-write goes through update(username, mutate), which is atomic per
+user: concurrent updates to different users don't wait on each other, and
+concurrent updates to the same user are applied one after the other instead
+of overwriting each other. The SQLite backend does this optimistically with
+a per-row version, so it also holds across processes.
+
+ShardedUserStore splits users over several files of either backend, so no
+single file holds (or rewrites) the whole user base.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import metrics
+import serializer
+from sharding import shard_of
+
+DATA_DIR = Path(__file__).parent / "data"
+USERS_JSON_PATH = DATA_DIR / "users.json"
+USERS_DB_PATH = DATA_DIR / "users.db"
+SHARD_DIR = DATA_DIR / "shards"
+MAX_UPDATE_RETRIES = 50
+MOVE_BATCH_SIZE = 500
+
+BACKEND_SECONDS = metrics.histogram(
+    "user_backend_seconds", "User storage backend reads and writes", ("backend", "op"))
+UPDATE_CONFLICTS = metrics.counter(
+    "user_update_conflicts_total", "Optimistic updates retried because the row changed")
+
+
+class ConflictError(RuntimeError):
+    """A user kept changing underneath an update, even after retrying."""
+
+
+class JSONUserStore:
+    """Original single-file backend: the whole user map lives in one JSON file."""
+
+    def __init__(self, path=USERS_JSON_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        if not self.path.exists():
+            return {}
+        with BACKEND_SECONDS.time("json", "load"):
+            return serializer.load_file(self.path)
+
+    def _write(self, users: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with BACKEND_SECONDS.time("json", "save"):
+            serializer.dump_file(users, tmp_path)
+            os.replace(tmp_path, self.path)
+
+    def get(self, username: str):
+        return self._read().get(username)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._read()
+
+    def put(self, username: str, record: dict):
+        with self._lock:
+            users = self._read()
+            users[username] = record
+            self._write(users)
+
+    def add_many(self, records: dict) -> int:
+        """Store the users that don't exist yet, leaving the others. Returns how many were stored."""
+        with self._lock:
+            users = self._read()
+            added = {u: r for u, r in records.items() if u not in users}
+            if added:
+                users.update(added)
+                self._write(users)
+            return len(added)
+
+    def delete(self, username: str):
+        with self._lock:
+            users = self._read()
+            if users.pop(username, None) is not None:
+                self._write(users)
+
+    def put_many(self, records: dict):
+        """Apply several writes in one file rewrite. A None record deletes the user."""
+        with self._lock:
+            users = self._read()
+            for username, record in records.items():
+                if record is None:
+                    users.pop(username, None)
+                else:
+                    users[username] = record
+            self._write(users)
+
+    def update(self, username: str, mutate):
+        """
+        Atomic read-modify-write of one user (within this process).
+
+        Args:
+            mutate: Called with a private copy of the record (None if the user
+                doesn't exist); returns the record to store, or None to leave it
+
+        Returns:
+            The record as stored afterwards (None if there is none)
+        """
+        return self.update_many([username], lambda _, record: mutate(record))[username]
+
+    def update_many(self, usernames, mutate) -> dict:
+        """update() for several users in one file rewrite; mutate(username, record)."""
+        with self._lock:
+            users = self._read()
+            result = {}
+            changed = False
+            for username in usernames:
+                record = mutate(username, users.get(username))
+                if record is not None:
+                    users[username] = record
+                    changed = True
+                result[username] = users.get(username)
+            if changed:
+                self._write(users)
+            return result
+
+    def items(self):
+        return iter(self._read().items())
+
+    def all(self) -> dict:
+        return self._read()
+
+    def replace_all(self, users: dict):
+        with self._lock:
+            self._write(users)
+
+    def count(self) -> int:
+        return len(self._read())
+
+    def close(self):
+        pass
+
+
+class SQLiteUserStore:
+    """
+    SQLite backend in WAL mode.
+    One row per user, so writes cost O(1) in the number of users and
+    concurrent writers are serialized by SQLite instead of overwriting each other.
+    Each row carries a version that every write bumps; update() only commits
+    if the version is still the one it read, and retries otherwise.
+    """
+
+    def __init__(self, path=USERS_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            " username TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " version INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        if "version" not in columns:
+            # Databases created before optimistic concurrency
+            conn.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not thread-safe)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, username: str):
+        with BACKEND_SECONDS.time("sqlite", "get"):
+            row = self._conn().execute(
+                "SELECT data FROM users WHERE username = ?", (username,)
+            ).fetchone()
+        return serializer.loads(row[0]) if row else None
+
+    def __contains__(self, username: str) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM users WHERE username = ?", (username,)
+        ).fetchone() is not None
+
+    def put(self, username: str, record: dict):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO users (username, data) VALUES (?, ?)"
+                " ON CONFLICT(username) DO UPDATE SET data = excluded.data, version = version + 1",
+                (username, serializer.dumps_str(record)),
+            )
+
+    def add_many(self, records: dict) -> int:
+        """Store the users that don't exist yet, leaving the others. Returns how many were stored."""
+        conn = self._conn()
+        with conn:
+            return sum(self._write_if_version(conn, u, r, None) for u, r in records.items())
+
+    def delete(self, username: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM users WHERE username = ?", (username,))
+
+    def put_many(self, records: dict):
+        """Apply several writes in one transaction. A None record deletes the user."""
+        conn = self._conn()
+        with BACKEND_SECONDS.time("sqlite", "put_many"), conn:
+            conn.executemany(
+                "INSERT INTO users (username, data) VALUES (?, ?)"
+                " ON CONFLICT(username) DO UPDATE SET data = excluded.data, version = version + 1",
+                ((u, serializer.dumps_str(r)) for u, r in records.items() if r is not None),
+            )
+            conn.executemany(
+                "DELETE FROM users WHERE username = ?",
+                ((u,) for u, r in records.items() if r is None),
+            )
+
+    def get_versioned(self, username: str) -> tuple:
+        """(record, version), or (None, None) if the user doesn't exist."""
+        row = self._conn().execute(
+            "SELECT data, version FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return (serializer.loads(row[0]), row[1]) if row else (None, None)
+
+    def _write_if_version(self, conn, username: str, record: dict, version) -> bool:
+        """Write only if the row is still at `version` (None: only if it doesn't exist)."""
+        if version is None:
+            cursor = conn.execute(
+                "INSERT INTO users (username, data) VALUES (?, ?) ON CONFLICT(username) DO NOTHING",
+                (username, serializer.dumps_str(record)),
+            )
+        else:
+            cursor = conn.execute(
+                "UPDATE users SET data = ?, version = version + 1 WHERE username = ? AND version = ?",
+                (serializer.dumps_str(record), username, version),
+            )
+        return cursor.rowcount == 1
+
+    def update(self, username: str, mutate):
+        """
+        Atomic read-modify-write of one user, safe across threads and processes.
+        mutate() runs outside any lock and is retried if another writer got there
+        first, so it must not have side effects.
+
+        Args:
+            mutate: Called with a private copy of the record (None if the user
+                doesn't exist); returns the record to store, or None to leave it
+
+        Returns:
+            The record as stored afterwards (None if there is none)
+        """
+        return self.update_many([username], lambda _, record: mutate(record))[username]
+
+    def update_many(self, usernames, mutate) -> dict:
+        """update() for several users, committing all non-conflicting rows together."""
+        pending = list(dict.fromkeys(usernames))
+        result = {}
+        conn = self._conn()
+        for _ in range(MAX_UPDATE_RETRIES):
+            reads = {u: self.get_versioned(u) for u in pending}
+            writes = {}
+            for username, (record, version) in reads.items():
+                new = mutate(username, record)
+                if new is None:
+                    result[username] = record
+                else:
+                    writes[username] = (new, version)
+            conflicts = []
+            with BACKEND_SECONDS.time("sqlite", "update"), conn:
+                for username, (new, version) in writes.items():
+                    if self._write_if_version(conn, username, new, version):
+                        result[username] = new
+                    else:
+                        conflicts.append(username)
+            if not conflicts:
+                return result
+            UPDATE_CONFLICTS.inc(amount=len(conflicts))
+            pending = conflicts
+        raise ConflictError(f"Gave up updating {', '.join(pending[:5])} after {MAX_UPDATE_RETRIES} conflicts")
+
+    def items(self):
+        """Stream (username, record) pairs without materializing the whole map."""
+        cursor = self._conn().execute("SELECT username, data FROM users")
+        for username, data in cursor:
+            yield username, serializer.loads(data)
+
+    def all(self) -> dict:
+        return dict(self.items())
+
+    def replace_all(self, users: dict):
+        conn = self._conn()
+        with conn:
+            # Start above every old version so no in-flight update() can match
+            version = conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM users").fetchone()[0]
+            conn.execute("DELETE FROM users")
+            conn.executemany(
+                "INSERT INTO users (username, data, version) VALUES (?, ?, ?)",
+                ((u, serializer.dumps_str(r), version) for u, r in users.items()),
+            )
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def get_meta(self, key: str):
+        row = self._conn().execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class ShardedUserStore:
+    """
+    Users partitioned across N backend stores (one file each) by shard_of(username).
+    A single user is read and written in its own shard only; whole-map
+    operations visit every shard.
+
+    The shard count is kept in a shards.json manifest next to the shard files.
+    reshard() changes it online: while it runs, a user's home is its shard
+    under the new count, and users not moved yet are still found in their shard
+    under the old count. Any write to such a user moves it first.
+    """
+
+    def __init__(self, directory=SHARD_DIR, shards: int = 1, backend: str = "sqlite",
+                 legacy=None):
+        """
+        Args:
+            directory: Holds the manifest and one users-NNN file per shard
+            shards: Shard count when creating a new set (an existing manifest wins)
+            backend: "sqlite" or "json", per shard
+            legacy: Unsharded store to import from when creating a new set
+        """
+        if backend not in ("sqlite", "json"):
+            raise ValueError(f"Unknown storage backend: {backend}")
+        self.directory = Path(directory)
+        self.backend = backend
+        self.manifest_path = self.directory / "shards.json"
+        self._reshard_lock = threading.Lock()
+        self._stores = []
+        # Writes in flight per layout epoch, so a layout change can wait for
+        # writes that were routed by the previous one
+        self._writers = threading.Condition()
+        self._epoch = 0
+        self._inflight = {}
+
+        if self.manifest_path.exists():
+            manifest = serializer.load_file(self.manifest_path)
+            self._layout = (manifest["shards"], manifest.get("target"))
+        else:
+            self._layout = (max(1, shards), None)
+        self._open_shards(max(n for n in self._layout if n is not None))
+
+        if not self.manifest_path.exists():
+            if legacy is not None:
+                count = self._import(legacy)
+                if count:
+                    print(f"📦 Split {count} users into {self.shards} shards in {self.directory}")
+            self._write_manifest()
+
+    # --- Layout ---
+
+    @property
+    def shards(self) -> int:
+        return self._layout[0]
+
+    @property
+    def target(self):
+        """Shard count an unfinished reshard() is moving to, or None."""
+        return self._layout[1]
+
+    def _shard_path(self, index: int) -> Path:
+        return self.directory / f"users-{index:03d}.{'db' if self.backend == 'sqlite' else 'json'}"
+
+    def _open_shards(self, count: int):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        store_class = SQLiteUserStore if self.backend == "sqlite" else JSONUserStore
+        while len(self._stores) < count:
+            self._stores.append(store_class(self._shard_path(len(self._stores))))
+
+    def _write_manifest(self):
+        shards, target = self._layout
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        serializer.dump_file({"shards": shards, "target": target}, tmp_path)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _set_layout(self, shards: int, target):
+        """Switch routing, then wait out writes routed by the old layout."""
+        with self._writers:
+            previous = self._epoch
+            self._layout = (shards, target)
+            self._epoch += 1
+            self._writers.wait_for(lambda: all(epoch > previous for epoch in self._inflight))
+        self._write_manifest()
+
+    @contextmanager
+    def _writing(self):
+        with self._writers:
+            epoch = self._epoch
+            self._inflight[epoch] = self._inflight.get(epoch, 0) + 1
+        try:
+            yield
+        finally:
+            with self._writers:
+                self._inflight[epoch] -= 1
+                if not self._inflight[epoch]:
+                    del self._inflight[epoch]
+                    self._writers.notify_all()
+
+    def _route(self, username: str) -> tuple:
+        """(home shard, shard it may still be in). The same index unless resharding."""
+        shards, target = self._layout
+        if target is None:
+            home = shard_of(username, shards)
+            return home, home
+        return shard_of(username, target), shard_of(username, shards)
+
+    def _move(self, username: str):
+        """Move the user to its home shard if it is still in its old one. Caller is _writing()."""
+        home, old = self._route(username)
+        if home == old:
+            return
+        record = self._stores[old].get(username)
+        if record is not None:
+            # If a concurrent write already put it at home, that copy is newer
+            self._stores[home].add_many({username: record})
+            self._stores[old].delete(username)
+
+    def _group(self, usernames) -> dict:
+        groups = {}
+        for username in usernames:
+            groups.setdefault(self._route(username)[0], []).append(username)
+        return groups
+
+    # --- Single users ---
+
+    def get(self, username: str):
+        home, old = self._route(username)
+        record = self._stores[home].get(username)
+        if record is None and home != old:
+            # Home again last: it may have moved between the two reads
+            record = self._stores[old].get(username) or self._stores[home].get(username)
+        return record
+
+    def __contains__(self, username: str) -> bool:
+        return self.get(username) is not None
+
+    def put(self, username: str, record: dict):
+        with self._writing():
+            home, old = self._route(username)
+            self._stores[home].put(username, record)
+            if home != old:
+                self._stores[old].delete(username)
+
+    def delete(self, username: str):
+        with self._writing():
+            home, old = self._route(username)
+            self._stores[home].delete(username)
+            if home != old:
+                self._stores[old].delete(username)
+
+    def update(self, username: str, mutate):
+        """Atomic read-modify-write of one user (see the shard backend's update())."""
+        with self._writing():
+            self._move(username)
+            return self._stores[self._route(username)[0]].update(username, mutate)
+
+    # --- Batches ---
+
+    def put_many(self, records: dict):
+        """Apply several writes, one batch per shard. A None record deletes the user."""
+        with self._writing():
+            stale = {}
+            for home, usernames in self._group(records).items():
+                self._stores[home].put_many({u: records[u] for u in usernames})
+                for username in usernames:
+                    old = self._route(username)[1]
+                    if old != home:
+                        stale.setdefault(old, {})[username] = None
+            for old, deletes in stale.items():
+                self._stores[old].put_many(deletes)
+
+    def update_many(self, usernames, mutate) -> dict:
+        """update() for several users, one batch per shard."""
+        usernames = list(dict.fromkeys(usernames))
+        result = {}
+        with self._writing():
+            if self.target is not None:
+                for username in usernames:
+                    self._move(username)
+            for home, group in self._group(usernames).items():
+                result.update(self._stores[home].update_many(group, mutate))
+        return result
+
+    # --- Whole map ---
+
+    def items(self):
+        """Stream (username, record) pairs, one shard at a time."""
+        shards, target = self._layout
+        if target is None:
+            for store in self._stores[:shards]:
+                yield from store.items()
+            return
+        # Users only move from their old shard to their home shard. Visiting old
+        # shards before home shards means a user moved mid-scan is seen at least
+        # once; the ones yielded from their old shard are skipped at home.
+        order = range(len(self._stores))
+        from_old = set()
+        for index in (order if target > shards else reversed(order)):
+            for username, record in self._stores[index].items():
+                home, old = shard_of(username, target), shard_of(username, shards)
+                if index == home and username not in from_old:
+                    yield username, record
+                elif index == old and index != home:
+                    from_old.add(username)
+                    yield username, record
+
+    def all(self) -> dict:
+        return dict(self.items())
+
+    def count(self) -> int:
+        if self.target is None:
+            return sum(store.count() for store in self._stores[:self.shards])
+        return sum(1 for _ in self.items())
+
+    def replace_all(self, users: dict):
+        with self._reshard_lock, self._writing():
+            parts = [{} for _ in range(self.shards)]
+            for username, record in users.items():
+                parts[shard_of(username, self.shards)][username] = record
+            for store, part in zip(self._stores, parts):
+                store.replace_all(part)
+
+    def _import(self, legacy, batch_size: int = MOVE_BATCH_SIZE) -> int:
+        count = 0
+        batch = {}
+        for username, record in legacy.items():
+            batch[username] = record
+            if len(batch) >= batch_size:
+                self.put_many(batch)
+                count += len(batch)
+                batch = {}
+        if batch:
+            self.put_many(batch)
+            count += len(batch)
+        return count
+
+    # --- Resharding ---
+
+    def reshard(self, shards: int, batch_size: int = MOVE_BATCH_SIZE) -> int:
+        """
+        Change the shard count, moving users while reads and writes continue.
+        An interrupted reshard is finished first (the manifest records it).
+        Shards left empty by shrinking keep their (empty) files.
+
+        Returns:
+            Number of users moved
+        """
+        if shards < 1:
+            raise ValueError(f"shard count must be at least 1, got {shards}")
+        moved = 0
+        with self._reshard_lock:
+            if self.target is not None:
+                moved += self._reshard_to(self.target, batch_size)
+            if shards != self.shards:
+                moved += self._reshard_to(shards, batch_size)
+        return moved
+
+    def _reshard_to(self, target: int, batch_size: int) -> int:
+        shards = self.shards
+        self._open_shards(max(shards, target))
+        self._set_layout(shards, target)
+
+        # From here on writers move a user before touching it, so a leaving
+        # user's row in its old shard only ever gets deleted, never changed
+        moved = 0
+        for index in range(shards):
+            old = self._stores[index]
+            leaving = [(u, r) for u, r in old.items() if shard_of(u, target) != index]
+            for start in range(0, len(leaving), batch_size):
+                batch = dict(leaving[start:start + batch_size])
+                for home, usernames in self._group(batch).items():
+                    # Users a writer already moved (and maybe changed) are kept as they are
+                    self._stores[home].add_many({u: batch[u] for u in usernames})
+                old.put_many(dict.fromkeys(batch))
+            moved += len(leaving)
+
+        self._set_layout(target, None)
+        print(f"🔀 Resharded users from {shards} to {target} shards ({moved} moved)")
+        return moved
+
+    def close(self):
+        for store in self._stores:
+            store.close()
+
+
+def migrate_json_to_sqlite(json_path, store: SQLiteUserStore) -> int:
+    """
+    One-shot import of a users.json file into a SQLite store.
+    Runs only once per database; later calls are no-ops.
+
+    Returns:
+        Number of users imported (0 if already migrated or nothing to import)
+    """
+    json_path = Path(json_path)
+    if store.get_meta("migrated_from_json") or not json_path.exists():
+        return 0
+
+    users = serializer.load_file(json_path)
+
+    conn = store._conn()
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (username, data) VALUES (?, ?)",
+            ((u, serializer.dumps_str(r)) for u, r in users.items()),
+        )
+    store.set_meta("migrated_from_json", str(json_path))
+    print(f"📦 Migrated {len(users)} users from {json_path} to {store.path}")
+    return len(users)
+
+
+def open_store(backend: str = "sqlite", json_path=USERS_JSON_PATH, db_path=USERS_DB_PATH,
+               shards: int = 1, shard_dir=SHARD_DIR):
+    """
+    Create the configured user store.
+
+    Args:
+        backend: "sqlite" (default) or "json"
+        json_path: Location of users.json (the JSON backend, and migration source)
+        db_path: Location of the SQLite database
+        shards: More than 1 splits users across shard_dir (imported from the
+            single-file store on first use). Once split, users stay in shard_dir
+            and a different count here means a reshard() is due.
+        shard_dir: Location of the shard manifest and files
+    """
+    if backend not in ("json", "sqlite"):
+        raise ValueError(f"Unknown storage backend: {backend}")
+    if (Path(shard_dir) / "shards.json").exists():
+        return ShardedUserStore(shard_dir, shards, backend)
+    if shards > 1:
+        legacy = open_store(backend, json_path, db_path)
+        try:
+            return ShardedUserStore(shard_dir, shards, backend, legacy=legacy)
+        finally:
+            legacy.close()
+    if backend == "json":
+        return JSONUserStore(json_path)
+    store = SQLiteUserStore(db_path)
+    migrate_json_to_sqlite(json_path, store)
+    return store
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        src = sys.argv[2] if len(sys.argv) > 2 else USERS_JSON_PATH
+        dst = sys.argv[3] if len(sys.argv) > 3 else USERS_DB_PATH
+        count = migrate_json_to_sqlite(src, SQLiteUserStore(dst))
+        print(f"Imported {count} users")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "reshard":
+        # Offline resharding, for setups with several worker processes (stop them first)
+        backend = sys.argv[3] if len(sys.argv) > 3 else "sqlite"
+        store = open_store(backend, shards=int(sys.argv[2]))
+        store.reshard(int(sys.argv[2]))
+        store.close()
+    else:
+        print("Usage: python storage.py migrate [users.json] [users.db]")
+        print("       python storage.py reshard <shards> [sqlite|json]")
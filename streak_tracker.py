@@ -2,66 +2,341 @@
 Study Streak Tracker
 Tracks daily study time and calculates consecutive successful days.
 Success = studying >= 2 hours/day
+
+Successful days are indexed as sorted runs of consecutive days, so the
+current streak, the longest streak and the streak as of any date are a
+binary search instead of a day-by-day walk through the log.
+
+StreakTracker runs the same logic for every user of the web app, fed from
+the per-user daily study totals that end_session records. The module-level
+functions below keep working on the single-user data/study_log.json.
 """
 
-import json
 import os
+import threading
+from array import array
+from bisect import bisect_right
 from datetime import datetime, timedelta
 from pathlib import Path
 
+import serializer
+from app_config import DEFAULT_STREAK_COLOR, get_config
+
 DATA_DIR = Path(__file__).parent / "data"
 STUDY_LOG_PATH = DATA_DIR / "study_log.json"
+HABIT_MILESTONE = 22
+# Run column value for users with no successful days yet
+NO_RUN = -2
+
+
+class StreakIndex:
+    """
+    Successful days (as date ordinals) stored as disjoint, non-adjacent runs
+    [start, end], sorted by start. Adding a day extends or merges runs, so a
+    back-filled day between two runs joins them into one.
+    """
+
+    def __init__(self, days=()):
+        self.starts = array("l")
+        self.ends = array("l")
+        self.longest = 0
+        for day in sorted(set(days)):
+            if self.ends and self.ends[-1] == day - 1:
+                self.ends[-1] = day
+            else:
+                self.starts.append(day)
+                self.ends.append(day)
+            self.longest = max(self.longest, day - self.starts[-1] + 1)
+
+    def __len__(self):
+        """Number of runs."""
+        return len(self.starts)
+
+    def _run(self, day: int) -> int:
+        """Index of the run starting at or before `day`, or -1."""
+        return bisect_right(self.starts, day) - 1
+
+    def __contains__(self, day: int) -> bool:
+        i = self._run(day)
+        return i >= 0 and self.ends[i] >= day
+
+    def add(self, day: int) -> bool:
+        """Mark a day successful. Returns False if it already was."""
+        i = self._run(day)
+        if i >= 0 and self.ends[i] >= day:
+            return False
+        joins_left = i >= 0 and self.ends[i] == day - 1
+        joins_right = i + 1 < len(self.starts) and self.starts[i + 1] == day + 1
+        if joins_left and joins_right:
+            self.ends[i] = self.ends[i + 1]
+            del self.starts[i + 1]
+            del self.ends[i + 1]
+        elif joins_left:
+            self.ends[i] = day
+        elif joins_right:
+            i += 1
+            self.starts[i] = day
+        else:
+            i += 1
+            self.starts.insert(i, day)
+            self.ends.insert(i, day)
+        self.longest = max(self.longest, self.ends[i] - self.starts[i] + 1)
+        return True
+
+    def remove(self, day: int) -> bool:
+        """Mark a day unsuccessful. Returns False if it wasn't successful."""
+        i = self._run(day)
+        if i < 0 or self.ends[i] < day:
+            return False
+        start, end = self.starts[i], self.ends[i]
+        if start == end:
+            del self.starts[i]
+            del self.ends[i]
+        elif day == start:
+            self.starts[i] = day + 1
+        elif day == end:
+            self.ends[i] = day - 1
+        else:
+            self.ends[i] = day - 1
+            self.starts.insert(i + 1, day + 1)
+            self.ends.insert(i + 1, end)
+        if end - start + 1 == self.longest:
+            # Only shrinking the longest run needs a rescan
+            self.longest = max((e - s + 1 for s, e in zip(self.starts, self.ends)), default=0)
+        return True
+
+    def streak_as_of(self, day: int) -> int:
+        """
+        Streak on `day`: the run through that day, or through the day before
+        if `day` isn't successful yet (it may still be in progress).
+        """
+        i = self._run(day)
+        if i >= 0 and self.ends[i] >= day:
+            return day - self.starts[i] + 1
+        if i >= 0 and self.ends[i] == day - 1:
+            return self.ends[i] - self.starts[i] + 1
+        return 0
+
+
+def _ordinal(date: str) -> int:
+    """YYYY-MM-DD -> day number (fromisoformat is ~30x faster than strptime)."""
+    return datetime.fromisoformat(date).toordinal()
+
+
+def _study_today(now: datetime = None):
+    """Today's date, where days start at streak_reset_hour (4 AM default)."""
+    reset_hour = get_config().get("streak_reset_hour", 4)
+    return ((now or datetime.now()) - timedelta(hours=reset_hour)).date()
+
+
+def seconds_until_reset(now: datetime = None, tz=None) -> float:
+    """Time until the next study day starts (the next streak_reset_hour)."""
+    now = now or datetime.now(tz)
+    reset_hour = get_config().get("streak_reset_hour", 4)
+    boundary = now.replace(hour=reset_hour, minute=0, second=0, microsecond=0)
+    if boundary <= now:
+        boundary += timedelta(days=1)
+    return (boundary - now).total_seconds()
+
+
+class StreakTracker:
+    """
+    Streaks for many users. Each user has a StreakIndex, and each user's
+    latest run is mirrored into flat columns (one slot per user), so
+    evaluate_all() is a single pass over arrays rather than a lookup per user.
+    """
+
+    def __init__(self, threshold_minutes: int = None, tz=None):
+        """
+        Args:
+            threshold_minutes: Minutes for a successful day
+                (default: success_threshold_minutes from config.json)
+            tz: Clock the study day is taken from (default: local time)
+        """
+        self.threshold_minutes = threshold_minutes
+        self.tz = tz
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._usernames = []
+        self._indexes = []
+        self._run_start = array("q")
+        self._run_end = array("q")
+
+    def __len__(self):
+        return len(self._usernames)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._slots
+
+    def _threshold(self) -> int:
+        if self.threshold_minutes is not None:
+            return self.threshold_minutes
+        return get_config().get("success_threshold_minutes", 120)
+
+    def _slot(self, username: str) -> int:
+        """Caller holds the lock."""
+        slot = self._slots.get(username)
+        if slot is None:
+            slot = self._slots[username] = len(self._usernames)
+            self._usernames.append(username)
+            self._indexes.append(StreakIndex())
+            self._run_start.append(NO_RUN)
+            self._run_end.append(NO_RUN)
+        return slot
+
+    def _mirror(self, slot: int):
+        """Copy the user's latest run into the columns. Caller holds the lock."""
+        index = self._indexes[slot]
+        if index.starts:
+            self._run_start[slot] = index.starts[-1]
+            self._run_end[slot] = index.ends[-1]
+        else:
+            self._run_start[slot] = self._run_end[slot] = NO_RUN
+
+    def load(self, username: str, daily: dict):
+        """Index a user's daily totals ({date: {"minutes": ...}}, i.e. "study_daily")."""
+        threshold = self._threshold()
+        index = StreakIndex(
+            _ordinal(date) for date, totals in daily.items()
+            if date and totals.get("minutes", 0) >= threshold
+        )
+        with self._lock:
+            slot = self._slot(username)
+            self._indexes[slot] = index
+            self._mirror(slot)
+
+    def record_day(self, username: str, date: str, total_minutes: int):
+        """Update one day from the user's new total minutes for that date."""
+        day = _ordinal(date)
+        with self._lock:
+            slot = self._slot(username)
+            if total_minutes >= self._threshold():
+                self._indexes[slot].add(day)
+            else:
+                self._indexes[slot].remove(day)
+            self._mirror(slot)
+
+    def status(self, username: str, now: datetime = None) -> dict:
+        """Same shape as get_status(), for one user."""
+        today = _study_today(now or datetime.now(self.tz)).toordinal()
+        with self._lock:
+            slot = self._slots.get(username)
+            index = self._indexes[slot] if slot is not None else StreakIndex()
+            streak, longest = index.streak_as_of(today), index.longest
+        return {
+            "current_streak": streak,
+            "longest_streak": longest,
+            "color": get_streak_color(streak),
+            "habit_milestone": HABIT_MILESTONE,
+            "days_to_habit": max(0, HABIT_MILESTONE - streak)
+        }
+
+    def evaluate_all(self, now: datetime = None) -> dict:
+        """
+        Streak, color tier and days-to-habit for every user in one pass.
+
+        Returns:
+            dict of parallel columns: "usernames" (list), "streak",
+            "days_to_habit" and "tier" (arrays), plus "colors" where
+            colors[tier[i]] is user i's color
+        """
+        today = _study_today(now or datetime.now(self.tz)).toordinal()
+        yesterday = today - 1
+        tier_starts, tier_colors = get_config().streak_tiers
+        with self._lock:
+            usernames = list(self._usernames)
+            indexes = self._indexes
+            streak = array("q", [
+                # A run starting after today is a future-dated entry; ask the full index
+                indexes[i].streak_as_of(today) if start > today
+                else today - start + 1 if end >= today
+                else end - start + 1 if end == yesterday
+                else 0
+                for i, (start, end) in enumerate(zip(self._run_start, self._run_end))
+            ])
+
+        # Tier lookups below the highest threshold come from a small table;
+        # anything at or above it is the top tier
+        cap = tier_starts[-1] if tier_starts else 0
+        tier_of = [bisect_right(tier_starts, n) for n in range(cap)]
+        top = len(tier_starts)
+        return {
+            "usernames": usernames,
+            "streak": streak,
+            "days_to_habit": array("q", [HABIT_MILESTONE - n if n < HABIT_MILESTONE else 0 for n in streak]),
+            "tier": array("b", [tier_of[n] if n < cap else top for n in streak]),
+            "colors": [DEFAULT_STREAK_COLOR] + list(tier_colors),
+        }
 
 
-def _load_config():
-    """Load configuration from config.json"""
-    config_path = Path(__file__).parent / "config.json"
-    with open(config_path, "r") as f:
-        return json.load(f)
+_lock = threading.RLock()
+# (study log mtime, log dict, StreakIndex), rebuilt if the file changes underneath us
+_cached = None
 
 
 def _load_study_log():
     """Load study log from JSON file"""
     if not STUDY_LOG_PATH.exists():
         return {}
-    with open(STUDY_LOG_PATH, "r") as f:
-        return json.load(f)
+    return serializer.load_file(STUDY_LOG_PATH)
 
 
 def _save_study_log(log: dict):
     """Save study log to JSON file"""
     DATA_DIR.mkdir(exist_ok=True)
-    with open(STUDY_LOG_PATH, "w") as f:
-        json.dump(log, f, indent=2)
+    serializer.dump_file(log, STUDY_LOG_PATH)
+
+
+def _log_mtime():
+    try:
+        return os.stat(STUDY_LOG_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _indexed_log() -> tuple:
+    """The study log and its StreakIndex, parsed once and reused until the file changes."""
+    global _cached
+    with _lock:
+        mtime = _log_mtime()
+        if _cached is None or _cached[0] != mtime:
+            log = _load_study_log()
+            index = StreakIndex(_ordinal(d) for d, entry in log.items() if entry.get("success", False))
+            _cached = (mtime, log, index)
+        return _cached[1], _cached[2]
 
 
 def log_day(date: str, minutes: int) -> dict:
     """
     Record study minutes for a specific date.
-    
+
     Args:
         date: Date string in YYYY-MM-DD format
         minutes: Total study minutes for the day
-    
+
     Returns:
         dict with success status and updated streak
     """
-    config = _load_config()
-    log = _load_study_log()
-    
-    threshold = config.get("success_threshold_minutes", 120)
+    global _cached
+    threshold = get_config().get("success_threshold_minutes", 120)
     success = minutes >= threshold
-    
-    log[date] = {
-        "minutes": minutes,
-        "success": success,
-        "logged_at": datetime.now().isoformat()
-    }
-    
-    _save_study_log(log)
-    
+
+    with _lock:
+        log, index = _indexed_log()
+        log[date] = {
+            "minutes": minutes,
+            "success": success,
+            "logged_at": datetime.now().isoformat()
+        }
+        _save_study_log(log)
+        if success:
+            index.add(_ordinal(date))
+        else:
+            index.remove(_ordinal(date))
+        _cached = (_log_mtime(), log, index)
+
     streak = calculate_streak()
-    
+
     return {
         "date": date,
         "minutes": minutes,
@@ -73,57 +348,37 @@ def log_day(date: str, minutes: int) -> dict:
 
 def is_day_successful(date: str) -> bool:
     """Check if a specific date met the study threshold"""
-    log = _load_study_log()
-    if date not in log:
-        return False
-    return log[date].get("success", False)
+    _, index = _indexed_log()
+    return _ordinal(date) in index
 
 
 def calculate_streak() -> int:
     """
     Calculate the current streak of consecutive successful days.
     Counts backwards from yesterday (today is still in progress).
-    
+
     Returns:
         Number of consecutive successful days
     """
-    config = _load_config()
-    log = _load_study_log()
-    reset_hour = config.get("streak_reset_hour", 4)
-    
-    # Determine "today" based on reset hour (4 AM default)
-    now = datetime.now()
-    if now.hour < reset_hour:
-        # Before 4 AM, we're still on "yesterday"
-        today = (now - timedelta(days=1)).date()
-    else:
-        today = now.date()
-    
-    streak = 0
-    check_date = today
-    
-    # If today has a successful entry, count it
-    today_str = check_date.strftime("%Y-%m-%d")
-    if today_str in log and log[today_str].get("success", False):
-        streak = 1
-        check_date = check_date - timedelta(days=1)
-    
-    # Count consecutive successful days backwards
-    while True:
-        date_str = check_date.strftime("%Y-%m-%d")
-        if date_str in log and log[date_str].get("success", False):
-            streak += 1
-            check_date = check_date - timedelta(days=1)
-        else:
-            break
-    
-    return streak
+    return streak_as_of(_study_today().strftime("%Y-%m-%d"))
+
+
+def streak_as_of(date: str) -> int:
+    """The streak as it stood on a date (YYYY-MM-DD)."""
+    _, index = _indexed_log()
+    return index.streak_as_of(_ordinal(date))
+
+
+def longest_streak() -> int:
+    """The longest run of successful days ever logged."""
+    _, index = _indexed_log()
+    return index.longest
 
 
 def get_streak_color(streak: int) -> dict:
     """
     Get the RGB color for the current streak level.
-    
+
     Color progression:
     - 0 days: Red (streak broken)
     - 1-4 days: Yellow (building)
@@ -131,36 +386,27 @@ def get_streak_color(streak: int) -> dict:
     - 16-21 days: Cyan (almost there)
     - 22+ days: Purple (habit formed!)
     """
-    config = _load_config()
-    colors = config.get("streak_colors", {})
-    
-    # Find the appropriate color tier
-    thresholds = sorted([int(k) for k in colors.keys()], reverse=True)
-    
-    for threshold in thresholds:
-        if streak >= threshold:
-            return colors[str(threshold)]
-    
-    # Default to red if no match
-    return {"r": 255, "g": 0, "b": 0}
+    # Tiers are sorted once per config load; red if no tier matches
+    return get_config().streak_color(streak)
 
 
 def get_status() -> dict:
     """Get current streak status summary"""
-    streak = calculate_streak()
+    log, index = _indexed_log()
+    today = _study_today()
+    streak = index.streak_as_of(today.toordinal())
     color = get_streak_color(streak)
-    log = _load_study_log()
-    
+
     # Get today's study time if available
-    today = datetime.now().strftime("%Y-%m-%d")
-    today_minutes = log.get(today, {}).get("minutes", 0)
-    
+    today_minutes = log.get(today.strftime("%Y-%m-%d"), {}).get("minutes", 0)
+
     return {
         "current_streak": streak,
+        "longest_streak": index.longest,
         "color": color,
         "today_minutes": today_minutes,
-        "habit_milestone": 22,
-        "days_to_habit": max(0, 22 - streak)
+        "habit_milestone": HABIT_MILESTONE,
+        "days_to_habit": max(0, HABIT_MILESTONE - streak)
     }
 
 
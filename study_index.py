@@ -0,0 +1,117 @@
+"""
+Study History Index
+Per-user daily aggregates (date -> minutes, pomodoros) and a cached current streak.
+
+The aggregates are kept on the user record under "study_daily" and updated
+when a session ends, so an N-day history is N dict lookups no matter how many
+sessions the user has logged. The streak is cached per user and recomputed
+only after a new session or when the study day rolls over.
+"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+def study_day(now: datetime, reset_hour: int = 0):
+    """The calendar day a moment belongs to, where days start at `reset_hour`."""
+    return (now - timedelta(hours=reset_hour)).date()
+
+
+def build_daily(sessions: list) -> dict:
+    """Aggregate raw study_sessions into {date: {"minutes", "pomodoros"}}."""
+    daily = {}
+    for s in sessions:
+        day = daily.setdefault(s.get("date"), {"minutes": 0, "pomodoros": 0})
+        day["minutes"] += s.get("duration_mins", 0)
+        day["pomodoros"] += s.get("pomodoros", 0)
+    return daily
+
+
+def add_session(user: dict, date: str, minutes: int, pomodoros: int) -> dict:
+    """Fold a finished session into the record's "study_daily" (built if missing). Returns it."""
+    daily = user.get("study_daily")
+    if daily is None:
+        daily = user["study_daily"] = build_daily(user.get("study_sessions", []))
+    day = daily.setdefault(date, {"minutes": 0, "pomodoros": 0})
+    day["minutes"] += minutes
+    day["pomodoros"] += pomodoros
+    return daily
+
+
+class StudyHistoryIndex:
+    """In-memory daily aggregates and streak cache for every user seen so far."""
+
+    def __init__(self, reset_hour: int = 0):
+        self.reset_hour = reset_hour
+        self._lock = threading.Lock()
+        self._daily = {}
+        # username -> (study day the streak was computed for, streak)
+        self._streaks = {}
+        # username -> change counter for that user's daily totals
+        self._versions = {}
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._daily
+
+    def today(self, now: datetime = None):
+        return study_day(now or datetime.now(timezone.utc), self.reset_hour)
+
+    def load(self, username: str, user: dict) -> dict:
+        """
+        Index a user record, building "study_daily" from raw sessions if it is
+        missing. Reloading unchanged totals leaves the version alone, so a
+        caller can reload on every read.
+        """
+        daily = user.get("study_daily")
+        if daily is None:
+            daily = build_daily(user.get("study_sessions", []))
+        with self._lock:
+            if self._daily.get(username) != daily:
+                self._daily[username] = {d: dict(v) for d, v in daily.items()}
+                self._streaks.pop(username, None)
+                self._versions[username] = self._versions.get(username, 0) + 1
+        return daily
+
+    def version(self, username: str) -> int:
+        """Change counter for a user's totals (0 if never loaded)."""
+        return self._versions.get(username, 0)
+
+    def history(self, username: str, days: int = 7, now: datetime = None) -> list:
+        """Per-day totals for the last `days` study days, oldest first."""
+        today = self.today(now)
+        daily = self._daily.get(username, {})
+        history = []
+        for i in range(days):
+            day = today - timedelta(days=days - 1 - i)
+            day_str = day.strftime("%Y-%m-%d")
+            totals = daily.get(day_str)
+            total_mins = totals["minutes"] if totals else 0
+            history.append({
+                "date": day_str,
+                "day_name": day.strftime("%a"),
+                "duration_mins": total_mins,
+                "pomodoros": totals["pomodoros"] if totals else 0,
+                "dots": min(8, total_mins // 15)  # Each dot = 15 mins, max 8
+            })
+        return history
+
+    def streak(self, username: str, now: datetime = None) -> int:
+        """Consecutive study days (>0 minutes) ending today."""
+        today = self.today(now)
+        cached = self._streaks.get(username)
+        if cached is not None and cached[0] == today:
+            return cached[1]
+
+        daily = self._daily.get(username, {})
+        streak = 0
+        day = today
+        while True:
+            totals = daily.get(day.strftime("%Y-%m-%d"))
+            if not totals or totals["minutes"] <= 0:
+                break
+            streak += 1
+            day -= timedelta(days=1)
+
+        with self._lock:
+            self._streaks[username] = (today, streak)
+        return streak
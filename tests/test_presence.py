@@ -0,0 +1,73 @@
+"""Live sessions expiring across checkpoints (presence.py)."""
+
+from presence import PresenceRegistry
+from storage import JSONUserStore
+
+TTL_MS = 1000
+
+
+def make_store(tmp_path, *usernames):
+    store = JSONUserStore(tmp_path / "users.json")
+    store.put_many({username: {"current_session": None} for username in usernames})
+    return store
+
+
+def test_expired_session_is_cleared_at_next_checkpoint(tmp_path):
+    store = make_store(tmp_path, "alice", "bob")
+    presence = PresenceRegistry(ttl_ms=TTL_MS)
+    presence.start("alice", exam="NEET", now=0)
+    presence.start("bob", exam="NEET", now=0)
+    assert presence.checkpoint(store, now=100) == 2
+    assert store.get("alice")["current_session"]["seen_ms"] == 0
+
+    presence.heartbeat("bob", now=900)
+    # alice last heartbeated at 0 and has expired by now
+    assert presence.checkpoint(store, now=1500) == 2
+    assert store.get("alice")["current_session"] is None
+    assert store.get("bob")["current_session"]["seen_ms"] == 900
+    assert presence.counts(now=1500) == {"studying": 1, "exams": {"NEET": 1}}
+
+    # A restart picks up only the session that was still live
+    restarted = PresenceRegistry(ttl_ms=TTL_MS)
+    for username in ("alice", "bob"):
+        restarted.restore(username, store.get(username)["current_session"], now=1500)
+    assert "bob" in restarted and "alice" not in restarted
+
+
+def test_expiry_keeps_session_another_worker_saw_later(tmp_path):
+    store = make_store(tmp_path, "alice")
+    first, second = PresenceRegistry(ttl_ms=TTL_MS), PresenceRegistry(ttl_ms=TTL_MS)
+    first.start("alice", now=0)
+    first.checkpoint(store, now=0)
+
+    # The client's heartbeats move to another worker, which checkpoints them
+    second.restore("alice", store.get("alice")["current_session"], now=500)
+    second.heartbeat("alice", now=800)
+    second.checkpoint(store, now=800)
+
+    # The first worker's copy expires, but the stored session is newer than it
+    assert first.checkpoint(store, now=1200) == 0
+    assert store.get("alice")["current_session"]["seen_ms"] == 800
+
+
+def test_checkpoint_counts_only_the_committed_attempt():
+    class RetryingStore:
+        """Calls mutate once with a record that loses the race, then with the committed one."""
+
+        def __init__(self):
+            self.records = {"alice": {"current_session": None}}
+
+        def update_many(self, usernames, mutate):
+            for username in usernames:
+                mutate(username, dict(self.records[username], session_ended_ms=10**15))
+                record = mutate(username, dict(self.records[username]))
+                if record is not None:
+                    self.records[username] = record
+            return dict(self.records)
+
+    presence = PresenceRegistry(ttl_ms=TTL_MS)
+    presence.start("alice", now=0)
+    store = RetryingStore()
+    assert presence.checkpoint(store, now=10) == 1
+    assert "alice" in presence
+    assert store.records["alice"]["current_session"]["start_ms"] == 0
@@ -0,0 +1,51 @@
+"""ShardedUserStore resharding while the store is in use (storage.py)."""
+
+import random
+import threading
+
+from storage import ShardedUserStore
+
+USERS = 200
+WRITES = 150
+
+
+def test_reshard_during_writes_loses_no_updates(tmp_path):
+    store = ShardedUserStore(tmp_path, shards=2)
+    store.put_many({f"user{i}": {"n": 0} for i in range(USERS)})
+    expected = [0] * USERS
+    expected_lock = threading.Lock()
+    started = threading.Barrier(5)
+
+    def increment(user):
+        return dict(user, n=user["n"] + 1)
+
+    def writer(seed):
+        rnd = random.Random(seed)
+        started.wait()
+        for _ in range(WRITES):
+            i = rnd.randrange(USERS)
+            store.update(f"user{i}", increment)
+            with expected_lock:
+                expected[i] += 1
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    moved = store.reshard(5, batch_size=7)
+    for thread in threads:
+        thread.join()
+
+    assert moved > 0
+    assert (store.shards, store.target) == (5, None)
+    users = dict(store.items())
+    assert len(users) == store.count() == USERS
+    assert {username: user["n"] for username, user in users.items()} == {
+        f"user{i}": n for i, n in enumerate(expected)}
+    store.close()
+
+    # The new layout is what a restarted process opens
+    reopened = ShardedUserStore(tmp_path)
+    assert reopened.shards == 5
+    assert reopened.get("user0") == users["user0"]
+    reopened.close()
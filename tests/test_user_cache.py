@@ -0,0 +1,62 @@
+"""Crash recovery of the write-behind user cache (user_cache.py)."""
+
+from storage import SQLiteUserStore
+from user_cache import CachedUserStore
+
+
+def crash(cache):
+    """Stop a cache the way a killed process would: no compaction, journal left behind."""
+    cache._stop.set()
+    cache._thread.join()
+    cache._journal.close()
+    cache.backend.close()
+    if cache._lock_file is not None:
+        cache._lock_file.close()
+
+
+def open_cache(tmp_path):
+    return CachedUserStore(SQLiteUserStore(tmp_path / "users.db"), journal_path=tmp_path / "users.journal",
+                           compact_every=10**9)
+
+
+def test_replay_keeps_acknowledged_writes_and_drops_torn_line(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.put("alice", {"scores": [1]})
+    cache.put("bob", {"scores": [2]})
+    cache.update("alice", lambda user: dict(user, scores=user["scores"] + [3]))
+    crash(cache)
+
+    journal = tmp_path / "users.journal"
+    with open(journal, "a") as f:
+        # A write the process died in the middle of: never acknowledged
+        f.write('{"u":"carol","r":{"sco')
+
+    cache = open_cache(tmp_path)
+    try:
+        assert cache.get("alice") == {"scores": [1, 3]}
+        assert cache.get("bob") == {"scores": [2]}
+        assert cache.get("carol") is None
+        assert not journal.exists() or journal.read_text() == ""
+    finally:
+        cache.close()
+    # Replayed writes reached the backend itself, not just the new cache
+    backend = SQLiteUserStore(tmp_path / "users.db")
+    assert backend.get("alice") == {"scores": [1, 3]}
+    backend.close()
+
+
+def test_replay_applies_sealed_journal_before_live_one(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.put("alice", {"n": 1})
+    crash(cache)
+    # As if a compaction had sealed the first journal before the crash
+    (tmp_path / "users.journal").rename(tmp_path / "users.journal.sealed")
+    with open(tmp_path / "users.journal", "w") as f:
+        f.write('{"u":"alice","r":{"n":2}}\n{"u":"alice","r":{"n":')
+
+    cache = open_cache(tmp_path)
+    try:
+        assert cache.get("alice") == {"n": 2}
+        assert not (tmp_path / "users.journal.sealed").exists()
+    finally:
+        cache.close()
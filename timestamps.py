@@ -0,0 +1,145 @@
+"""
+Timestamps
+ISO-8601 strings are parsed once, when data arrives, into integer epoch
+milliseconds stored next to the original string: "ts_ms" on scores,
+"last_login_ms" on users and "start_ms" on the current study session.
+Everything after ingest compares integers.
+
+Records written before this existed are converted by migrate(), which runs
+in the background at startup; until then ms_of() parses them on the fly.
+"""
+
+import math
+import time
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MS = timedelta(milliseconds=1)
+MIGRATION_BATCH_SIZE = 500
+# Negative marking can take a score below zero
+MIN_PERCENTAGE = -100
+MAX_PERCENTAGE = 100
+
+
+def now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def parse_ms(value) -> int:
+    """
+    ISO-8601 string (trailing Z allowed; no offset means UTC) to epoch milliseconds.
+
+    Raises:
+        ValueError: Not a string, or not a valid ISO-8601 date/time
+    """
+    if not isinstance(value, str):
+        raise ValueError(f"timestamp must be an ISO-8601 string, got {type(value).__name__}")
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"invalid timestamp: {value!r}") from None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - EPOCH) // ONE_MS
+
+
+def to_iso(ms: int) -> str:
+    return (EPOCH + ms * ONE_MS).isoformat()
+
+
+def ms_of(record: dict, ms_key: str, iso_key: str):
+    """The record's epoch ms, parsing the ISO field for unmigrated records. None if unparseable."""
+    if ms_key in record:
+        return record[ms_key]
+    try:
+        return parse_ms(record.get(iso_key))
+    except ValueError:
+        return None
+
+
+def is_percentage(value) -> bool:
+    """Whether value is a usable score percentage: a finite number (not a bool) in range."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    return math.isfinite(value) and MIN_PERCENTAGE <= value <= MAX_PERCENTAGE
+
+
+def normalize_score(score: dict) -> dict:
+    """
+    Validate an incoming score's "timestamp" and "percentage", and add
+    "ts_ms" (in place).
+
+    Raises:
+        ValueError: Missing or malformed timestamp or percentage
+    """
+    if not isinstance(score, dict):
+        raise ValueError("score must be a JSON object")
+    if "timestamp" not in score:
+        raise ValueError("missing timestamp")
+    if not is_percentage(score.get("percentage")):
+        raise ValueError(f"percentage must be a number from {MIN_PERCENTAGE} to {MAX_PERCENTAGE}")
+    score["ts_ms"] = parse_ms(score["timestamp"])
+    return score
+
+
+def normalize_user(user: dict) -> bool:
+    """
+    Add the epoch ms fields to a stored user record (in place). Stored scores
+    with unparseable timestamps get "ts_ms": None and are ignored by queries.
+
+    Returns:
+        True if anything was added
+    """
+    changed = False
+    for score in user.get("scores", []):
+        if "ts_ms" not in score:
+            score["ts_ms"] = ms_of(score, "ts_ms", "timestamp")
+            changed = True
+    if "last_login" in user and "last_login_ms" not in user:
+        user["last_login_ms"] = ms_of(user, "last_login_ms", "last_login")
+        changed = True
+    session = user.get("current_session")
+    if session and "start_ms" not in session:
+        session["start_ms"] = ms_of(session, "start_ms", "start_time")
+        changed = True
+    return changed
+
+
+def migrate(store, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Add epoch ms fields to every stored user that lacks them. Safe to run
+    alongside live traffic (writes go through store.update_many) and to run
+    again; users that are already converted are not rewritten.
+
+    Returns:
+        Number of users rewritten
+    """
+    converted = set()
+
+    def convert(username, user):
+        # May run more than once per user if it changes meanwhile
+        if user is not None and normalize_user(user):
+            converted.add(username)
+            return user
+        converted.discard(username)
+        return None
+
+    pending = []
+    for username, user in store.items():
+        if _needs_migration(user):
+            pending.append(username)
+        if len(pending) >= batch_size:
+            store.update_many(pending, convert)
+            pending = []
+    if pending:
+        store.update_many(pending, convert)
+    return len(converted)
+
+
+def _needs_migration(user: dict) -> bool:
+    if "last_login" in user and "last_login_ms" not in user:
+        return True
+    session = user.get("current_session")
+    if session and "start_ms" not in session:
+        return True
+    return any("ts_ms" not in score for score in user.get("scores", []))
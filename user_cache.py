@@ -0,0 +1,463 @@
+"""
+Write-Behind User Cache
+Keeps every user record in memory and journals mutations to disk.
+
+Reads never touch disk. A write is appended to an append-only journal and
+acknowledged once the background flusher has fsynced it (fsyncs are batched
+every few milliseconds, so concurrent writers share one fsync). The journal is
+periodically compacted into the backing store and then discarded.
+On startup any leftover journal is replayed, so no acknowledged write is lost.
+
+update() serializes read-modify-write per user with striped locks, so writers
+to different users run in parallel. The cache lives in one process; several
+processes writing the same users should use SQLiteUserStore directly. A
+second process opening the same journal fails with JournalInUseError rather
+than corrupting it.
+
+Records are held as their serialized JSON (the bytes written to the journal),
+not as dicts: well under half the memory, and get() returns a private copy by
+parsing them, which is faster than copying a dict. Users who haven't logged in
+for cold_after_days are held zlib-compressed instead (another ~8x smaller);
+they are decompressed when read and become hot again when written, e.g. by
+their next login. An hourly pass moves users who go quiet to the cold tier.
+"""
+
+import os
+import shutil
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import metrics
+import serializer
+from timestamps import ms_of, now_ms
+
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): nothing stops a second process opening the journal
+    fcntl = None
+
+DATA_DIR = Path(__file__).parent / "data"
+JOURNAL_PATH = DATA_DIR / "users.journal"
+USER_LOCK_STRIPES = 256
+COLD_COMPRESSION_LEVEL = 6
+DEMOTE_INTERVAL_SECONDS = 3600
+DAY_MS = 86_400_000
+# A worker being replaced (e.g. gunicorn's HUP reload) closes its journal within graceful_timeout
+JOURNAL_LOCK_WAIT_SECONDS = 15
+
+STORAGE_SECONDS = metrics.histogram(
+    "user_store_seconds", "Disk work behind the user cache: initial load, journal fsync, compaction", ("op",))
+
+
+class ColdRecord:
+    """A user record in the cold tier: zlib-compressed serialized JSON."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+def _last_active_ms(record: dict) -> int:
+    # Users stored before last_login existed count as inactive
+    return ms_of(record, "last_login_ms", "last_login") or 0
+
+
+def _unpack(value):
+    """A held record (hot bytes or ColdRecord) as a new dict; None stays None."""
+    if value is None:
+        return None
+    if type(value) is ColdRecord:
+        value = zlib.decompress(value.data)
+    return serializer.loads(value)
+
+
+class JournalInUseError(RuntimeError):
+    """Another process already has this journal open."""
+
+
+class CachedUserStore:
+    """In-memory user map in front of a storage backend (see storage.py)."""
+
+    def __init__(self, backend, journal_path=JOURNAL_PATH, fsync_interval_ms: int = 5,
+                 compact_every: int = 1000, cold_after_days: float = None):
+        """
+        Args:
+            backend: Store to compact into (SQLiteUserStore, JSONUserStore, ...)
+            journal_path: Location of the append-only journal
+            fsync_interval_ms: How often pending journal entries are fsynced
+            compact_every: Journal entries to accumulate before compacting
+            cold_after_days: Compress users whose last login is older than this (None/0 = never)
+        """
+        self.backend = backend
+        self.journal_path = Path(journal_path)
+        self._compacting_path = self.journal_path.with_name(self.journal_path.name + ".compacting")
+        self._sealed_path = self.journal_path.with_name(self.journal_path.name + ".sealed")
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.compact_every = compact_every
+        self.cold_after_ms = int(cold_after_days * DAY_MS) if cold_after_days else None
+        self._lock_file = self._acquire_journal()
+
+        self._lock = threading.Lock()
+        # Held for a whole compaction; taken before _io_lock
+        self._compact_lock = threading.Lock()
+        # Held while the journal file may be fsynced or swapped out; taken before _lock
+        self._io_lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        # Per-user read-modify-write locks, striped by username hash
+        self._user_locks = [threading.Lock() for _ in range(USER_LOCK_STRIPES)]
+
+        # username -> hot bytes or ColdRecord
+        self._users = {}
+        # username -> last login (epoch ms), for hot users only
+        self._active_ms = {}
+        with STORAGE_SECONDS.time("load"):
+            self._replay()
+            cutoff = self._cold_cutoff()
+            for username, record in backend.items():
+                self._hold(username, self._pack(serializer.dumps(record), _last_active_ms(record), cutoff))
+        self._dirty = set()
+
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self._journal = open(self.journal_path, "a")
+        self._seq = 0
+        self._synced_seq = 0
+        self._pending_entries = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="user-journal", daemon=True)
+        self._thread.start()
+
+    # --- Recovery ---
+
+    def _acquire_journal(self):
+        """Lock the journal for this process, before replay could touch another one's writes."""
+        if fcntl is None:
+            return None
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.journal_path.with_name(self.journal_path.name + ".lock"), "a")
+        deadline = time.monotonic() + JOURNAL_LOCK_WAIT_SECONDS
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_file
+            except OSError:
+                if time.monotonic() >= deadline:
+                    lock_file.close()
+                    raise JournalInUseError(
+                        f"{self.journal_path} is in use by another process: run a single worker "
+                        f"with the user cache, or set USER_CACHE=0 (see gunicorn.conf.py)") from None
+                time.sleep(0.1)
+
+    def _replay(self):
+        """Apply journals left behind by a previous process to the backend."""
+        records = {}
+        # Oldest first: a failed compaction's writes, then a sealed journal, then the live one
+        paths = (self._compacting_path, self._sealed_path, self.journal_path)
+        for path in paths:
+            if not path.exists():
+                continue
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = serializer.loads(line)
+                    except ValueError:
+                        # Torn final line from a crash mid-write; it was never acknowledged
+                        break
+                    records[entry["u"]] = entry["r"]
+
+        if records:
+            self.backend.put_many(records)
+            print(f"🔁 Replayed {len(records)} journaled user writes")
+
+        for path in paths:
+            if path.exists():
+                path.unlink()
+
+    # --- Tiers ---
+
+    def _cold_cutoff(self):
+        return None if self.cold_after_ms is None else now_ms() - self.cold_after_ms
+
+    @staticmethod
+    def _pack(data: bytes, active_ms: int, cutoff):
+        """What to hold for a serialized record: (value, active_ms or None if cold)."""
+        if cutoff is not None and active_ms < cutoff:
+            return ColdRecord(zlib.compress(data, COLD_COMPRESSION_LEVEL)), None
+        return data, active_ms
+
+    def _hold(self, username: str, packed: tuple):
+        """Store a _pack() result. Caller holds the lock (or is still in __init__)."""
+        value, active_ms = packed
+        self._users[username] = value
+        if active_ms is None:
+            self._active_ms.pop(username, None)
+        else:
+            self._active_ms[username] = active_ms
+
+    def demote(self) -> int:
+        """
+        Compress hot users who haven't logged in for cold_after_days.
+        Compression runs outside the lock; users written meanwhile are skipped.
+
+        Returns:
+            Number of users moved to the cold tier
+        """
+        cutoff = self._cold_cutoff()
+        if cutoff is None:
+            return 0
+        with self._lock:
+            stale = [(u, self._users[u]) for u, active_ms in self._active_ms.items() if active_ms < cutoff]
+        moved = 0
+        for username, data in stale:
+            cold = ColdRecord(zlib.compress(data, COLD_COMPRESSION_LEVEL))
+            with self._lock:
+                if self._users.get(username) is data:
+                    self._hold(username, (cold, None))
+                    moved += 1
+        return moved
+
+    def tiers(self) -> dict:
+        """{"hot"|"cold": (users, bytes held)}; walks every user, so for /metrics scrapes only."""
+        with self._lock:
+            values = list(self._users.values())
+        cold = [v.data for v in values if type(v) is ColdRecord]
+        hot_bytes = sum(len(v) for v in values if type(v) is not ColdRecord)
+        return {"hot": (len(values) - len(cold), hot_bytes), "cold": (len(cold), sum(map(len, cold)))}
+
+    # --- Reads (memory only) ---
+
+    def get(self, username: str):
+        """Return a private copy of the user's record, or None."""
+        return _unpack(self._users.get(username))
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._users
+
+    def items(self):
+        """Iterate (username, record) pairs; each record is decoded (a private copy) as it is reached."""
+        with self._lock:
+            snapshot = list(self._users.items())
+        return ((username, _unpack(value)) for username, value in snapshot)
+
+    def all(self) -> dict:
+        return dict(self.items())
+
+    def count(self) -> int:
+        return len(self._users)
+
+    # --- Writes (journal, then memory) ---
+
+    def put(self, username: str, record: dict):
+        self._append(username, record)
+
+    def delete(self, username: str):
+        self._append(username, None)
+
+    def put_many(self, records: dict):
+        for username, record in records.items():
+            self._append(username, record, wait=False)
+        self._wait_durable(self._seq)
+
+    def journal_depth(self) -> dict:
+        """Journal entries not yet fsynced, and not yet compacted into the backend."""
+        return {("unsynced",): self._seq - self._synced_seq, ("uncompacted",): self._pending_entries}
+
+    def _stripes(self, usernames) -> list:
+        """Lock stripes covering these users, in a fixed order to avoid deadlock."""
+        return [self._user_locks[i] for i in sorted({hash(u) % USER_LOCK_STRIPES for u in usernames})]
+
+    def update(self, username: str, mutate):
+        """
+        Atomic read-modify-write of one user. Only writers to the same user
+        (or one sharing its lock stripe) wait for each other.
+
+        Args:
+            mutate: Called with a private copy of the record (None if the user
+                doesn't exist); returns the record to store, or None to leave it
+
+        Returns:
+            The record as stored afterwards (None if there is none)
+        """
+        with self._user_locks[hash(username) % USER_LOCK_STRIPES]:
+            record = mutate(self.get(username))
+            if record is None:
+                return self.get(username)
+            # The next writer may build on this record before it is fsynced;
+            # its own entry lands later in the journal, so replay order holds
+            seq = self._append(username, record, wait=False)
+        self._wait_durable(seq)
+        return record
+
+    def update_many(self, usernames, mutate) -> dict:
+        """update() for several users with a single durability wait; mutate(username, record)."""
+        usernames = list(dict.fromkeys(usernames))
+        locks = self._stripes(usernames)
+        for lock in locks:
+            lock.acquire()
+        try:
+            result = {}
+            for username in usernames:
+                record = mutate(username, self.get(username))
+                if record is None:
+                    result[username] = self.get(username)
+                else:
+                    self._append(username, record, wait=False)
+                    result[username] = record
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        self._wait_durable(self._seq)
+        return result
+
+    def replace_all(self, users: dict):
+        """Swap the whole user map. Goes straight to the backend (rare, admin-only)."""
+        with self._compact_lock, self._io_lock, self._lock:
+            self.backend.replace_all(users)
+            # Everything journaled so far is superseded by the new map
+            self._journal.close()
+            self._journal = open(self.journal_path, "w")
+            if self._compacting_path.exists():
+                self._compacting_path.unlink()
+            self._synced_seq = self._seq
+            self._synced.notify_all()
+            self._users, self._active_ms = {}, {}
+            cutoff = self._cold_cutoff()
+            for username, record in users.items():
+                self._hold(username, self._pack(serializer.dumps(record), _last_active_ms(record), cutoff))
+            self._dirty.clear()
+            self._pending_entries = 0
+
+    def _append(self, username: str, record, wait: bool = True) -> int:
+        # Serialized once: the cache holds the same bytes the journal line embeds
+        data = serializer.dumps(record)
+        line = '{"u":%s,"r":%s}\n' % (serializer.dumps_str(username), data.decode())
+        # Compress (for a user who stays cold) before taking the lock
+        packed = None if record is None else self._pack(data, _last_active_ms(record), self._cold_cutoff())
+        with self._lock:
+            self._journal.write(line)
+            self._seq += 1
+            self._pending_entries += 1
+            seq = self._seq
+            if packed is None:
+                self._users.pop(username, None)
+                self._active_ms.pop(username, None)
+            else:
+                self._hold(username, packed)
+            self._dirty.add(username)
+        if wait:
+            self._wait_durable(seq)
+        return seq
+
+    def _wait_durable(self, seq: int):
+        """Block until the journal entry with this sequence number is fsynced."""
+        with self._lock:
+            while self._synced_seq < seq and not self._stop.is_set():
+                self._synced.wait()
+
+    # --- Background flushing and compaction ---
+
+    def _flush_loop(self):
+        next_demote = time.monotonic() + DEMOTE_INTERVAL_SECONDS
+        while not self._stop.wait(self.fsync_interval):
+            self._sync()
+            if self._pending_entries >= self.compact_every:
+                try:
+                    self.compact()
+                except Exception as e:
+                    # Retried after the next compact_every writes; replayed on restart meanwhile
+                    print(f"⚠️ User journal compaction failed: {e}")
+            if time.monotonic() >= next_demote:
+                next_demote = time.monotonic() + DEMOTE_INTERVAL_SECONDS
+                self.demote()
+
+    def _sync(self):
+        with self._io_lock:
+            with self._lock:
+                if self._synced_seq == self._seq:
+                    return
+                self._journal.flush()
+                seq = self._seq
+                fd = self._journal.fileno()
+            # fsync outside _lock so writers keep appending while the disk catches up
+            with STORAGE_SECONDS.time("fsync"):
+                os.fsync(fd)
+        with self._lock:
+            self._synced_seq = max(self._synced_seq, seq)
+            self._synced.notify_all()
+
+    def _seal(self) -> dict:
+        """
+        Swap the journal for a fresh one and add what it held to the
+        compacting journal, after any writes a failed compaction left there.
+        Caller holds _io_lock.
+
+        Returns:
+            The dirty users' held values (see _pack) that the compacting journal covers
+        """
+        with self._lock:
+            if not self._dirty:
+                return {}
+            self._journal.close()
+            os.replace(self.journal_path, self._sealed_path)
+            self._journal = open(self.journal_path, "a")
+            seq = self._seq
+            records = {u: self._users.get(u) for u in self._dirty}
+            self._dirty = set()
+            self._pending_entries = 0
+
+        # fsync outside _lock so writers keep appending to the new journal meanwhile
+        with STORAGE_SECONDS.time("fsync"), open(self._sealed_path, "rb") as f:
+            os.fsync(f.fileno())
+        with self._lock:
+            self._synced_seq = max(self._synced_seq, seq)
+            self._synced.notify_all()
+
+        if self._compacting_path.exists():
+            with open(self._sealed_path, "rb") as src, open(self._compacting_path, "ab") as dst:
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+            self._sealed_path.unlink()
+        else:
+            os.replace(self._sealed_path, self._compacting_path)
+        return records
+
+    def compact(self):
+        """
+        Fold journaled writes into the backend without blocking writers. If
+        the backend write fails, the compacting journal is kept (and replayed
+        on restart) and its users are compacted again next time.
+        """
+        with self._compact_lock, STORAGE_SECONDS.time("compact"):
+            with self._io_lock:
+                records = self._seal()
+            if not records:
+                return
+            try:
+                self.backend.put_many({u: _unpack(v) for u, v in records.items()})
+            except Exception:
+                with self._lock:
+                    self._dirty |= records.keys()
+                raise
+            self._compacting_path.unlink()
+
+    def close(self):
+        """Flush everything to the backend and stop the flusher thread."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        try:
+            self.compact()
+        finally:
+            # On failure the journals are replayed at the next start
+            with self._lock:
+                self._journal.close()
+                self._synced.notify_all()
+            self.backend.close()
+            if self._lock_file is not None:
+                self._lock_file.close()